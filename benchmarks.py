@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import argparse
+from collections import namedtuple
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from tclocalizable import canonical, escape_codec, format_specifiers, strings_writer
+from tclocalizable.compiled_table import CompiledStringsTable, compile_table
+from tclocalizable.localized_string import LocalizedString
+from tclocalizable.parse_cache import ParseCache
+from tclocalizable.strings_bundle import StringsBundle
+from tclocalizable.strings_table import StringsTable
+from tclocalizable.translation_memory import TranslationMemory
+from tclocalizable.watcher import StringsWatcher
+
+
+def shlex_localized_strings_in_file(file_path, encoding='utf-16'):
+    """
+    The original `shlex` based parser, kept as the baseline of the parse benchmark.
+
+    :type file_path: str
+    :type encoding: str
+    :rtype: collections.Iterator[LocalizedString]
+    """
+    with open(file_path, 'r', encoding=encoding) as f:
+        pending_comment_lines = ''
+        for line in f:
+            stripped_line = line.strip()
+            if stripped_line.startswith('"') and stripped_line.endswith(';'):
+                line_components = shlex.split(stripped_line[:-1])
+                if len(line_components) != 3 or line_components[1] != '=':
+                    raise ValueError('Failed to parse line: {}'.format(line))
+                comment = pending_comment_lines.strip().lstrip('/*').rstrip('*/').strip() or None
+                pending_comment_lines = ''
+                yield LocalizedString(line_components[0], line_components[2], comment)
+            elif stripped_line.startswith('/*') or stripped_line.endswith('*/'):
+                pending_comment_lines += line
+
+
+class DictLocalizedString(object):
+    """
+    The original `LocalizedString` layout with an instance `__dict__`, kept as the baseline of the memory benchmark.
+    """
+
+    def __init__(self, source, localized=None, comment=None):
+        self.source = source
+        self._localized = localized or ''
+        self.comment = comment
+
+
+def naive_write_file(localized_strings, file_path, encoding='utf-16'):
+    """
+    The original writer, which writes each entry with 3 calls and formats it with `str.format`, kept as the baseline of
+    the write benchmark.
+
+    :type localized_strings: list[LocalizedString]
+    :type file_path: str
+    :type encoding: str
+    """
+    with open(file_path, 'w', encoding=encoding) as f:
+        item_count = len(localized_strings)
+        for idx, localized_string in enumerate(localized_strings):
+            escaped_source = localized_string.source.replace('"', r'\"')
+            escaped_localized = localized_string.stored_localized.replace('"', r'\"')
+            result = '"{escaped_source}" = "{escaped_localized}";'.format(**locals())
+            if localized_string.comment:
+                result = '/* {} */\n{}'.format(localized_string.comment, result)
+            f.write(result)
+            f.write('\n')
+            if idx != item_count-1:
+                f.write('\n')
+
+
+def naive_merge(strings_table, another_strings_table, keep_comment=True, keep_localized=True, exclude_extra=False):
+    """
+    The original `StringsTable.merge`, which aliases entries added, kept as the baseline of the merge benchmark.
+
+    :type strings_table: StringsTable
+    :type another_strings_table: StringsTable
+    """
+    if exclude_extra:
+        for key_to_remove in set(strings_table.keys()) - set(another_strings_table.keys()):
+            del strings_table[key_to_remove]
+
+    for source, another_localized_string in another_strings_table.items():
+        if source in strings_table:
+            self_localized_string = strings_table[source]
+            if not keep_comment:
+                self_localized_string.comment = another_localized_string.comment
+            if not keep_localized:
+                self_localized_string.localized = another_localized_string.localized
+        else:
+            strings_table[source] = another_localized_string
+
+
+def naive_duplicated_entries_in_file(file_path, encoding='utf-16'):
+    """
+    The original `StringsTable.duplicated_entries_in_file`, which keeps every entry, kept as the baseline of the
+    duplicate benchmark.
+
+    :type file_path: str
+    :type encoding: str
+    :rtype: dict[str, list[LocalizedString]]
+    """
+    localized_strings_collection = {}
+    for localized_string in StringsTable.localized_strings_in_file(file_path, encoding=encoding):
+        localized_strings_collection.setdefault(localized_string.source, []).append(localized_string)
+    return {source: localized_strings for source, localized_strings in localized_strings_collection.items()
+            if len(localized_strings) > 1}
+
+
+def naive_format_problems(localized_strings):
+    """
+    Specifiers checked entry by entry with a regular expression, kept as the baseline of the specifier benchmark.
+
+    :type localized_strings: list[LocalizedString]
+    :rtype: list[LocalizedString]
+    :return: entries with other specifiers than their sources
+    """
+    mismatched_localized_strings = []
+    for localized_string in localized_strings:
+        if not localized_string.stored_localized:
+            continue
+        source_specifiers = format_specifiers.format_specifiers(localized_string.source)
+        if not source_specifiers:
+            continue
+        localized_specifiers = format_specifiers.format_specifiers(localized_string.stored_localized)
+        if sorted((s.position, s.argument_type) for s in source_specifiers) != \
+                sorted((s.position, s.argument_type) for s in localized_specifiers):
+            mismatched_localized_strings.append(localized_string)
+    return mismatched_localized_strings
+
+
+# Corpora --------------------------------------------------------------------------------------------------------------
+
+Corpus = namedtuple('Corpus', ['entry_count', 'profile', 'encoding', 'comment_density'])
+"""
+A synthetic strings file. Profiles are `latin` (plain English and French), `cjk` (Japanese and Chinese translations,
+with quotes and format specifiers) and `escapes` (quotes, backslashes, tabs and newlines everywhere, written as escape
+sequences).
+"""
+
+CORPUS_PROFILES = ('latin', 'cjk', 'escapes')
+_WORDS = ('account', 'photo', 'message', 'settings', 'share', 'delete', 'album', 'download', 'profile', 'network')
+_LATIN_WORDS = ('compte', 'photo', 'message', 'réglages', 'partager', 'supprimer', 'album', 'télécharger', 'profil')
+_CJK_WORDS = ('アカウント', '写真', 'メッセージ', '設定', '共有', '刪除', '相簿', '下載', '個人檔案', '網路')
+
+
+def corpus_localized_strings(corpus, seed=0):
+    """
+    Entries of a corpus, the same on every run and every machine.
+
+    :type corpus: Corpus
+    :type seed: int
+    :rtype: collections.Iterator[LocalizedString]
+    """
+    rng = random.Random('{}:{}:{}'.format(seed, corpus.profile, corpus.entry_count))
+    for idx in range(corpus.entry_count):
+        words = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(1, 6)))
+        if corpus.profile == 'latin':
+            source = 'Title of {} {}'.format(words, idx)
+            localized = 'Titre de {} {}'.format(' '.join(rng.choice(_LATIN_WORDS) for _ in range(3)), idx)
+        elif corpus.profile == 'cjk':
+            source = 'Entry "{}" with {} = and ;'.format(idx, words)
+            localized = 'エントリ {} は %1$@ と「{}」を含む'.format(idx, ''.join(rng.sample(_CJK_WORDS, 3)))
+        else:
+            source = 'Say "{}" at C:\\{}\\{}\n'.format(words, idx, rng.choice(_WORDS))
+            localized = '\t"{}"\n\\{}\u00e9\r\U0001f600'.format(' '.join(rng.sample(_LATIN_WORDS, 2)), idx)
+        comment = 'Comment of {} {}'.format(words, idx) if rng.random() < corpus.comment_density else None
+        yield LocalizedString(source, localized, comment)
+
+
+def write_corpus(file_path, entry_count, encoding='utf-16', profile='cjk', comment_density=1.0):
+    """
+    :type file_path: str
+    :type entry_count: int
+    :type encoding: str
+    :param str profile: one of `CORPUS_PROFILES`
+    :param float comment_density: ratio of entries with comments
+    """
+    corpus = Corpus(entry_count, profile, encoding, comment_density)
+    StringsTable.write_localized_strings_to_file(corpus_localized_strings(corpus), file_path, encoding=encoding)
+
+
+def _min_time(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+# Benchmarks -----------------------------------------------------------------------------------------------------------
+# Each benchmark takes a corpus file, and returns `(variant, value, unit)` of each variant measured. Variants named
+# after the original implementations are baselines.
+
+def benchmark_parse(file_path, corpus, repeat, baselines=True):
+    results = []
+    if baselines:
+        results.append(('shlex', _min_time(lambda: list(shlex_localized_strings_in_file(file_path, corpus.encoding)),
+                                           repeat), 's'))
+    for name, use_mmap in (('tokenizer', False), ('mmap', True)):
+        results.append((name, _min_time(lambda: list(StringsTable.localized_strings_in_file(
+            file_path, encoding=corpus.encoding, use_mmap=use_mmap)), repeat), 's'))
+    return results
+
+
+def benchmark_write(file_path, corpus, repeat, baselines=True):
+    strings_table = StringsTable(file_path, encoding=corpus.encoding)
+    output_file_path = file_path + '.out'
+    results = []
+    if baselines:
+        localized_strings = list(strings_table.strings())
+        results.append(('naive', _min_time(lambda: naive_write_file(localized_strings, output_file_path,
+                                                                    corpus.encoding), repeat), 's'))
+    results.append(('batched', _min_time(lambda: strings_table.write_file(output_file_path, encoding=corpus.encoding),
+                                         repeat), 's'))
+    results.append(('unchanged', _min_time(lambda: strings_table.write_file(
+        output_file_path, encoding=corpus.encoding, skip_unchanged=True), repeat), 's'))
+    os.remove(output_file_path)
+    return results
+
+
+def benchmark_canonical(file_path, corpus, repeat, baselines=True):
+    output_file_path = file_path + '.out'
+    results = []
+    if baselines:
+        def sort_table():
+            strings_table = StringsTable(file_path, encoding=corpus.encoding)
+            StringsTable.write_localized_strings_to_file(sorted(strings_table.strings(), key=lambda s: s.source),
+                                                         output_file_path, encoding=corpus.encoding)
+
+        results.append(('sorted table', _min_time(sort_table, repeat), 's'))
+    # Runs of a tenth of the entries, which are spilled to temporary files and merged.
+    for name, run_size in (('in memory', corpus.entry_count), ('10 runs', max(1, corpus.entry_count // 10))):
+        results.append((name, _min_time(lambda: canonical.canonicalize_file(
+            file_path, encoding=corpus.encoding, output_path=output_file_path, run_size=run_size,
+            skip_unchanged=False), repeat), 's'))
+    os.remove(output_file_path)
+    return results
+
+
+def benchmark_escape(file_path, corpus, repeat, baselines=True):
+    localized_strings = StringsTable.localized_strings_in_file(file_path, encoding=corpus.encoding)
+    strings = [string for localized_string in localized_strings
+               for string in (localized_string.source, localized_string.stored_localized)]
+    escaped_strings = escape_codec.escape_all(strings)
+    batches = [strings[idx:idx + 2 * strings_writer.DEFAULT_BATCH_SIZE]
+               for idx in range(0, len(strings), 2 * strings_writer.DEFAULT_BATCH_SIZE)]
+    results = []
+    if baselines:
+        # The original writer only escaped quotes, one value at a time.
+        results.append(('quotes only', _min_time(lambda: [string.replace('"', r'\"') for string in strings], repeat),
+                        's'))
+    results += [
+        ('per value', _min_time(lambda: list(map(escape_codec.escape, strings)), repeat), 's'),
+        ('batched', _min_time(lambda: [escape_codec.escape_all(batch) for batch in batches], repeat), 's'),
+        ('unescape', _min_time(lambda: list(map(escape_codec.unescape, escaped_strings)), repeat), 's'),
+    ]
+    return results
+
+
+def benchmark_specifiers(file_path, corpus, repeat, baselines=True):
+    # Corpora have specifiers in localized content only, so sources and translations are made format strings.
+    corpus_strings = StringsTable.localized_strings_in_file(file_path, encoding=corpus.encoding)
+    localized_strings = [LocalizedString('%d: {} %@'.format(localized_string.source),
+                                         '%2$@ {} %1$d'.format(re.sub('%[^ ]*', '', localized_string.stored_localized)))
+                         for localized_string in corpus_strings]
+    results = []
+    if baselines:
+        results.append(('per entry', _min_time(lambda: naive_format_problems(localized_strings), repeat), 's'))
+    results.append(('batched', _min_time(lambda: format_specifiers.format_problems(localized_strings), repeat), 's'))
+    return results
+
+
+def benchmark_merge(file_path, corpus, repeat, baselines=True, locale_count=40):
+    base_strings_table = StringsTable(file_path, encoding=corpus.encoding)
+    # Every locale misses the newest tenth of entries, and has some obsolete ones.
+    localized_strings = list(base_strings_table.strings())[:corpus.entry_count - corpus.entry_count // 10]
+    localized_strings += [LocalizedString('Obsolete {}'.format(idx)) for idx in range(corpus.entry_count // 100)]
+
+    def make_strings_tables():
+        strings_tables = {}
+        for idx in range(locale_count):
+            strings_table = strings_tables[idx] = StringsTable()
+            for localized_string in localized_strings:
+                strings_table[localized_string.source] = localized_string.copy()
+        return strings_tables
+
+    def run_naive_merge(strings_tables):
+        for strings_table in strings_tables.values():
+            naive_merge(strings_table, base_strings_table, keep_comment=False, exclude_extra=True)
+
+    def run_bulk_merge(strings_tables):
+        base_strings_table.merge_into(strings_tables, keep_comment=False, exclude_extra=True)
+
+    results = []
+    for name, merge in (('naive', run_naive_merge), ('bulk', run_bulk_merge))[0 if baselines else 1:]:
+        results.append(('{} x{}'.format(name, locale_count),
+                        min(timeit.repeat('merge(strings_tables)', setup='strings_tables = make()', number=1,
+                                          repeat=repeat, globals={'make': make_strings_tables, 'merge': merge})),
+                        's'))
+    return results
+
+
+def benchmark_duplicates(file_path, corpus, repeat, baselines=True):
+    results = []
+    for name, check in (('naive', naive_duplicated_entries_in_file),
+                        ('streaming', StringsTable.duplicated_entries_in_file))[0 if baselines else 1:]:
+        results.append((name, _min_time(lambda: check(file_path, corpus.encoding), repeat), 's'))
+        tracemalloc.start()
+        check(file_path, corpus.encoding)
+        results.append((name + ' peak', tracemalloc.get_traced_memory()[1] / 1024 / 1024, 'MiB'))
+        tracemalloc.stop()
+    return results
+
+
+def benchmark_lookup(file_path, corpus, repeat, baselines=True):
+    keys = [localized_string.source for localized_string in
+            itertools.islice(StringsTable.localized_strings_in_file(file_path, encoding=corpus.encoding), 0, None, 97)]
+    strings_table = StringsTable(file_path, encoding=corpus.encoding)
+    compiled_file_path = file_path + '.compiled'
+    compile_table(strings_table, compiled_file_path)
+
+    def look_up(table):
+        for key in keys:
+            table[key].localized
+
+    def compiled_load():
+        with CompiledStringsTable(compiled_file_path) as compiled_strings_table:
+            return compiled_strings_table[keys[-1]]
+
+    with CompiledStringsTable(compiled_file_path) as compiled_strings_table:
+        results = [
+            ('hit', _min_time(lambda: look_up(strings_table), repeat) / len(keys) * 1000000, 'us'),
+            ('compiled hit', _min_time(lambda: look_up(compiled_strings_table), repeat) / len(keys) * 1000000, 'us'),
+            ('eager load+1', _min_time(lambda: StringsTable(file_path, encoding=corpus.encoding)[keys[-1]], repeat),
+             's'),
+            ('lazy load+1', _min_time(lambda: StringsTable(file_path, encoding=corpus.encoding, lazy=True)[keys[-1]],
+                                      repeat), 's'),
+            ('compiled load+1', _min_time(compiled_load, repeat) * 1000, 'ms'),
+        ]
+    os.remove(compiled_file_path)
+    return results
+
+
+def benchmark_cache(file_path, corpus, repeat, baselines=True):
+    parse_cache = ParseCache(file_path + '.cache')
+    results = [
+        ('uncached', _min_time(lambda: StringsTable(file_path, encoding=corpus.encoding), repeat), 's'),
+        ('cold', _min_time(lambda: (parse_cache.clear(), StringsTable(file_path, encoding=corpus.encoding,
+                                                                      cache=parse_cache)), repeat), 's'),
+        ('warm', _min_time(lambda: StringsTable(file_path, encoding=corpus.encoding, cache=parse_cache), repeat), 's'),
+    ]
+    parse_cache.clear()
+    os.rmdir(parse_cache.directory)
+    return results
+
+
+def benchmark_bundle(file_path, corpus, repeat, baselines=True, locale_count=8):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        for idx in range(locale_count):
+            locale_path = os.path.join(tmp_dir, 'locale{}.lproj'.format(idx))
+            os.mkdir(locale_path)
+            with open(os.path.join(locale_path, 'Localizable.strings'), 'wb') as f:
+                f.write(content)
+
+        return [('{} x{}'.format(name, locale_count), _min_time(lambda: StringsBundle(
+            tmp_dir, encoding=corpus.encoding, processes=processes), repeat), 's')
+            for name, processes in (('serial', 1), ('parallel', None))]
+
+
+def benchmark_fuzzy(file_path, corpus, repeat, baselines=True):
+    strings_table = StringsTable(file_path, encoding=corpus.encoding)
+    # Sources of the sampled entries with their last word replaced, which is the typical edit of a source.
+    queries = [localized_string.source.rsplit(' ', 1)[0] + ' album' for localized_string in
+               itertools.islice(strings_table.strings(), 0, None, max(1, len(strings_table) // 100))]
+
+    def build():
+        translation_memory = TranslationMemory()
+        translation_memory.add_table(strings_table, 'ja', 'Localizable')
+        return translation_memory
+
+    def look_up(translation_memory, min_score):
+        for query in queries:
+            translation_memory.matches(query, min_score=min_score)
+
+    translation_memory = build()
+    index_file_path = file_path + '.index'
+    translation_memory.save(index_file_path)
+    results = [
+        ('build', _min_time(build, repeat), 's'),
+        ('load', _min_time(lambda: TranslationMemory.load(index_file_path), repeat), 's'),
+    ]
+    os.remove(index_file_path)
+    for min_score in (0.5, 0.7, 0.9):
+        lookup_time = _min_time(lambda: look_up(translation_memory, min_score), repeat)
+        results.append(('top-5 >= {}'.format(min_score), lookup_time / len(queries) * 1000, 'ms'))
+    return results
+
+
+def benchmark_watch(file_path, corpus, repeat, baselines=True):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.mkdir(os.path.join(tmp_dir, 'ja.lproj'))
+        watched_file_path = os.path.join(tmp_dir, 'ja.lproj', 'Localizable.strings')
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        # The source of the entry in the middle edited back and forth, like a file saved by an editor.
+        strings_table = StringsTable(file_path, encoding=corpus.encoding)
+        line = list(strings_table.strings())[len(strings_table) // 2].line
+        lines = content.decode(corpus.encoding).split('\n')
+        lines[line - 1] = lines[line - 1].replace('"', '"Edited ', 1)
+        contents = itertools.cycle([content, '\n'.join(lines).encode(corpus.encoding)])
+        with open(watched_file_path, 'wb') as f:
+            f.write(next(contents))
+
+        watcher = StringsWatcher(tmp_dir, encoding=corpus.encoding, verify_content=True)
+
+        def edit_and_poll():
+            with open(watched_file_path, 'wb') as f:
+                f.write(next(contents))
+            watcher.poll()
+
+        def edit_and_read():
+            with open(watched_file_path, 'wb') as f:
+                f.write(next(contents))
+            StringsTable(watched_file_path, encoding=corpus.encoding)
+
+        results = []
+        if baselines:
+            results.append(('read_file', _min_time(edit_and_read, repeat) * 1000, 'ms'))
+        results.append(('poll', _min_time(edit_and_poll, repeat) * 1000, 'ms'))
+        return results
+
+
+def benchmark_memory(entry_count):
+    # Every entry decodes its own copy of the same genstrings comment, like the parser does.
+    raw_comment = 'Title of the button which dismisses the alert'.encode('utf-8')
+
+    results = []
+    for name, localized_string_class, intern in (('dict', DictLocalizedString, False),
+                                                 ('slots', LocalizedString, False),
+                                                 ('interned', LocalizedString, True)):
+        tracemalloc.start()
+        localized_strings = []
+        for idx in range(entry_count):
+            source = 'Entry {}'.format(idx)
+            comment = raw_comment.decode('utf-8')
+            if intern:
+                source, comment = sys.intern(source), sys.intern(comment)
+            localized_strings.append(localized_string_class(source, 'エントリ {}'.format(idx), comment))
+        results.append((name, tracemalloc.get_traced_memory()[0] / entry_count, 'B/entry'))
+        tracemalloc.stop()
+        del localized_strings
+    return results
+
+
+def benchmark_import(repeat, module_name='tclocalizable.strings_table'):
+    # Import times are measured with bytecode cached, like an installed package.
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    command = [sys.executable, '-X', 'importtime', '-c', 'import ' + module_name]
+    # The package is imported from the source tree, wherever benchmarks are run from.
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run(command, cwd=cwd, env=env, stderr=subprocess.DEVNULL, check=True)
+
+    import_times = []
+    for _ in range(max(repeat, 5)):
+        output = subprocess.run(command, cwd=cwd, env=env, stderr=subprocess.PIPE, check=True,
+                                universal_newlines=True).stderr
+        # Lines are `import time: self [us] | cumulative | imported package`
+        cumulative_time, = [int(line.split('|')[1]) for line in output.splitlines()
+                            if line.split('|')[-1].strip() == module_name]
+        import_times.append(cumulative_time / 1000)
+    return [(module_name, min(import_times), 'ms')]
+
+
+CORPUS_BENCHMARKS = ('parse', 'write', 'canonical', 'escape', 'specifiers', 'merge', 'duplicates', 'lookup', 'fuzzy',
+                     'cache', 'bundle', 'watch')
+OTHER_BENCHMARKS = ('memory', 'import')
+
+
+# Reports --------------------------------------------------------------------------------------------------------------
+
+def _result_key(record):
+    return record['benchmark'], record['variant'], record['corpus']
+
+
+def _print_results(title, results, previous_records=None, corpus_name=None, benchmark_name=None):
+    print(title)
+    for variant, value, unit in results:
+        line = '  {:<16} {:10.4f} {}'.format(variant, value, unit)
+        previous_record = (previous_records or {}).get((benchmark_name, variant, corpus_name))
+        if previous_record and previous_record['value']:
+            line += '  ({:+.1%})'.format(value / previous_record['value'] - 1)
+        print(line)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of tclocalizable on synthetic corpora. Corpora are '
+                                     'generated deterministically, so results of different commits are comparable.')
+    parser.add_argument('benchmarks', nargs='*', help='benchmarks to run, from {} (default: all)'.format(
+        ', '.join(CORPUS_BENCHMARKS + OTHER_BENCHMARKS)))
+    parser.add_argument('--entries', type=lambda value: [int(count) for count in value.split(',')], default=[40000],
+                        help='comma separated entry counts of corpora (default: 40000)')
+    parser.add_argument('--profiles', type=lambda value: value.split(','), default=['cjk'],
+                        help='comma separated profiles of corpora, from {} (default: cjk)'.format(
+                            ', '.join(CORPUS_PROFILES)))
+    parser.add_argument('--encodings', type=lambda value: value.split(','), default=['utf-16'],
+                        help='comma separated encodings of corpora (default: utf-16)')
+    parser.add_argument('--comment-density', type=float, default=1.0, help='ratio of entries with comments')
+    parser.add_argument('--full', action='store_true',
+                        help='run on corpora of 1k to 1M entries, of all profiles, in UTF-8 and UTF-16')
+    parser.add_argument('--no-baselines', dest='baselines', action='store_false',
+                        help="skip the original implementations, which are slow on large corpora")
+    parser.add_argument('--memory-entries', type=int, default=1000000, help='entry count of the memory benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='times to repeat each benchmark')
+    parser.add_argument('--json', metavar='PATH', help='write results to a JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='compare with results of a JSON file')
+    parser.add_argument('--import-budget', type=float, help='exit with 1 if the import takes longer, in milliseconds')
+    args = parser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in CORPUS_BENCHMARKS + OTHER_BENCHMARKS:
+            parser.error('unknown benchmark {}'.format(name))
+    for profile in args.profiles:
+        if profile not in CORPUS_PROFILES:
+            parser.error('unknown profile {}'.format(profile))
+    if args.full:
+        args.entries, args.profiles = [1000, 10000, 100000, 1000000], CORPUS_PROFILES
+        args.encodings = ['utf-8', 'utf-16']
+    benchmark_names = args.benchmarks or CORPUS_BENCHMARKS + OTHER_BENCHMARKS
+
+    previous_records = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous_records = {_result_key(record): record for record in json.load(f)['results']}
+
+    records = []
+
+    def report(benchmark_name, title, results, corpus=None):
+        corpus_name = '{}-{}-{}-{}'.format(*corpus) if corpus else None
+        _print_results(title, results, previous_records, corpus_name, benchmark_name)
+        records.extend(dict(benchmark=benchmark_name, variant=variant, value=value, unit=unit, corpus=corpus_name,
+                            **(corpus._asdict() if corpus else {})) for variant, value, unit in results)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for entry_count, profile, encoding in itertools.product(args.entries, args.profiles, args.encodings):
+            corpus = Corpus(entry_count, profile, encoding, args.comment_density)
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            write_corpus(file_path, entry_count, encoding=encoding, profile=profile,
+                         comment_density=args.comment_density)
+            for name in benchmark_names:
+                if name in CORPUS_BENCHMARKS:
+                    results = globals()['benchmark_' + name](file_path, corpus, args.repeat, baselines=args.baselines)
+                    report(name, '{} {} entries ({}, {}):'.format(name, entry_count, profile, encoding), results,
+                           corpus)
+
+    if 'memory' in benchmark_names:
+        report('memory', 'memory of {} entries:'.format(args.memory_entries), benchmark_memory(args.memory_entries))
+    exit_status = 0
+    if 'import' in benchmark_names:
+        results = benchmark_import(args.repeat)
+        report('import', 'import:', results)
+        if args.import_budget is not None and results[0][1] > args.import_budget:
+            print('import takes longer than the budget of {}ms'.format(args.import_budget))
+            exit_status = 1
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': _git_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+                       'cpu_count': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'results': records},
+                      f, indent=2, ensure_ascii=False)
+    return exit_status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -32,6 +32,9 @@ setup(name='tclocalizable',
       packages=find_packages(),
       include_package_data=True,
       install_requires=[],
+      entry_points={
+          'console_scripts': ['tclocalizable = tclocalizable.cli:main'],
+      },
 
       classifiers=[
           'Development Status :: 3 - Alpha',
@@ -0,0 +1,127 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import asyncio
+from functools import partial
+from itertools import islice
+import threading
+
+from tclocalizable.strings_table import StringsTable
+
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_CONCURRENCY = 8
+
+
+class _BatchReader(object):
+    """
+    Pull entries from a blocking iterator batch by batch in an executor. Batches and closing are serialized by a lock,
+    so the iterator is never closed while a batch is still being read in a worker thread (e.g. after cancellation).
+    """
+
+    def __init__(self, iterator):
+        self._iterator = iterator
+        self._lock = threading.Lock()
+
+    def read(self, size):
+        with self._lock:
+            return list(islice(self._iterator, size))
+
+    def close(self):
+        with self._lock:
+            self._iterator.close()
+
+
+async def localized_strings_in_file(file_path, encoding='utf-16', use_mmap=False, intern=False, cache=None,
+                                    batch_size=DEFAULT_BATCH_SIZE, executor=None):
+    """
+    Asynchronously iterate entries of a strings file. The file is read and parsed chunk by chunk in the executor, and
+    entries are handed over to the event loop batch by batch, so the loop never blocks on I/O or parsing.
+
+    :type file_path: str
+    :type encoding: str
+    :param bool use_mmap: scan the memory-mapped file instead of reading it through a file buffer
+    :param bool intern: intern sources and comments, to share them across tables loaded in the process
+    :param tclocalizable.parse_cache.ParseCache cache: cache to load the parsed file from, or store it in
+    :param int batch_size: entries to parse in the executor at once
+    :param concurrent.futures.ThreadPoolExecutor executor: executor to read and parse in, `None` for the default
+                                                           executor of the loop
+    :rtype: collections.AsyncIterator[tclocalizable.localized_string.LocalizedString]
+    """
+    loop = asyncio.get_running_loop()
+    reader = _BatchReader(StringsTable.localized_strings_in_file(file_path, encoding=encoding, use_mmap=use_mmap,
+                                                                 intern=intern, cache=cache))
+    try:
+        while True:
+            batch = await loop.run_in_executor(executor, reader.read, batch_size)
+            if not batch:
+                break
+            for localized_string in batch:
+                yield localized_string
+    finally:
+        reader.close()
+
+
+async def read_file(strings_table, file_path, executor=None, **kwargs):
+    """
+    Read a strings file into a table in the executor. The table should not be accessed until it's done.
+
+    :type strings_table: StringsTable
+    :type file_path: str
+    :param concurrent.futures.ThreadPoolExecutor executor: executor to read and parse in, `None` for the default
+                                                           executor of the loop
+    :param kwargs: other options of `StringsTable.read_file`
+    """
+    await asyncio.get_running_loop().run_in_executor(executor, partial(strings_table.read_file, file_path, **kwargs))
+
+
+async def write_file(strings_table, file_path, executor=None, **kwargs):
+    """
+    Write a table to a strings file in the executor. The table should not be modified until it's done.
+
+    :type strings_table: StringsTable
+    :type file_path: str
+    :param concurrent.futures.ThreadPoolExecutor executor: executor to serialize and write in, `None` for the default
+                                                           executor of the loop
+    :param kwargs: other options of `StringsTable.write_file`
+    :rtype: bool
+    :return: whether the file is written
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor,
+                                                            partial(strings_table.write_file, file_path, **kwargs))
+
+
+async def read_files(file_paths, concurrency=DEFAULT_CONCURRENCY, executor=None, **kwargs):
+    """
+    Read many strings files into tables, at most `concurrency` files at a time.
+
+    :type file_paths: collections.Iterable[str]
+    :param int concurrency: maximum files being read at once
+    :param concurrent.futures.ThreadPoolExecutor executor: executor to read and parse in, `None` for the default
+                                                           executor of the loop
+    :param kwargs: other options of `StringsTable.read_file`
+    :rtype: list[StringsTable]
+    :return: tables in the order of files
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read_bounded(file_path):
+        strings_table = StringsTable()
+        async with semaphore:
+            await read_file(strings_table, file_path, executor=executor, **kwargs)
+        return strings_table
+
+    return list(await asyncio.gather(*(read_bounded(file_path) for file_path in file_paths)))
@@ -0,0 +1,175 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import heapq
+from itertools import chain, islice
+import marshal
+import os
+import tempfile
+
+from tclocalizable import strings_parser, strings_writer
+from tclocalizable.localized_string import LocalizedString
+
+DEFAULT_RUN_SIZE = 100000
+_BLOCK_SIZE = 4096
+_MERGE_WIDTH = 64
+
+
+def normalized_comment(comment):
+    """
+    :type comment: str
+    :rtype: str
+    :return: the comment with runs of whitespaces (including line breaks) collapsed into single spaces, `None` if it's
+             blank
+    """
+    return ' '.join(comment.split()) or None if comment else None
+
+
+# External Sort --------------------------------------------------------------------------------------------------------
+
+def _write_run(records, directory):
+    """
+    :param collections.Iterable[tuple] records: sorted records
+    :type directory: str
+    :rtype: str
+    :return: path of the run file, which holds marshal dumps of blocks of records, each after its size
+    """
+    records = iter(records)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.run', delete=False) as f:
+        for block in iter(lambda: list(islice(records, _BLOCK_SIZE)), []):
+            data = marshal.dumps(block)
+            f.write(len(data).to_bytes(4, 'little'))
+            f.write(data)
+    return f.name
+
+
+def _read_run(run_path):
+    """
+    :type run_path: str
+    :rtype: collections.Iterator[tuple]
+    """
+    with open(run_path, 'rb') as f:
+        # Blocks are loaded from bytes, as `marshal.load` reads a file object in tiny pieces.
+        for size in iter(lambda: f.read(4), b''):
+            yield from marshal.loads(f.read(int.from_bytes(size, 'little')))
+    os.remove(run_path)  # Runs merged into another run are freed before the final merge.
+
+
+def _sorted_records(records, run_size, directory):
+    """
+    Sort records of strings, numbers and tuples of them. Records are sorted in memory if there are at most `run_size`
+    of them. Otherwise, sorted runs of `run_size` records are written to files in the directory, and then merged,
+    with at most `_MERGE_WIDTH` runs at once, so only a run, or a block of each run merged, is in memory at any time.
+
+    :type records: collections.Iterable[tuple]
+    :type run_size: int
+    :param str directory: directory for run files
+    :rtype: collections.Iterator[tuple]
+    """
+    records = iter(records)
+    run = sorted(islice(records, run_size))
+    following = list(islice(records, 1))
+    if not following:
+        yield from run
+        return
+
+    records = chain(following, records)
+    run_paths = []
+    while run:
+        run_paths.append(_write_run(run, directory))
+        run = sorted(islice(records, run_size))
+    del run
+    while len(run_paths) > _MERGE_WIDTH:
+        merged_run_path = _write_run(heapq.merge(*map(_read_run, run_paths[:_MERGE_WIDTH])), directory)
+        run_paths = run_paths[_MERGE_WIDTH:] + [merged_run_path]
+    yield from heapq.merge(*map(_read_run, run_paths))
+
+
+def _last_of_sources(records):
+    """
+    :param collections.Iterator[(str, int, str, str)] records: records sorted by sources and then input positions
+    :rtype: collections.Iterator[(str, int, str, str)]
+    :return: the last record of each source
+    """
+    previous_record = next(records, None)
+    for record in records:
+        if record[0] != previous_record[0]:
+            yield previous_record
+        previous_record = record
+    if previous_record is not None:
+        yield previous_record
+
+
+# Canonical Entries ----------------------------------------------------------------------------------------------------
+
+def canonical_localized_strings(localized_strings, key=None, run_size=DEFAULT_RUN_SIZE, directory=None):
+    """
+    Entries in the canonical order, which is the order of sources (or of a key, and then sources), without duplicated
+    sources and with normalized comments. Of entries of the same source, the last one is kept, like a table read from
+    a file. Written by `strings_writer`, which escapes content the same way however it was escaped, the same entries
+    are always written as the same bytes, whatever order they come in.
+
+    Entries are sorted in memory up to `run_size` entries. More entries (e.g. streamed from `localized_strings_in_file`
+    of a huge file) are sorted externally in runs spilled to temporary files, so they're sorted in bounded memory.
+
+    :type localized_strings: collections.Iterable[LocalizedString]
+    :param key: function taking an entry and returning a string, a number or a tuple of them to sort entries by,
+                `None` to sort by sources
+    :param int run_size: maximum entries sorted in memory at once
+    :param str directory: directory to create temporary files in, `None` for the default one of `tempfile`
+    :rtype: collections.Iterator[LocalizedString]
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as run_directory:
+        records = _last_of_sources(_sorted_records(
+            ((localized_string.source, position, localized_string.stored_localized,
+              normalized_comment(localized_string.comment))
+             for position, localized_string in enumerate(localized_strings)), run_size, run_directory))
+        if key is None:
+            for source, _, localized, comment in records:
+                yield LocalizedString(source, localized, comment)
+            return
+
+        # Sources are unique now, so entries of the same key are ordered by sources.
+        for _, source, localized, comment in _sorted_records(
+                ((key(LocalizedString(source, localized, comment)), source, localized, comment)
+                 for source, _, localized, comment in records), run_size, run_directory):
+            yield LocalizedString(source, localized, comment)
+
+
+def canonicalize_file(file_path, encoding='utf-16', output_path=None, to_encoding=None, key=None,
+                      run_size=DEFAULT_RUN_SIZE, skip_unchanged=True):
+    """
+    Rewrite a strings file with its entries in the canonical order, streaming entries from the file through an external
+    sort, so files of any size are rewritten in bounded memory.
+
+    :type file_path: str
+    :param str encoding: encoding of the file, `None` to detect UTF-8 or UTF-16 from the file
+    :param str output_path: file to write, `None` to rewrite the file in place
+    :param str to_encoding: encoding to write, `None` for the encoding of the file
+    :param key: function taking an entry and returning a value to sort entries by, `None` to sort by sources
+    :param int run_size: maximum entries sorted in memory at once
+    :param bool skip_unchanged: don't touch the output file if it already has the same content
+    :rtype: bool
+    :return: whether the output file is written
+    """
+    encoding = encoding or strings_parser.detect_encoding(file_path)
+    localized_strings = canonical_localized_strings(
+        strings_parser.localized_strings_in_file(file_path, encoding=encoding), key=key, run_size=run_size,
+        directory=None)
+    # All entries are read before the first one is sorted out, so the file is closed before it's replaced.
+    return strings_writer.write_localized_strings(localized_strings, output_path or file_path,
+                                                  encoding=to_encoding or encoding, skip_unchanged=skip_unchanged)
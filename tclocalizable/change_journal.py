@@ -0,0 +1,126 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from collections import namedtuple, OrderedDict
+
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+Change = namedtuple('Change', ['kind', 'source', 'field', 'old', 'new'])
+"""
+A recorded change of a strings table. Entries added, removed or replaced have `None` field and `LocalizedString` old/new
+values (`None` if the entry doesn't exist). Fields (`localized` or `comment`) modified have their old and new values.
+"""
+
+
+class ChangeJournal(object):
+    """
+    Journal of changes made to a strings table since it's started (or last cleared). Besides the log of every change, it
+    summarizes the net changes of each touched source, by comparing the current entry with the one before its first
+    change, so adding and then removing an entry is not a change at all.
+    """
+
+    def __init__(self, strings_table):
+        """
+        :type strings_table: tclocalizable.strings_table.StringsTable
+        """
+        self.strings_table = strings_table
+        self.changes = []
+        """:type: list[Change]"""
+        self._original_entries = OrderedDict()
+        """:type: dict[str, (str, str)]"""
+
+    def _touch(self, source, localized_string):
+        if source not in self._original_entries:
+            self._original_entries[source] = \
+                None if localized_string is None else (localized_string.stored_localized, localized_string.comment)
+
+    # Recording --------------------------------------------------------------------------------------------------------
+
+    def record_entry(self, source, old_localized_string, new_localized_string):
+        """
+        :type source: str
+        :param tclocalizable.localized_string.LocalizedString old_localized_string: `None` if it's added
+        :param tclocalizable.localized_string.LocalizedString new_localized_string: `None` if it's removed
+        """
+        self._touch(source, old_localized_string)
+        if old_localized_string is None:
+            kind = ADDED
+        elif new_localized_string is None:
+            kind = REMOVED
+        else:
+            kind = MODIFIED
+        self.changes.append(Change(kind, source, None, old_localized_string, new_localized_string))
+
+    def record_field(self, localized_string, field, old_value, new_value):
+        """
+        :type localized_string: tclocalizable.localized_string.LocalizedString
+        :param str field: `localized` or `comment`
+        :type old_value: str
+        :type new_value: str
+        """
+        if old_value == new_value:
+            return
+        if localized_string.source not in self._original_entries:
+            original_entry = (old_value, localized_string.comment) if field == 'localized' else \
+                (localized_string.stored_localized, old_value)
+            self._original_entries[localized_string.source] = original_entry
+        self.changes.append(Change(MODIFIED, localized_string.source, field, old_value, new_value))
+
+    def clear(self):
+        """
+        Forget all changes, e.g. after the table is exported.
+        """
+        self.changes = []
+        self._original_entries.clear()
+
+    # Net Changes ------------------------------------------------------------------------------------------------------
+
+    def net_changes(self):
+        """
+        :rtype: collections.Iterator[(str, str, tclocalizable.localized_string.LocalizedString)]
+        :return: kind, source and current entry (`None` if removed) of each touched source which actually changed, in
+                 the order they are first touched
+        """
+        for source, original_entry in self._original_entries.items():
+            localized_string = self.strings_table.get(source)
+            if original_entry is None:
+                if localized_string is not None:
+                    yield ADDED, source, localized_string
+            elif localized_string is None:
+                yield REMOVED, source, None
+            elif original_entry != (localized_string.stored_localized, localized_string.comment):
+                yield MODIFIED, source, localized_string
+
+    def added_sources(self):
+        """
+        :rtype: list[str]
+        """
+        return [source for kind, source, _ in self.net_changes() if kind == ADDED]
+
+    def removed_sources(self):
+        """
+        :rtype: list[str]
+        """
+        return [source for kind, source, _ in self.net_changes() if kind == REMOVED]
+
+    def modified_sources(self):
+        """
+        :rtype: list[str]
+        """
+        return [source for kind, source, _ in self.net_changes() if kind == MODIFIED]
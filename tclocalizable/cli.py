@@ -0,0 +1,516 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Modules of other commands are imported by the commands, so hooks running `lint` on each commit don't pay for them
+# (e.g. `converters` pulls in `urllib` and `email` through `xml.sax`).
+from tclocalizable import duplicates, format_specifiers, strings_parser, strings_writer
+from tclocalizable.strings_bundle import StringsBundle
+from tclocalizable.strings_table import StringsTable
+
+
+def strings_files_in_paths(paths, suffixes=('.strings',)):
+    """
+    :param list[str] paths: strings files, or directories to discover `*.strings` files in
+    :param tuple[str] suffixes: suffixes of files to discover in directories
+    :rtype: list[str]
+    """
+    file_paths = []
+    for path in paths:
+        if not os.path.isdir(path):
+            file_paths.append(path)
+            continue
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            file_paths.extend(os.path.join(dir_path, file_name) for file_name in sorted(file_names)
+                              if file_name.endswith(suffixes))
+    return file_paths
+
+
+def _locale_of_file(file_path):
+    """
+    :type file_path: str
+    :rtype: str
+    :return: the locale of a file in a `*.lproj` directory, or `None`
+    """
+    dir_name = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+    return dir_name[:-len('.lproj')] if dir_name.endswith('.lproj') else None
+
+
+def _map_files(function, file_paths, jobs, *arguments):
+    """
+    Apply a function to each file across worker processes, so a whole tree is processed in one invocation.
+
+    :param function: picklable function taking a file path and the arguments
+    :type file_paths: list[str]
+    :param int jobs: worker processes, `None` to use all CPUs
+    :param arguments: other arguments of the function, the same for all files
+    :rtype: collections.Iterator
+    :return: results in the order of files
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(file_paths))
+    if jobs <= 1:
+        for file_path in file_paths:
+            yield function(file_path, *arguments)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            yield from executor.map(function, file_paths, *[[argument] * len(file_paths) for argument in arguments],
+                                    chunksize=8)
+
+
+def _entry_record(file_path, localized_string):
+    return {'file': file_path, 'line': localized_string.line, 'offset': localized_string.offset,
+            'source': localized_string.source, 'localized': localized_string.stored_localized}
+
+
+def _output(record):
+    print(json.dumps(record, ensure_ascii=False))
+
+
+def _output_records(records):
+    """
+    :type records: collections.Iterable[dict]
+    :rtype: int
+    :return: 1 if any record is an error, or 0
+    """
+    exit_code = 0
+    for record in records:
+        _output(record)
+        if 'error' in record:
+            exit_code = 1
+    return exit_code
+
+
+# Commands -------------------------------------------------------------------------------------------------------------
+
+def _lint_file(file_path, encoding, check_format):
+    """
+    :rtype: list[dict]
+    :return: problems of the file
+    """
+    try:
+        encoding = encoding or strings_parser.detect_encoding(file_path)
+        duplicated_entries = duplicates.duplicated_entries_in_file(file_path, encoding=encoding)
+        format_problems = format_specifiers.format_problems_in_file(file_path, encoding) if check_format else []
+    except (OSError, ValueError) as e:
+        return [{'file': file_path, 'error': str(e)}]
+    problems = [dict(_entry_record(file_path, localized_string), error='Duplicated entry')
+                for localized_strings in duplicated_entries.values() for localized_string in localized_strings[1:]]
+    problems.extend(dict(_entry_record(file_path, format_problem.localized_string),
+                         error='Format specifiers: ' + format_specifiers.describe(format_problem),
+                         kind=format_problem.kind, field=format_problem.field, position=format_problem.position,
+                         expected=format_problem.expected, actual=format_problem.actual)
+                    for format_problem in format_problems)
+    return sorted(problems, key=lambda problem: problem.get('offset') or 0)
+
+
+def lint(args):
+    """
+    Check strings files are well-formed, have no duplicated entries, and format specifiers of translations match the
+    ones of sources.
+
+    :rtype: int
+    """
+    problem_count = 0
+    for problems in _map_files(_lint_file, strings_files_in_paths(args.paths), args.jobs, args.encoding,
+                               not args.no_format):
+        for problem in problems:
+            _output(problem)
+        problem_count += len(problems)
+    return 1 if problem_count else 0
+
+
+def dups(args):
+    """
+    Check entries defined more than once among the tables of each locale (or in each file).
+
+    :rtype: int
+    """
+    file_paths = strings_files_in_paths(args.paths)
+    grouped_file_paths = [(_locale_of_file(file_path) if args.scope == 'locale' else None) or file_path
+                          for file_path in file_paths]
+    errors = {}
+    duplicated_entries = duplicates.duplicated_entries_in_grouped_files(
+        list(zip(grouped_file_paths, file_paths)), encoding=args.encoding, processes=args.jobs, errors=errors)
+    for file_path in file_paths:
+        if file_path in errors:
+            _output({'file': file_path, 'error': errors[file_path]})
+    for group, group_duplicated_entries in duplicated_entries.items():
+        for source, group_duplicates in group_duplicated_entries.items():
+            _output({'group': group, 'source': source,
+                     'entries': [_entry_record(*duplicate) for duplicate in group_duplicates]})
+    return 1 if duplicated_entries or errors else 0
+
+
+def merge(args):
+    """
+    Merge tables of the base locale into tables of other locales, and write tables changed.
+
+    :rtype: int
+    """
+    exit_code = 0
+    for root_path in args.paths:
+        try:
+            strings_bundle = StringsBundle(root_path, encoding=args.encoding, processes=args.jobs)
+        except (OSError, ValueError) as e:
+            # Tables of a bundle are merged together, so none of them are written if any can't be read.
+            _output({'file': root_path, 'error': str(e)})
+            exit_code = 1
+            continue
+        try:
+            merge_stats = strings_bundle.merge_base_locale(args.base_locale, keep_comment=not args.replace_comments,
+                                                           keep_localized=not args.replace_localized,
+                                                           exclude_extra=args.exclude_extra)
+        except KeyError as e:
+            _output({'file': root_path, 'error': e.args[0]})
+            exit_code = 1
+            continue
+        try:
+            written_tables = set(strings_bundle.write_files(skip_unchanged=True)) if not args.dry_run else set()
+        except OSError as e:
+            _output({'file': e.filename or root_path, 'error': str(e)})
+            exit_code = 1
+            continue
+        for (locale, table_name), stats in merge_stats.items():
+            _output(dict(stats._asdict(), file=strings_bundle.files[(locale, table_name)].path, locale=locale,
+                         table=table_name, written=(locale, table_name) in written_tables))
+    return exit_code
+
+
+def merge_driver(args):
+    """
+    Merge a strings file changed on two branches, as a git merge driver. The merged file replaces ours, with conflicts
+    between markers unless a side is favored.
+
+    :rtype: int
+    :return: 1 if any conflicts are left to be resolved by hand
+    """
+    try:
+        encodings = [args.encoding or strings_parser.detect_encoding(file_path)
+                     for file_path in (args.base, args.ours, args.theirs)]
+        base, ours, theirs = [StringsTable(file_path, encoding=encoding)
+                              for file_path, encoding in zip((args.base, args.ours, args.theirs), encodings)]
+    except (OSError, ValueError) as e:
+        # Our file is left as it is, e.g. with conflict markers of an earlier merge, for git to report a conflict.
+        _output({'file': args.path or args.ours, 'error': str(e)})
+        return 1
+    from tclocalizable import three_way_merge
+    conflicts = three_way_merge.merge_three_way(base, ours, theirs, favor=args.favor or 'ours')
+    for conflict in conflicts:
+        _output({'file': args.path or args.ours, 'source': conflict.source, 'field': conflict.field,
+                 'resolved': args.favor})
+    if args.favor:
+        ours.write_file(args.ours, encoding=encodings[1])
+        return 0
+    three_way_merge.write_file(ours, conflicts, args.ours, encoding=encodings[1],
+                               marker_size=args.marker_size or three_way_merge.DEFAULT_MARKER_SIZE)
+    return 1 if conflicts else 0
+
+
+def _convert_file(file_path, encoding, to_encoding):
+    try:
+        encoding = encoding or strings_parser.detect_encoding(file_path)
+        written = StringsTable(file_path, encoding=encoding).write_file(file_path, encoding=to_encoding,
+                                                                        skip_unchanged=True)
+    except (OSError, ValueError) as e:
+        return {'file': file_path, 'error': str(e)}
+    return {'file': file_path, 'encoding': encoding, 'to_encoding': to_encoding, 'written': written}
+
+
+def convert(args):
+    """
+    Re-encode strings files in place.
+
+    :rtype: int
+    """
+    return _output_records(_map_files(_convert_file, strings_files_in_paths(args.paths), args.jobs, args.encoding,
+                                      args.to_encoding))
+
+
+def _canonicalize_file(file_path, encoding, to_encoding):
+    from tclocalizable import canonical
+    try:
+        encoding = encoding or strings_parser.detect_encoding(file_path)
+        written = canonical.canonicalize_file(file_path, encoding=encoding, to_encoding=to_encoding)
+    except (OSError, ValueError) as e:
+        return {'file': file_path, 'error': str(e)}
+    return {'file': file_path, 'encoding': encoding, 'to_encoding': to_encoding or encoding, 'written': written}
+
+
+def canonicalize(args):
+    """
+    Rewrite strings files in place with entries sorted by sources, without duplicates and with normalized comments, so
+    files of the same entries have the same bytes. Files are streamed through an external sort in bounded memory.
+
+    :rtype: int
+    """
+    return _output_records(_map_files(_canonicalize_file, strings_files_in_paths(args.paths), args.jobs,
+                                      args.encoding, args.to_encoding))
+
+
+def _file_stats(file_path, encoding):
+    entry_count = untranslated_count = commented_count = 0
+    try:
+        encoding = encoding or strings_parser.detect_encoding(file_path)
+        for localized_string in strings_parser.localized_strings_in_file(file_path, encoding=encoding):
+            entry_count += 1
+            untranslated_count += not localized_string.stored_localized
+            commented_count += localized_string.comment is not None
+        size = os.path.getsize(file_path)
+    except (OSError, ValueError) as e:
+        return {'file': file_path, 'error': str(e)}
+    return {'file': file_path, 'locale': _locale_of_file(file_path), 'encoding': encoding, 'size': size,
+            'entries': entry_count, 'untranslated': untranslated_count, 'commented': commented_count}
+
+
+def stats(args):
+    """
+    Count entries of strings files.
+
+    :rtype: int
+    """
+    return _output_records(_map_files(_file_stats, strings_files_in_paths(args.paths), args.jobs, args.encoding))
+
+
+def _export_locale(locale_file_paths, output_path, source_language, encoding):
+    """
+    Export strings files of a locale to `<locale>.xliff`, with a `<file>` element of each file.
+    """
+    from tclocalizable import converters
+    locale, file_paths = locale_file_paths
+    xliff_path = os.path.join(output_path, locale + '.xliff')
+    tables = (('{}.lproj/{}'.format(locale, os.path.basename(file_path)),
+               strings_parser.localized_strings_in_file(file_path,
+                                                        encoding=encoding or strings_parser.detect_encoding(file_path)))
+              for file_path in file_paths)
+    try:
+        converters.write_xliff(tables, xliff_path, source_language, locale)
+    except (OSError, ValueError) as e:
+        # Files of a locale are streamed into one XLIFF file, which isn't written if any of them fails.
+        return {'locale': locale, 'files': file_paths, 'error': str(e)}
+    return {'locale': locale, 'files': file_paths, 'output': xliff_path}
+
+
+def _export_json_file(file_path, output_path, flat, encoding):
+    """
+    Export a strings file to `<locale>/<table>.json`.
+    """
+    from tclocalizable import converters
+    directory = os.path.join(output_path, _locale_of_file(file_path) or '')
+    json_path = os.path.join(directory, os.path.splitext(os.path.basename(file_path))[0] + '.json')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        encoding = encoding or strings_parser.detect_encoding(file_path)
+        converters.write_json(strings_parser.localized_strings_in_file(file_path, encoding=encoding), json_path,
+                              flat=flat)
+    except (OSError, ValueError) as e:
+        return {'file': file_path, 'error': str(e)}
+    return {'locale': _locale_of_file(file_path), 'files': [file_path], 'output': json_path}
+
+
+def export(args):
+    """
+    Export strings files to an XLIFF file of each locale, or to a JSON file of each table. Files are streamed, so
+    memory use doesn't grow with them.
+
+    :rtype: int
+    """
+    file_paths = strings_files_in_paths(args.paths)
+    os.makedirs(args.output, exist_ok=True)
+    if args.format == 'json':
+        records = _map_files(_export_json_file, file_paths, args.jobs, args.output, args.flat, args.encoding)
+    else:
+        file_paths_of_locales = {}
+        for file_path in file_paths:
+            locale = _locale_of_file(file_path)
+            if locale is None:
+                raise SystemExit('{} is not in a *.lproj directory'.format(file_path))
+            file_paths_of_locales.setdefault(locale, []).append(file_path)
+        records = _map_files(_export_locale, list(file_paths_of_locales.items()), args.jobs, args.output,
+                             args.source_language, args.encoding)
+    return _output_records(records)
+
+
+def _import_file(file_path, root_path, to_encoding):
+    """
+    Import an XLIFF file, or a JSON file of a table in a directory named after its locale, to `*.lproj/*.strings`.
+    """
+    from tclocalizable import converters
+    try:
+        if file_path.endswith('.xliff'):
+            strings_file_paths = converters.import_xliff_file(file_path, root_path, encoding=to_encoding)
+        else:
+            locale = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+            directory = os.path.join(root_path, locale + '.lproj')
+            os.makedirs(directory, exist_ok=True)
+            strings_file_paths = [os.path.join(directory,
+                                               os.path.splitext(os.path.basename(file_path))[0] + '.strings')]
+            strings_writer.write_localized_strings(converters.localized_strings_in_json_file(file_path),
+                                                   strings_file_paths[0], encoding=to_encoding)
+    except (OSError, ValueError, SyntaxError) as e:  # XML parse errors are `SyntaxError`.
+        return {'file': file_path, 'error': str(e)}
+    return {'file': file_path, 'outputs': strings_file_paths}
+
+
+def import_(args):
+    """
+    Import XLIFF or JSON files exported by `export` to strings files.
+
+    :rtype: int
+    """
+    return _output_records(_map_files(_import_file, strings_files_in_paths(args.paths, suffixes=('.xliff', '.json')),
+                                      args.jobs, args.output, args.to_encoding))
+
+
+def watch(args):
+    """
+    Keep tables of a directory of `*.lproj` directories loaded, and write each entry changed as files change, until
+    interrupted. Only changed files are parsed again, and only their changed parts.
+
+    :rtype: int
+    """
+    def output_changes(locale, table_name, changes):
+        for change in changes:
+            _output({'locale': locale, 'table': table_name, 'change': change.kind, 'source': change.source,
+                     'localized': change.new and change.new.localized, 'comment': change.new and change.new.comment})
+
+    from tclocalizable import watcher
+    interval = watcher.DEFAULT_INTERVAL if args.interval is None else args.interval
+    strings_watcher = watcher.StringsWatcher(args.path, encoding=args.encoding, verify_content=args.verify_content)
+    strings_watcher.subscribe(output_changes)
+    reported_errors = {}
+    try:
+        while True:
+            for (locale, table_name), error in strings_watcher.errors.items():
+                if reported_errors.get((locale, table_name)) != error:
+                    _output({'locale': locale, 'table': table_name, 'error': error})
+            reported_errors = dict(strings_watcher.errors)
+            sys.stdout.flush()  # Records are read as they come, e.g. by a dev server through a pipe.
+            time.sleep(interval)
+            strings_watcher.poll()
+    except KeyboardInterrupt:
+        return 0
+
+
+# Main -----------------------------------------------------------------------------------------------------------------
+
+def argument_parser():
+    """
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog='tclocalizable', description='Localizable utilities of Cocoa (OS X and iOS). '
+                                     'Results are written to stdout as JSON lines.')
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument('-e', '--encoding', help='encoding of all files (default: detect UTF-8 or UTF-16)')
+    common_parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: all CPUs)')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    subparser = subparsers.add_parser('lint', parents=[common_parser],
+                                      help='check files are well-formed without duplicates or mismatched specifiers')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='strings file or directory')
+    subparser.add_argument('--no-format', action='store_true', help="don't check format specifiers of translations")
+    subparser.set_defaults(function=lint)
+
+    subparser = subparsers.add_parser('dups', parents=[common_parser],
+                                      help='check entries defined in many tables of a locale')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='strings file or directory')
+    subparser.add_argument('--scope', choices=('locale', 'file'), default='locale',
+                           help='check among files of each locale, or each file alone (default: locale)')
+    subparser.set_defaults(function=dups)
+
+    subparser = subparsers.add_parser('merge', parents=[common_parser], help='merge the base locale into other locales')
+    subparser.add_argument('base_locale', help='locale to merge from, e.g. en')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='directory of *.lproj directories')
+    subparser.add_argument('--replace-comments', action='store_true', help='replace comments with the base ones')
+    subparser.add_argument('--replace-localized', action='store_true', help='replace translations with the base ones')
+    subparser.add_argument('--exclude-extra', action='store_true', help='remove entries not in the base tables')
+    subparser.add_argument('--dry-run', action='store_true', help="don't write any files")
+    subparser.set_defaults(function=merge)
+
+    subparser = subparsers.add_parser('merge-driver', parents=[common_parser],
+                                      help='merge a file changed on two branches, as a git merge driver')
+    subparser.add_argument('base', help='file of the common ancestor (%%O)')
+    subparser.add_argument('ours', help='our file, replaced by the merged file (%%A)')
+    subparser.add_argument('theirs', help='their file (%%B)')
+    subparser.add_argument('--path', help='path of the file merged, for messages (%%P)')
+    subparser.add_argument('--favor', choices=('ours', 'theirs'),
+                           help='resolve conflicts with a side, instead of writing conflict markers')
+    subparser.add_argument('--marker-size', type=int, help='length of conflict markers (%%L, default: 7)')
+    subparser.set_defaults(function=merge_driver)
+
+    subparser = subparsers.add_parser('convert', parents=[common_parser], help='re-encode files in place')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='strings file or directory')
+    subparser.add_argument('-t', '--to-encoding', default='utf-16', help='encoding to write (default: utf-16)')
+    subparser.set_defaults(function=convert)
+
+    subparser = subparsers.add_parser('canonicalize', parents=[common_parser],
+                                      help='rewrite files in place with entries sorted by sources, without duplicates')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='strings file or directory')
+    subparser.add_argument('-t', '--to-encoding', help='encoding to write (default: the encoding of each file)')
+    subparser.set_defaults(function=canonicalize)
+
+    subparser = subparsers.add_parser('export', parents=[common_parser],
+                                      help='export files to XLIFF files of locales, or JSON files of tables')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='strings file or directory')
+    subparser.add_argument('-o', '--output', required=True, help='directory to write exported files in')
+    subparser.add_argument('-f', '--format', choices=('xliff', 'json'), default='xliff',
+                           help='XLIFF files named after locales, or JSON files in directories of locales '
+                                '(default: xliff)')
+    subparser.add_argument('--source-language', default='en', help='language of sources in XLIFF (default: en)')
+    subparser.add_argument('--flat', action='store_true', help='write only localized content to JSON')
+    subparser.set_defaults(function=export)
+
+    subparser = subparsers.add_parser('import', parents=[common_parser], help='import exported XLIFF or JSON files')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='XLIFF or JSON file, or directory')
+    subparser.add_argument('-o', '--output', required=True, help='directory to write *.lproj directories in')
+    subparser.add_argument('-t', '--to-encoding', default='utf-16', help='encoding to write (default: utf-16)')
+    subparser.set_defaults(function=import_)
+
+    subparser = subparsers.add_parser('stats', parents=[common_parser], help='count entries of files')
+    subparser.add_argument('paths', nargs='+', metavar='path', help='strings file or directory')
+    subparser.set_defaults(function=stats)
+
+    subparser = subparsers.add_parser('watch', parents=[common_parser],
+                                      help='write entries changed as files change, until interrupted')
+    subparser.add_argument('path', help='directory of *.lproj directories')
+    subparser.add_argument('-i', '--interval', type=float, help='seconds between checks of files (default: 1)')
+    subparser.add_argument('--verify-content', action='store_true',
+                           help='read all files on each check, for file systems with coarse mtime')
+    subparser.set_defaults(function=watch)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    :param list[str] argv: arguments, `sys.argv[1:]` by default
+    :rtype: int
+    :return: exit status, 1 if any problems are found by `lint` or `dups`
+    """
+    args = argument_parser().parse_args(argv)
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from array import array
+from collections.abc import Mapping
+import mmap
+import struct
+import sys
+from zlib import crc32
+
+from tclocalizable import strings_writer
+from tclocalizable.localized_string import LocalizedString
+
+# Bump the last byte whenever the layout changes, so files of older versions are rejected rather than misread.
+MAGIC = b'TCSTRTB\x01'
+
+# A compiled table is a header, then a hash index of buckets, then a record of each entry in the order of the table, and
+# then a pool of UTF-8 strings. Integers are unsigned 32-bit little-endian, and offsets of strings are in the pool.
+_HEADER = struct.Struct('<8sII')  # Magic, entry count and bucket count
+_BUCKET = struct.Struct('<I')  # Index of the entry plus one, or 0 for empty buckets
+_ENTRY = struct.Struct('<IIIIII')  # Offset and length of the source, the localized and the comment
+_NO_COMMENT = 0xffffffff  # Length of comments which are `None`
+
+
+def _bucket_count(entry_count):
+    """
+    :type entry_count: int
+    :rtype: int
+    :return: the smallest power of 2 keeping the load factor of buckets at most 0.5
+    """
+    bucket_count = 8
+    while bucket_count < entry_count * 2:
+        bucket_count *= 2
+    return bucket_count
+
+
+def compile_table(strings_table, file_path):
+    """
+    Compile a table into a file for `CompiledStringsTable`. Equal strings (e.g. repeated comments) are stored once.
+
+    The file is written to a temporary file which then replaces the destination, so processes which mapped the previous
+    version keep reading it consistently until they reopen the file. New files are created with the default permissions
+    (0666 masked by umask), and existing ones keep theirs.
+
+    :type strings_table: tclocalizable.strings_table.StringsTable
+    :type file_path: str
+    """
+    localized_strings = list(strings_table.strings())
+    bucket_count = _bucket_count(len(localized_strings))
+    mask = bucket_count - 1
+    buckets = array('I', bytes(_BUCKET.size * bucket_count))
+    entries = bytearray(_ENTRY.size * len(localized_strings))
+    pool = bytearray()
+    pool_offsets = {}
+
+    def pooled(string):
+        data = string.encode('utf-8')
+        offset = pool_offsets.get(data)
+        if offset is None:
+            offset = pool_offsets[data] = len(pool)
+            pool.extend(data)
+        return offset, len(data)
+
+    for index, localized_string in enumerate(localized_strings):
+        source_offset, source_length = pooled(localized_string.source)
+        localized_offset, localized_length = pooled(localized_string.stored_localized)
+        if localized_string.comment is None:
+            comment_offset, comment_length = 0, _NO_COMMENT
+        else:
+            comment_offset, comment_length = pooled(localized_string.comment)
+        _ENTRY.pack_into(entries, index * _ENTRY.size, source_offset, source_length, localized_offset,
+                         localized_length, comment_offset, comment_length)
+
+        bucket = crc32(pool[source_offset:source_offset + source_length]) & mask
+        while buckets[bucket]:
+            bucket = (bucket + 1) & mask
+        buckets[bucket] = index + 1
+
+    if sys.byteorder != 'little':
+        buckets.byteswap()
+    strings_writer.write_chunks(file_path, [_HEADER.pack(MAGIC, len(localized_strings), bucket_count),
+                                            buckets.tobytes(), entries, pool])
+
+
+class CompiledStringsTable(Mapping):
+    """
+    Read-only table served straight from the memory mapping of a file compiled by `compile_table`. Opening it reads
+    nothing but the header, and a lookup hashes the source and decodes only the entry found, so worker processes start
+    instantly and share the same pages of the page cache.
+
+    Entries are decoded into new `LocalizedString` instances on each access, without lines and offsets. Changing them
+    has no effect on the table.
+    """
+
+    def __init__(self, file_path):
+        """
+        :param str file_path: file compiled by `compile_table`
+        """
+        with open(file_path, 'rb') as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mapping) < _HEADER.size:
+            self._mapping.close()
+            raise ValueError('{} is not a compiled strings table'.format(file_path))
+        magic, self._entry_count, bucket_count = _HEADER.unpack_from(self._mapping)
+        if magic != MAGIC:
+            self._mapping.close()
+            raise ValueError('{} is not a compiled strings table of this version'.format(file_path))
+        self._mask = bucket_count - 1
+        self._entries_offset = _HEADER.size + _BUCKET.size * bucket_count
+        self._pool_offset = self._entries_offset + _ENTRY.size * self._entry_count
+
+    def close(self):
+        self._mapping.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # Entries ----------------------------------------------------------------------------------------------------------
+
+    def _entry(self, source):
+        """
+        :type source: str
+        :rtype: (int, int, int, int, int, int)
+        :return: record of the entry, or `None` if there's no such source
+        """
+        if not isinstance(source, str):
+            return None
+        data = source.encode('utf-8')
+        mapping = self._mapping
+        pool_offset = self._pool_offset
+        bucket = crc32(data) & self._mask
+        while True:
+            index, = _BUCKET.unpack_from(mapping, _HEADER.size + _BUCKET.size * bucket)
+            if not index:
+                return None
+            entry = _ENTRY.unpack_from(mapping, self._entries_offset + _ENTRY.size * (index - 1))
+            if entry[1] == len(data) and mapping[pool_offset + entry[0]:pool_offset + entry[0] + entry[1]] == data:
+                return entry
+            bucket = (bucket + 1) & self._mask
+
+    def _string(self, offset, length):
+        offset += self._pool_offset
+        return self._mapping[offset:offset + length].decode('utf-8')
+
+    def _localized_string(self, source, entry):
+        return LocalizedString(source, self._string(entry[2], entry[3]),
+                               None if entry[5] == _NO_COMMENT else self._string(entry[4], entry[5]))
+
+    def localized(self, source, default=None):
+        """
+        Look up the localized content only, without building a `LocalizedString`.
+
+        :type source: str
+        :param str default: value if there's no such source
+        :rtype: str
+        :return: the localized content, or the source if it's not translated
+        """
+        entry = self._entry(source)
+        if entry is None:
+            return default
+        return self._string(entry[2], entry[3]) or source
+
+    # Collections / Iters ----------------------------------------------------------------------------------------------
+
+    def __getitem__(self, source):
+        """
+        :rtype: tclocalizable.localized_string.LocalizedString
+        """
+        entry = self._entry(source)
+        if entry is None:
+            raise KeyError(source)
+        return self._localized_string(source, entry)
+
+    def get(self, source, default=None):
+        """
+        :rtype: tclocalizable.localized_string.LocalizedString
+        """
+        entry = self._entry(source)
+        return default if entry is None else self._localized_string(source, entry)
+
+    def __contains__(self, source):
+        return self._entry(source) is not None
+
+    def __len__(self):
+        return self._entry_count
+
+    def __iter__(self):
+        """
+        :rtype: collections.Iterator[str]
+        :return: sources in the order of the compiled table
+        """
+        for offset in range(self._entries_offset, self._pool_offset, _ENTRY.size):
+            source_offset, source_length = _ENTRY.unpack_from(self._mapping, offset)[:2]
+            yield self._string(source_offset, source_length)
+
+    def strings(self):
+        """
+        :rtype: collections.Iterator[tclocalizable.localized_string.LocalizedString]
+        :return: entries in the order of the compiled table
+        """
+        for offset in range(self._entries_offset, self._pool_offset, _ENTRY.size):
+            entry = _ENTRY.unpack_from(self._mapping, offset)
+            yield self._localized_string(self._string(entry[0], entry[1]), entry)
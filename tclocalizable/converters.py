@@ -0,0 +1,305 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from collections import namedtuple
+from itertools import groupby, islice
+import json
+import os
+import re
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape, quoteattr
+
+from tclocalizable import strings_writer
+from tclocalizable.localized_string import LocalizedString
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+XLIFF_NAMESPACE = 'urn:oasis:names:tc:xliff:document:1.2'
+
+# Characters which XML 1.0 can't represent, even as character references, but strings files could have as escapes.
+_XML_INVALID_PATTERN = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+XliffUnit = namedtuple('XliffUnit', ['original', 'source_language', 'target_language', 'localized_string'])
+"""A translation unit of an XLIFF file, with the original file and the languages of the `<file>` element it's in."""
+
+
+def _batches(iterable, batch_size=strings_writer.DEFAULT_BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+# JSON -----------------------------------------------------------------------------------------------------------------
+
+def _json_chunks(localized_strings, flat):
+    separator = '{\n'
+    for batch in _batches(localized_strings):
+        members = []
+        for localized_string in batch:
+            if flat:
+                value = localized_string.localized
+            else:
+                value = {'localized': localized_string.stored_localized, 'comment': localized_string.comment}
+            members.append('  ' + json.dumps(localized_string.source, ensure_ascii=False) + ': ' +
+                           json.dumps(value, ensure_ascii=False))
+        yield (separator + ',\n'.join(members)).encode('utf-8')
+        separator = ',\n'
+    yield ('{}\n' if separator == '{\n' else '\n}\n').encode('utf-8')
+
+
+def write_json(localized_strings, file_path, flat=False, atomic=True):
+    """
+    Write entries to a JSON file as an object of sources, batch by batch. Each source maps to an object of its
+    `localized` content (empty if not translated) and `comment`, or just to the localized content if `flat`.
+
+    :type localized_strings: collections.Iterable[LocalizedString]
+    :type file_path: str
+    :param bool flat: write localized content only, e.g. for web frontends
+    :type atomic: bool
+    """
+    strings_writer.write_chunks(file_path, _json_chunks(localized_strings, flat), atomic=atomic)
+
+
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _JSONObjectReader(object):
+    """
+    Decode members of a top-level JSON object one by one from a text stream, keeping only the current member in
+    memory.
+    """
+
+    def __init__(self, f, chunk_size):
+        """
+        :type f: io.TextIOWrapper
+        :type chunk_size: int
+        """
+        self._f = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+
+    def _fill(self):
+        """
+        :rtype: bool
+        :return: whether anything is read
+        """
+        data = self._f.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return bool(data)
+
+    def _peek(self):
+        """
+        :rtype: str
+        :return: the next character which is not whitespace, empty at the end of the stream
+        """
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, characters):
+        character = self._peek()
+        if not character or character not in characters:
+            raise ValueError('Expecting one of {!r}, but got {!r}'.format(characters, character or 'end of file'))
+        self._pos += 1
+        return character
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, self._pos = self._decoder.raw_decode(self._buffer, self._pos)
+                return value
+            except ValueError:
+                # Most likely a value cut at the end of the buffer. Otherwise, it fails again at the end of the stream.
+                if not self._fill():
+                    raise
+
+    def members(self):
+        """
+        :rtype: collections.Iterator[(str, object)]
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise ValueError('Expecting a string key, but got {!r}'.format(key))
+            self._expect(':')
+            yield key, self._value()
+            if self._expect(',}') == '}':
+                return
+
+
+def localized_strings_in_json_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Iterate entries of a JSON file written by `write_json`. The file is decoded entry by entry, so files of any size
+    are read in constant memory. Sources could map either to objects of `localized` and `comment`, or to the localized
+    content only.
+
+    :type file_path: str
+    :param int chunk_size: characters to read at once
+    :rtype: collections.Iterator[LocalizedString]
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for index, (source, value) in enumerate(_JSONObjectReader(f, chunk_size).members()):
+            if not source:
+                raise ValueError('{}: member {} has an empty key, which strings files can\'t have'.format(
+                    file_path, index + 1))
+            if isinstance(value, dict):
+                yield LocalizedString(source, value.get('localized'), value.get('comment'))
+            else:
+                yield LocalizedString(source, value)
+
+
+# XLIFF ----------------------------------------------------------------------------------------------------------------
+
+def _xliff_text(text):
+    # Carriage returns would be normalized to newlines by XML parsers.
+    return escape(text, {'\r': '&#13;'})
+
+
+def _xliff_chunks(tables, source_language, target_language):
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<xliff xmlns="{}" version="1.2">\n'.format(XLIFF_NAMESPACE)).encode('utf-8')
+    for original, localized_strings in tables:
+        attributes = 'original={} source-language={}'.format(quoteattr(original), quoteattr(source_language))
+        if target_language:
+            attributes += ' target-language={}'.format(quoteattr(target_language))
+        yield '  <file {} datatype="plaintext">\n    <body>\n'.format(attributes).encode('utf-8')
+        for batch in _batches(localized_strings):
+            units = []
+            for localized_string in batch:
+                unit = ('      <trans-unit id=' + quoteattr(localized_string.source) + ' xml:space="preserve">\n'
+                        '        <source>' + _xliff_text(localized_string.source) + '</source>\n')
+                if localized_string.stored_localized:
+                    unit += '        <target>' + _xliff_text(localized_string.stored_localized) + '</target>\n'
+                if localized_string.comment is not None:
+                    unit += '        <note>' + _xliff_text(localized_string.comment) + '</note>\n'
+                units.append(unit + '      </trans-unit>\n')
+            units = ''.join(units)
+            if _XML_INVALID_PATTERN.search(units):
+                for localized_string in batch:
+                    if any(text and _XML_INVALID_PATTERN.search(text) for text in
+                           (localized_string.source, localized_string.stored_localized, localized_string.comment)):
+                        raise ValueError('{!r} of {} has characters which XLIFF (XML 1.0) can\'t represent'.format(
+                            localized_string.source, original))
+            yield units.encode('utf-8')
+        yield '    </body>\n  </file>\n'.encode('utf-8')
+    yield '</xliff>\n'.encode('utf-8')
+
+
+def write_xliff(tables, file_path, source_language, target_language=None, atomic=True):
+    """
+    Write tables to an XLIFF 1.2 file, as exported by Xcode, with a `<file>` element of each table. Entries are written
+    batch by batch, so tables could be iterators of entries streamed from strings files. Untranslated entries have no
+    `<target>`, and comments are written as `<note>`. Entries with control characters other than tabs and line breaks
+    (e.g. `\\U0007`), which XML 1.0 can't represent, raise `ValueError` instead of writing a file that can't be read.
+
+    :param collections.Iterable[(str, collections.Iterable[LocalizedString])] tables: path of the original file (e.g.
+        `fr.lproj/Localizable.strings`) and entries of each table
+    :type file_path: str
+    :param str source_language: language of sources, e.g. `en`
+    :param str target_language: language of localized content, e.g. `fr`
+    :type atomic: bool
+    """
+    strings_writer.write_chunks(file_path, _xliff_chunks(tables, source_language, target_language), atomic=atomic)
+
+
+def _local_name(tag):
+    return tag.rpartition('}')[2]
+
+
+def xliff_units_in_file(file_path):
+    """
+    Iterate translation units of an XLIFF 1.2 file. Each unit is dropped from the parsed tree once it's yielded, so
+    files of any size are read in constant memory. Sources are the `id` of units, as keys of strings files.
+
+    :type file_path: str
+    :rtype: collections.Iterator[XliffUnit]
+    """
+    original = source_language = target_language = None
+    # `<body>` and `<group>` elements enclosing the current one, as units are removed from their parents.
+    parents = []
+    for event, element in iterparse(file_path, events=('start', 'end')):
+        tag = _local_name(element.tag)
+        if event == 'start':
+            if tag == 'file':
+                original = element.get('original')
+                source_language = element.get('source-language')
+                target_language = element.get('target-language')
+            elif tag == 'body' or tag == 'group':
+                parents.append(element)
+            continue
+        if tag == 'body' or tag == 'group':
+            parents.pop()
+            continue
+        if tag != 'trans-unit':
+            continue
+
+        texts = {}
+        for child in element:
+            texts[_local_name(child.tag)] = ''.join(child.itertext())
+        source = element.get('id') or texts.get('source')
+        if source:
+            yield XliffUnit(original, source_language, target_language,
+                            LocalizedString(source, texts.get('target'), texts.get('note')))
+        if parents:
+            parents[-1].remove(element)
+
+
+def import_xliff_file(file_path, root_path, encoding='utf-16'):
+    """
+    Write translation units of an XLIFF file to strings files of `<target language>.lproj` directories under a root
+    directory, named after the original files (e.g. units of `Main.storyboard` go to `Main.strings`). Units are
+    streamed into the strings files, so units of an original file must be contiguous, as exported by Xcode. Original
+    files which would be written to the same strings file (e.g. `A/Main.storyboard` and `B/Main.storyboard`) raise
+    `ValueError` instead of overwriting each other.
+
+    :type file_path: str
+    :type root_path: str
+    :param str encoding: encoding of strings files to write
+    :rtype: list[str]
+    :return: paths of strings files written
+    """
+    strings_file_paths = []
+    originals = {}
+    for (original, language), units in groupby(xliff_units_in_file(file_path),
+                                               key=lambda unit: (unit.original, unit.target_language or
+                                                                 unit.source_language)):
+        if not original or not language:
+            raise ValueError('{}: <file> elements need the original and the target language'.format(file_path))
+        table_name = os.path.splitext(os.path.basename(original))[0]
+        directory = os.path.join(root_path, language + '.lproj')
+        os.makedirs(directory, exist_ok=True)
+        strings_file_path = os.path.join(directory, table_name + '.strings')
+        if strings_file_path in originals:
+            raise ValueError('{}: both <file> elements of {} and {} would be written to {}'.format(
+                file_path, originals[strings_file_path], original, strings_file_path))
+        originals[strings_file_path] = original
+        strings_writer.write_localized_strings((unit.localized_string for unit in units), strings_file_path,
+                                               encoding=encoding)
+        strings_file_paths.append(strings_file_path)
+    return strings_file_paths
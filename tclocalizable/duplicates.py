@@ -0,0 +1,167 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from array import array
+from collections import namedtuple, OrderedDict
+import os
+
+from tclocalizable import strings_parser
+
+Duplicate = namedtuple('Duplicate', ['file_path', 'localized_string'])
+"""An entry defined more than once, and the file it's defined in."""
+
+
+def _source_hash(source, blake2b):
+    """
+    A 64-bit hash of the source, which is stable across processes unlike `hash`.
+
+    :type source: str
+    :param blake2b: `hashlib.blake2b`
+    :rtype: int
+    """
+    return int.from_bytes(blake2b(source.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _hash_sources(file_path, encoding):
+    """
+    Index a strings file, possibly in a worker process. Only hashes and spans are sent back, packed in arrays.
+
+    :type file_path: str
+    :type encoding: str
+    :rtype: (str, array, array)
+    :return: encoding, hashes of sources and flattened spans (offset, length and line of each entry)
+    """
+    # `hashlib` loads OpenSSL on import, so it's imported only when files are indexed.
+    from hashlib import blake2b
+    encoding = encoding or strings_parser.detect_encoding(file_path)
+    hashes = array('Q')
+    spans = array('q')
+    for source, span in strings_parser.source_spans_in_file(file_path, encoding=encoding):
+        hashes.append(_source_hash(source, blake2b))
+        spans.extend(span)
+    return encoding, hashes, spans
+
+
+def _hash_sources_or_error(file_path, encoding):
+    """
+    :type file_path: str
+    :type encoding: str
+    :rtype: (str, array, array) | str
+    :return: the index of `_hash_sources`, or the error reading the file
+    """
+    try:
+        return _hash_sources(file_path, encoding)
+    except (OSError, ValueError) as e:
+        return str(e)
+
+
+def duplicated_entries_in_grouped_files(grouped_file_paths, encoding=None, processes=None, errors=None):
+    """
+    Check sources defined more than once in each group of files, e.g. tables of each locale. Files are indexed across
+    worker processes. Only hashes of sources and the first position of each hash are kept, and entries are decoded only
+    for hashes seen more than once.
+
+    :param list[(object, str)] grouped_file_paths: group and path of each file
+    :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+    :param int processes: worker processes to index files, `None` to use all CPUs
+    :param dict[str, str] errors: dict to put the error of each file which can't be read in, by its path, and to check
+                                  the other files anyway. Errors are raised without it
+    :rtype: dict[object, dict[str, list[Duplicate]]]
+    :return: duplicated entries of each group with any
+    """
+    processes = min(processes or os.cpu_count() or 1, len(grouped_file_paths))
+    file_paths = [file_path for _, file_path in grouped_file_paths]
+    hash_sources = _hash_sources if errors is None else _hash_sources_or_error
+    if processes <= 1:
+        results = [hash_sources(file_path, encoding) for file_path in file_paths]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(hash_sources, file_paths, [encoding] * len(file_paths)))
+    if errors is not None:
+        for file_index, result in enumerate(results):
+            if isinstance(result, str):
+                errors[file_paths[file_index]] = result
+                results[file_index] = (None, (), ())
+
+    # A position is packed in an int as `file index << 32 | entry index`.
+    first_positions = {}
+    """:type: dict[object, dict[int, int]]"""
+    duplicated_positions = OrderedDict()
+    """:type: dict[(object, int), list[int]]"""
+    for file_index, ((group, _), (_, hashes, _)) in enumerate(zip(grouped_file_paths, results)):
+        group_first_positions = first_positions.setdefault(group, {})
+        file_position = file_index << 32
+        for entry_index, source_hash in enumerate(hashes):
+            position = file_position | entry_index
+            first_position = group_first_positions.setdefault(source_hash, position)
+            if first_position != position:
+                duplicated_positions.setdefault((group, source_hash), [first_position]).append(position)
+    del first_positions
+
+    # Decode entries of duplicated hashes, file by file.
+    positions_by_file = {}
+    for positions in duplicated_positions.values():
+        for position in positions:
+            positions_by_file.setdefault(position >> 32, []).append(position)
+    localized_strings = {}
+    for file_index, positions in positions_by_file.items():
+        file_encoding, _, spans = results[file_index]
+        strings_buffer = strings_parser.StringsBuffer.from_file(file_paths[file_index], encoding=file_encoding)
+        for position in positions:
+            span_start = (position & 0xffffffff) * 3
+            span = strings_parser.EntrySpan(*spans[span_start:span_start + 3])
+            localized_strings[position] = strings_buffer.localized_string(span)
+
+    duplicated_entries = OrderedDict()
+    for (group, _), positions in duplicated_positions.items():
+        # Regroup by the sources themselves, in case of hash collisions.
+        duplicates_by_source = OrderedDict()
+        for position in positions:
+            localized_string = localized_strings[position]
+            duplicates_by_source.setdefault(localized_string.source, []).append(
+                Duplicate(file_paths[position >> 32], localized_string))
+        for source, duplicates in duplicates_by_source.items():
+            if len(duplicates) > 1:
+                duplicated_entries.setdefault(group, OrderedDict())[source] = duplicates
+    return duplicated_entries
+
+
+def duplicated_entries_in_file(file_path, encoding='utf-16'):
+    """
+    :type file_path: str
+    :type encoding: str
+    :rtype: dict[str, list[tclocalizable.localized_string.LocalizedString]]
+    """
+    duplicated_entries = duplicated_entries_in_grouped_files([(None, file_path)], encoding=encoding,
+                                                             processes=1).get(None, {})
+    return OrderedDict((source, [duplicate.localized_string for duplicate in duplicates])
+                       for source, duplicates in duplicated_entries.items())
+
+
+def duplicated_entries_in_files(file_paths, encoding=None, processes=None):
+    """
+    Check sources defined more than once in a set of files, e.g. tables of a locale, including sources duplicated
+    within a file. Files are indexed across worker processes.
+
+    :type file_paths: list[str]
+    :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+    :param int processes: worker processes to index files, `None` to use all CPUs
+    :rtype: dict[str, list[Duplicate]]
+    """
+    return duplicated_entries_in_grouped_files([(None, file_path) for file_path in file_paths], encoding=encoding,
+                                               processes=processes).get(None, {})
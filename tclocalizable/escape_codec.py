@@ -0,0 +1,108 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import re
+
+# Escape sequences of strings files, as read by `CFPropertyList`: C escapes of a single character, `\U` followed by up
+# to 4 hexadecimal digits of an UTF-16 code unit, and up to 3 octal digits. Any other escaped character is itself.
+_ESCAPE_SEQUENCE_PATTERN = re.compile(r'\\(?:U([0-9A-Fa-f]{1,4})|([0-7]{1,3})|(.))', re.DOTALL)
+_ESCAPED_CHARACTERS = {'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+_SURROGATE_PATTERN = re.compile('[\ud800-\udfff]')
+
+# Control characters without C escapes, which are written as `\U` escapes.
+_CONTROL_CHARACTER_PATTERN = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Joins strings escaped at once. Strings containing it are escaped one by one instead.
+_SEPARATOR = '\x00'
+
+
+def _unescaped_character(match):
+    hexadecimal, octal, character = match.groups()
+    if hexadecimal is not None:
+        return chr(int(hexadecimal, 16))
+    elif octal is not None:
+        # Octal escapes are bytes of the NeXTSTEP encoding, which has no codec. They are ASCII up to \177, and Latin-1
+        # is the closest approximation above it.
+        return chr(int(octal, 8) & 0xff)
+    return _ESCAPED_CHARACTERS.get(character, character)
+
+
+def unescape(quoted_string):
+    """
+    Unescape the content between quotes of a strings file. Surrogate pairs written as two `\\U` escapes are combined,
+    and lone surrogates are replaced by U+FFFD.
+
+    :type quoted_string: str
+    :rtype: str
+    """
+    if '\\' not in quoted_string:
+        return quoted_string
+    # Split by escaped backslashes, so every backslash left starts an escape sequence. Common escapes are replaced in C,
+    # and only parts with other escapes are unescaped by the regular expression.
+    parts = quoted_string.split('\\\\')
+    escaped_code_units = False
+    for idx, part in enumerate(parts):
+        if '\\' in part:
+            part = part.replace('\\"', '"').replace('\\n', '\n').replace('\\t', '\t').replace('\\r', '\r')
+            if '\\' in part:
+                part = _ESCAPE_SEQUENCE_PATTERN.sub(_unescaped_character, part)
+                escaped_code_units = True
+            parts[idx] = part
+    result = '\\'.join(parts)
+    if escaped_code_units and _SURROGATE_PATTERN.search(result):
+        result = result.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'replace')
+    return result
+
+
+def _escaped_control_character(match):
+    return '\\U{:04x}'.format(ord(match.group()))
+
+
+def escape(string):
+    """
+    Escape a string to be written between quotes of a strings file. Backslashes, quotes, newlines, carriage returns and
+    tabs are escaped in C style, and other control characters as `\\U` escapes.
+
+    :type string: str
+    :rtype: str
+    """
+    string = string.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r') \
+        .replace('\t', '\\t')
+    if _CONTROL_CHARACTER_PATTERN.search(string):
+        string = _CONTROL_CHARACTER_PATTERN.sub(_escaped_control_character, string)
+    return string
+
+
+def escape_all(strings):
+    """
+    Escape many strings at once. They are joined into one buffer which is escaped by a single pass of each replacement,
+    instead of paying for all replacements of every string.
+
+    :type strings: list[str]
+    :rtype: list[str]
+    """
+    joined = _SEPARATOR.join(strings)
+    if joined.count(_SEPARATOR) != len(strings) - 1:
+        return [escape(string) for string in strings]
+    escaped_strings = joined.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') \
+        .replace('\r', '\\r').replace('\t', '\\t').split(_SEPARATOR)
+    # Checking printable strings takes a single pass in C, and only strings which are not are searched for control
+    # characters left.
+    if not all(map(str.isprintable, escaped_strings)):
+        for idx, escaped_string in enumerate(escaped_strings):
+            if not escaped_string.isprintable() and _CONTROL_CHARACTER_PATTERN.search(escaped_string):
+                escaped_strings[idx] = _CONTROL_CHARACTER_PATTERN.sub(_escaped_control_character, escaped_string)
+    return escaped_strings
@@ -0,0 +1,250 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from collections import namedtuple, OrderedDict
+import os
+import re
+
+from tclocalizable import strings_parser
+
+# Format specifiers of `NSString` and printf: `%%`, or an optional `n$` position, flags, width and precision (either may
+# be `*` or `*n$`, which take an int argument), a length modifier and a conversion.
+_SPECIFIER_PATTERN = re.compile(r"%(?:%|(?:([1-9][0-9]*)\$)?[-+ #0']*(\*(?:[1-9][0-9]*\$)?|[0-9]+)?"
+                                r"(?:\.(\*(?:[1-9][0-9]*\$)?|[0-9]*))?"
+                                r"(hh|h|ll|l|q|L|z|t|j)?([@dDiuUxXoOfFeEgGaAcCsSp]))")
+# The space flag makes prose look like specifiers, e.g. `50% off` (`% o`) or `20% today` (`% td`), so sources are only
+# format strings with specifiers (or `%%`) without it. Their localized content is then matched like `NSString` does.
+_FORMAT_STRING_PATTERN = re.compile(_SPECIFIER_PATTERN.pattern.replace("[-+ #0']", "[-+#0']"))
+# Conversions taking the same argument type, regardless of signedness and notation.
+_CONVERSION_TYPES = {'@': '@', 'd': 'd', 'i': 'd', 'u': 'd', 'x': 'd', 'X': 'd', 'o': 'd', 'D': 'ld', 'U': 'ld',
+                     'O': 'ld', 'f': 'f', 'F': 'f', 'e': 'f', 'E': 'f', 'g': 'f', 'G': 'f', 'a': 'f', 'A': 'f',
+                     'c': 'c', 'C': 'C', 's': 's', 'S': 'S', 'p': 'p'}
+# Joins strings matched at once. Specifiers never contain it, so no match spans two strings.
+_SEPARATOR = '\x00'
+# Specifiers or separators, without groups so `findall` returns whole matches.
+_SIGNATURE_PATTERN = re.compile(_SEPARATOR + '|' + re.sub(r'\((?!\?)', '(?:', _SPECIFIER_PATTERN.pattern))
+
+FormatSpecifier = namedtuple('FormatSpecifier', ['position', 'argument_type', 'text'])
+"""
+A specifier, or a `*` width or precision, taking an argument: its position (explicit, or counted from left to right),
+the type of the argument (like `@`, `d`, `ld`, `f` or `s`) and its text.
+"""
+
+FormatProblem = namedtuple('FormatProblem', ['localized_string', 'kind', 'field', 'position', 'expected', 'actual'])
+"""
+A problem of specifiers of an entry. Kinds are:
+
+- `mixed`: the `source` or `localized` mixes specifiers with and without positions
+- `gap`: a position before the last one of `source` or `localized` is not used
+- `conflict`: a position of `source` or `localized` is used with two argument types, `expected` and `actual`
+- `extra`: `localized` uses a position which `source` doesn't
+- `missing`: `localized` doesn't use a position which `source` does
+- `type`: `localized` uses a position with another argument type than `source`
+"""
+
+_DESCRIPTIONS = {
+    'mixed': '{field} mixes specifiers with and without positions',
+    'gap': '{field} skips argument {position}',
+    'conflict': '{field} uses argument {position} as both %{expected} and %{actual}',
+    'extra': 'localized uses argument {position}, which source does not',
+    'missing': 'localized does not use argument {position} (%{expected})',
+    'type': 'localized uses argument {position} as %{actual} instead of %{expected}',
+}
+
+
+def describe(format_problem):
+    """
+    :type format_problem: FormatProblem
+    :rtype: str
+    """
+    return _DESCRIPTIONS[format_problem.kind].format(**format_problem._asdict())
+
+
+def _argument_type(length_modifier, conversion):
+    argument_type = _CONVERSION_TYPES[conversion]
+    if not length_modifier:
+        return argument_type
+    elif argument_type == 'd':
+        return {'q': 'll'}.get(length_modifier, length_modifier) + 'd'
+    elif argument_type == 'f':
+        return 'Lf' if length_modifier == 'L' else 'f'
+    elif length_modifier == 'l' and argument_type in ('c', 's'):
+        return argument_type.upper()
+    return argument_type
+
+
+def _specifiers(string):
+    """
+    :type string: str
+    :rtype: (list[FormatSpecifier], bool)
+    :return: specifiers, and whether specifiers with and without positions are mixed
+    """
+    format_specifiers = []
+    positional = sequential = False
+    next_position = 1
+    for match in _SPECIFIER_PATTERN.finditer(string):
+        position, width, precision, length_modifier, conversion = match.groups()
+        if conversion is None:  # `%%`
+            continue
+        for star in (width, precision):
+            if star is not None and star.startswith('*'):
+                if len(star) > 1:
+                    positional = True
+                    format_specifiers.append(FormatSpecifier(int(star[1:-1]), 'd', match.group()))
+                else:
+                    sequential = True
+                    format_specifiers.append(FormatSpecifier(next_position, 'd', match.group()))
+                    next_position += 1
+        if position is not None:
+            positional = True
+            position = int(position)
+        else:
+            sequential = True
+            position = next_position
+            next_position += 1
+        format_specifiers.append(FormatSpecifier(position, _argument_type(length_modifier, conversion),
+                                                 match.group()))
+    return format_specifiers, positional and sequential
+
+
+def format_specifiers(string):
+    """
+    :type string: str
+    :rtype: list[FormatSpecifier]
+    :return: specifiers taking arguments, in the order they appear
+    """
+    return _specifiers(string)[0]
+
+
+def _arguments(field, signature, problems):
+    """
+    :param str field: `source` or `localized`
+    :param str signature: specifiers of the field
+    :param list problems: list to append `(kind, field, position, expected, actual)` of problems to
+    :rtype: dict[int, str]
+    :return: argument type of each position
+    """
+    format_specifiers, mixed = _specifiers(signature)
+    if mixed:
+        problems.append(('mixed', field, None, None, None))
+    arguments = {}
+    for format_specifier in format_specifiers:
+        argument_type = arguments.setdefault(format_specifier.position, format_specifier.argument_type)
+        if argument_type != format_specifier.argument_type:
+            problems.append(('conflict', field, format_specifier.position, argument_type,
+                             format_specifier.argument_type))
+    for position in range(1, max(arguments, default=0)):
+        if position not in arguments:
+            problems.append(('gap', field, position, None, None))
+    return arguments
+
+
+def _signature_problems(source_signature, localized_signature):
+    """
+    :param str source_signature: specifiers of a source
+    :param str localized_signature: specifiers of its localized content
+    :rtype: list[(str, str, int, str, str)]
+    :return: kind, field, position, expected and actual of each problem
+    """
+    problems = []
+    source_arguments = _arguments('source', source_signature, problems)
+    localized_arguments = _arguments('localized', localized_signature, problems)
+    for position in sorted(set(source_arguments) | set(localized_arguments)):
+        expected = source_arguments.get(position)
+        actual = localized_arguments.get(position)
+        if expected is None:
+            problems.append(('extra', 'localized', position, None, actual))
+        elif actual is None:
+            problems.append(('missing', 'localized', position, expected, None))
+        elif expected != actual:
+            problems.append(('type', 'localized', position, expected, actual))
+    return problems
+
+
+def format_problems(localized_strings):
+    """
+    Check specifiers of localized content against the ones of sources. Only entries with translations whose sources
+    have specifiers (or `%%`) are checked, as sources without any are not format strings. Specifiers with the space flag
+    alone don't make a format string, as they are mostly percentages followed by words.
+
+    Instead of matching strings one by one, sources and localized content of all entries with any `%` are joined and
+    matched in a single pass, which reduces each string to its signature, the concatenation of its specifiers. Entries
+    mostly share a few signatures, so each pair of signatures is only checked once.
+
+    :type localized_strings: collections.Iterable[tclocalizable.localized_string.LocalizedString]
+    :rtype: list[FormatProblem]
+    """
+    entries = [localized_string for localized_string in localized_strings
+               if localized_string.stored_localized and '%' in localized_string.source]
+    if not entries:
+        return []
+    strings = []
+    for localized_string in entries:
+        strings.append(localized_string.source)
+        strings.append(localized_string.stored_localized)
+    signatures = ''.join(_SIGNATURE_PATTERN.findall(_SEPARATOR.join(strings))).split(_SEPARATOR)
+    if len(signatures) != len(strings):  # Some strings contain the separator.
+        signatures = [''.join(_SIGNATURE_PATTERN.findall(string)).replace(_SEPARATOR, '') for string in strings]
+
+    problems = []
+    signature_problems = {}
+    format_strings = {}
+    for localized_string, source_signature, localized_signature in zip(entries, signatures[::2], signatures[1::2]):
+        if not source_signature:
+            continue
+        format_string = format_strings.get(source_signature)
+        if format_string is None:
+            format_string = format_strings[source_signature] = bool(_FORMAT_STRING_PATTERN.search(source_signature))
+        if not format_string:
+            continue
+        key = (source_signature, localized_signature)
+        entry_problems = signature_problems.get(key)
+        if entry_problems is None:
+            entry_problems = signature_problems[key] = _signature_problems(source_signature, localized_signature)
+        for problem in entry_problems:
+            problems.append(FormatProblem(localized_string, *problem))
+    return problems
+
+
+def format_problems_in_file(file_path, encoding='utf-16'):
+    """
+    :type file_path: str
+    :param str encoding: encoding of the file, `None` to detect UTF-8 or UTF-16
+    :rtype: list[FormatProblem]
+    """
+    return format_problems(strings_parser.localized_strings_in_file(file_path, encoding=encoding))
+
+
+def format_problems_in_files(file_paths, encoding=None, processes=None):
+    """
+    Check specifiers of entries of many files, e.g. tables of all locales, across worker processes.
+
+    :type file_paths: list[str]
+    :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+    :param int processes: worker processes to check files, `None` to use all CPUs
+    :rtype: dict[str, list[FormatProblem]]
+    :return: problems of each file with any
+    """
+    processes = min(processes or os.cpu_count() or 1, len(file_paths))
+    if processes <= 1:
+        results = [format_problems_in_file(file_path, encoding) for file_path in file_paths]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(format_problems_in_file, file_paths, [encoding] * len(file_paths),
+                                        chunksize=8))
+    return OrderedDict((file_path, problems) for file_path, problems in zip(file_paths, results) if problems)
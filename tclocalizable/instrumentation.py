@@ -0,0 +1,111 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from collections import namedtuple, OrderedDict
+
+Measurement = namedtuple('Measurement', ['phase', 'seconds', 'bytes_read', 'bytes_written', 'entries'])
+"""A measurement of a phase, sent to the callback of an instrumentation."""
+
+_PHASE_STATS_FIELDS = ('calls', 'seconds', 'bytes_read', 'bytes_written', 'entries')
+
+# Instrumentations entered, the innermost last. Hot paths check it once per call (or per chunk), so there's nothing to
+# pay when no instrumentation is entered.
+_active_instrumentations = []
+
+
+def current():
+    """
+    :rtype: Instrumentation
+    :return: the innermost instrumentation entered, or `None`
+    """
+    return _active_instrumentations[-1] if _active_instrumentations else None
+
+
+class Instrumentation(object):
+    """
+    Collect timings and counts of reading, writing and merging strings tables while it's entered. Phases are:
+
+    - `io.read`: reading (or slicing the mapping of) files with bytes read, including transcoding files not in UTF-8
+      or UTF-16 (counted in UTF-8), and reading existing files to compare with for `skip_unchanged`
+    - `parse`: scanning, decoding and building entries with entries parsed
+    - `read_file`: `StringsTable.read_file` as a whole, including `io.read` and `parse` (or loading from a cache)
+    - `serialize`: formatting and encoding entries with entries written
+    - `io.write`: writing files with bytes written
+    - `write_file`: writing a strings file as a whole, including `serialize`, `io.write` and comparisons
+    - `merge`: merging a table into another by `StringsTable.merge` or `merge_into` with entries merged
+
+    Bytes and entries are only counted by the innermost phases, so they could be summed across phases. Chunks are
+    scanned entirely before their entries are yielded while parsing is measured, so time spent by consumers of
+    iterators is never counted as parsing.
+
+    Instrumentations are shared by all threads of a process, and nested ones only collect what's run in the innermost.
+    """
+
+    def __init__(self, callback=None):
+        """
+        :param callback: callable called with a `Measurement` each time a phase is measured
+        """
+        self.callback = callback
+        self.phases = OrderedDict()
+        """:type: dict[str, list]: stats of each phase, in the order of `_PHASE_STATS_FIELDS`"""
+        self.peak_entry_count = 0
+        """:type: int"""
+
+    def __enter__(self):
+        _active_instrumentations.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _active_instrumentations.remove(self)
+
+    def record(self, phase, seconds, bytes_read=0, bytes_written=0, entries=0):
+        """
+        :param str phase: name of the phase
+        :param float seconds: time spent in the phase
+        :param int bytes_read: bytes read from files
+        :param int bytes_written: bytes written to files
+        :param int entries: entries processed
+        """
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = [0, 0.0, 0, 0, 0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += bytes_read
+        stats[3] += bytes_written
+        stats[4] += entries
+        if self.callback is not None:
+            self.callback(Measurement(phase, seconds, bytes_read, bytes_written, entries))
+
+    def record_entry_count(self, entry_count):
+        """
+        :param int entry_count: entries held by a table after an operation
+        """
+        if entry_count > self.peak_entry_count:
+            self.peak_entry_count = entry_count
+
+    def as_dict(self):
+        """
+        :rtype: dict
+        :return: stats of each phase (calls, seconds, bytes read and written, and entries), and the peak entry count of
+                 tables, in plain types for metrics pipelines
+        """
+        return {
+            'phases': OrderedDict((phase, OrderedDict(zip(_PHASE_STATS_FIELDS, stats)))
+                                  for phase, stats in self.phases.items()),
+            'peak_entry_count': self.peak_entry_count,
+        }
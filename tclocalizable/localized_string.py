@@ -16,12 +16,15 @@
 
 
 class LocalizedString(object):
+    __slots__ = ('source', '_localized', '_comment', 'line', 'offset', '_journal')
 
-    def __init__(self, source, localized=None, comment=None):
+    def __init__(self, source, localized=None, comment=None, line=None, offset=None):
         """
         :type source: str
         :type localized: str
         :type comment: str
+        :param int line: line number of the entry in the file it's read from
+        :param int offset: byte offset of the entry in the file it's read from
         :rtype: LocalizedString
         """
         assert source, 'Source could not be none'
@@ -30,8 +33,14 @@ class LocalizedString(object):
         """:type: str"""
         self._localized = localized or ''
         """:type: str"""
-        self.comment = comment
+        self._comment = comment
         """:type: str"""
+        self.line = line
+        """:type: int"""
+        self.offset = offset
+        """:type: int"""
+        self._journal = None
+        """:type: tclocalizable.change_journal.ChangeJournal"""
 
     @property
     def localized(self):
@@ -45,8 +54,26 @@ class LocalizedString(object):
         """
         :type new_localized: str
         """
+        if self._journal is not None:
+            self._journal.record_field(self, 'localized', self._localized, new_localized)
         self._localized = new_localized
 
+    @property
+    def comment(self):
+        """
+        :rtype: str
+        """
+        return self._comment
+
+    @comment.setter
+    def comment(self, new_comment):
+        """
+        :type new_comment: str
+        """
+        if self._journal is not None:
+            self._journal.record_field(self, 'comment', self._comment, new_comment)
+        self._comment = new_comment
+
     @property
     def stored_localized(self):
         """
@@ -54,21 +81,27 @@ class LocalizedString(object):
         """
         return self._localized
 
+    def copy(self):
+        """
+        :rtype: LocalizedString
+        :return: a detached copy, which is not recorded by the change journal of this one
+        """
+        return LocalizedString(self.source, self._localized, self._comment, line=self.line, offset=self.offset)
+
     def __str__(self):
         return repr(self)
 
     def __repr__(self):
-        escaped_source = self.source.replace('"', r'\"')
-        escaped_localized = self._localized.replace('"', r'\"') if self._localized else ''
-        result = '"{escaped_source}" = "{escaped_localized}";'.format(**locals())
-
-        if self.comment:
-            result = '/* {} */\n{}'.format(self.comment, result)
-
+        # The same format as entries written by `strings_writer`, which escapes entries batch by batch instead.
+        from tclocalizable.escape_codec import escape
+        result = '"' + escape(self.source) + '" = "' + escape(self._localized) + '";'
+        if self._comment:
+            result = '/* ' + self._comment + ' */\n' + result
         return result
 
     def __eq__(self, other):
         if not isinstance(other, LocalizedString):
             return False
         else:
-            return self.source == other.source and self._localized == other._localized and self.comment == other.comment
+            return (self.source == other.source and self._localized == other._localized and
+                    self._comment == other._comment)
@@ -0,0 +1,180 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import namedtuple
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+from tclocalizable import strings_parser
+from tclocalizable.localized_string import LocalizedString
+
+# Bump it whenever the parsed result of the same file may change, so snapshots of older versions are never used.
+CACHE_FORMAT_VERSION = 2
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+CacheEntry = namedtuple('CacheEntry', ['file_path', 'encoding', 'size', 'last_used'])
+"""A snapshot in the cache: the strings file it's parsed from, its size in the cache and the last time it's used."""
+
+
+def _file_hash(file_path):
+    """
+    :type file_path: str
+    :rtype: bytes
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(strings_parser.DEFAULT_MMAP_WINDOW_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class ParseCache(object):
+    """
+    On-disk cache of parsed strings files. Each file is stored as a marshal snapshot of its entries, and is validated by
+    the path, mtime and size of the strings file (and optionally the hash of its content) before being used. When the
+    cache grows larger than `max_size`, least recently used snapshots are evicted.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, verify_hash=False):
+        """
+        :param str directory: directory to store snapshots in, created if it doesn't exist
+        :param int max_size: maximum total bytes of snapshots
+        :param bool verify_hash: also compare the hash of file content, for file systems with coarse mtime
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.verify_hash = verify_hash
+        os.makedirs(directory, exist_ok=True)
+
+    def _snapshot_path(self, file_path, encoding):
+        key = '{}\0{}'.format(os.path.realpath(file_path), encoding or '').encode('utf-8')
+        return os.path.join(self.directory, hashlib.sha1(key).hexdigest() + '.cache')
+
+    @staticmethod
+    def _load(snapshot_path, with_entries=True):
+        """
+        A snapshot file is the marshal of its header `(format version, file path, encoding, mtime, size, hash)` followed
+        by the marshal of its entries.
+
+        :type snapshot_path: str
+        :type with_entries: bool
+        :rtype: (tuple, list)
+        """
+        try:
+            with open(snapshot_path, 'rb') as f:
+                header = marshal.load(f)
+                if header[0] != CACHE_FORMAT_VERSION:
+                    return None, None
+                return header, marshal.load(f) if with_entries else None
+        except (OSError, EOFError, ValueError, TypeError, IndexError):
+            return None, None
+
+    def _validation(self, file_path):
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size, _file_hash(file_path) if self.verify_hash else None
+
+    # Entries ----------------------------------------------------------------------------------------------------------
+
+    def localized_strings_in_file(self, file_path, encoding='utf-16', intern=False, **kwargs):
+        """
+        Iterate entries of a strings file from its snapshot, or parse the file and store a snapshot of it.
+
+        :type file_path: str
+        :type encoding: str
+        :param bool intern: intern sources and comments
+        :param kwargs: other options of `strings_parser.localized_strings_in_file`, used on cache misses
+        :rtype: collections.Iterator[LocalizedString]
+        """
+        snapshot_path = self._snapshot_path(file_path, encoding)
+        validation = self._validation(file_path)
+
+        header, entries = self._load(snapshot_path)
+        if header is not None and tuple(header[3:6]) == validation:
+            os.utime(snapshot_path)  # Mark as recently used.
+        else:
+            entries = [(s.source, s.stored_localized, s.comment, s.line, s.offset)
+                       for s in strings_parser.localized_strings_in_file(file_path, encoding=encoding, **kwargs)]
+            self._store(snapshot_path, (CACHE_FORMAT_VERSION, file_path, encoding) + validation, entries)
+
+        for source, localized, comment, line, offset in entries:
+            if intern:
+                source = sys.intern(source)
+                comment = sys.intern(comment) if comment else comment
+            yield LocalizedString(source, localized, comment, line=line, offset=offset)
+
+    def _store(self, snapshot_path, header, entries):
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as f:
+            marshal.dump(header, f)
+            marshal.dump(entries, f)
+        os.replace(f.name, snapshot_path)
+        self.evict()
+
+    # Management -------------------------------------------------------------------------------------------------------
+
+    def entries(self):
+        """
+        Snapshots in the cache, least recently used first.
+
+        :rtype: list[CacheEntry]
+        """
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.cache'):
+                continue
+            snapshot_path = os.path.join(self.directory, file_name)
+            header, _ = self._load(snapshot_path, with_entries=False)
+            if header is not None:
+                stat = os.stat(snapshot_path)
+                entries.append(CacheEntry(header[1], header[2], stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry.last_used)
+
+    def size(self):
+        """
+        :rtype: int
+        :return: total bytes of snapshots
+        """
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.cache'))
+
+    def evict(self):
+        """
+        Remove least recently used snapshots until the cache fits in `max_size`.
+        """
+        snapshots = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                           for entry in os.scandir(self.directory) if entry.name.endswith('.cache'))
+        total_size = sum(size for _, size, _ in snapshots)
+        for _, size, snapshot_path in snapshots:
+            if total_size <= self.max_size:
+                break
+            os.remove(snapshot_path)
+            total_size -= size
+
+    def invalidate(self, file_path, encoding='utf-16'):
+        """
+        :type file_path: str
+        :type encoding: str
+        """
+        try:
+            os.remove(self._snapshot_path(file_path, encoding))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache') or entry.name.endswith('.tmp'):
+                os.remove(entry.path)
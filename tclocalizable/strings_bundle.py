@@ -0,0 +1,207 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import namedtuple, OrderedDict
+import os
+
+from tclocalizable import duplicates, format_specifiers, strings_parser
+from tclocalizable.localized_string import LocalizedString
+from tclocalizable.strings_table import StringsTable
+
+StringsFile = namedtuple('StringsFile', ['path', 'encoding'])
+"""A strings file of a bundle and its (detected) encoding."""
+
+
+def _read_strings_file(file_path, encoding):
+    """
+    Parse a strings file in a worker process. Entries are sent back as plain tuples, which are much cheaper to pickle
+    than `LocalizedString` instances.
+
+    :type file_path: str
+    :type encoding: str
+    :rtype: (str, list[(str, str, str, int, int)])
+    """
+    encoding = encoding or strings_parser.detect_encoding(file_path)
+    return encoding, [(s.source, s.stored_localized, s.comment, s.line, s.offset)
+                      for s in strings_parser.localized_strings_in_file(file_path, encoding=encoding)]
+
+
+class StringsBundle(OrderedDict):
+    """
+    Strings tables of all `*.lproj` directories under a root directory, as a mapping of locale -> table name ->
+    `StringsTable`. For example, `en.lproj/Localizable.strings` is `bundle['en']['Localizable']`.
+    """
+
+    def __init__(self, root_path=None, encoding=None, processes=None):
+        """
+        :param str root_path: directory to discover `*.lproj/*.strings` files in
+        :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+        :param int processes: worker processes to parse files, `None` to use all CPUs
+        """
+        super(StringsBundle, self).__init__()
+        self.files = OrderedDict()
+        """:type: dict[(str, str), StringsFile]"""
+        if root_path:
+            self.read_directory(root_path, encoding=encoding, processes=processes)
+
+    # I/O --------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def strings_files_in_directory(root_path):
+        """
+        :type root_path: str
+        :rtype: collections.Iterator[(str, str, str)]
+        :return: locale, table name and path of each strings file
+        """
+        for dir_path, dir_names, file_names in os.walk(root_path):
+            dir_names.sort()
+            if not dir_path.endswith('.lproj'):
+                continue
+            locale = os.path.basename(dir_path)[:-len('.lproj')]
+            for file_name in sorted(file_names):
+                if file_name.endswith('.strings'):
+                    yield locale, file_name[:-len('.strings')], os.path.join(dir_path, file_name)
+
+    @staticmethod
+    def duplicated_entries_in_directory(root_path, encoding=None, processes=None):
+        """
+        Check sources defined more than once among the tables of each locale, without reading the tables.
+
+        :type root_path: str
+        :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+        :param int processes: worker processes to index files, `None` to use all CPUs
+        :rtype: dict[str, dict[str, list[tclocalizable.duplicates.Duplicate]]]
+        :return: duplicated entries of each locale with any
+        """
+        return duplicates.duplicated_entries_in_grouped_files(
+            [(locale, file_path) for locale, _, file_path in StringsBundle.strings_files_in_directory(root_path)],
+            encoding=encoding, processes=processes)
+
+    @staticmethod
+    def format_problems_in_directory(root_path, encoding=None, processes=None):
+        """
+        Check format specifiers of localized content against the ones of sources in all tables, without reading the
+        tables.
+
+        :type root_path: str
+        :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+        :param int processes: worker processes to check files, `None` to use all CPUs
+        :rtype: dict[(str, str), list[tclocalizable.format_specifiers.FormatProblem]]
+        :return: problems of each table with any, by its locale and table name
+        """
+        strings_files = list(StringsBundle.strings_files_in_directory(root_path))
+        format_problems = format_specifiers.format_problems_in_files(
+            [file_path for _, _, file_path in strings_files], encoding=encoding, processes=processes)
+        return OrderedDict(((locale, table_name), format_problems[file_path])
+                           for locale, table_name, file_path in strings_files if file_path in format_problems)
+
+    def read_directory(self, root_path, encoding=None, processes=None):
+        """
+        Discover and parse all `*.lproj/*.strings` files under the root directory across a process pool.
+
+        :type root_path: str
+        :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+        :param int processes: worker processes to parse files, `None` to use all CPUs
+        """
+        strings_files = list(self.strings_files_in_directory(root_path))
+        file_paths = {key: strings_file.path for key, strings_file in self.files.items()}
+        for locale, table_name, file_path in strings_files:
+            if (locale, table_name) in file_paths:
+                raise ValueError('Both {} and {} are table {} of locale {}'.format(
+                    file_paths[(locale, table_name)], file_path, table_name, locale))
+            file_paths[(locale, table_name)] = file_path
+
+        processes = min(processes or os.cpu_count() or 1, len(strings_files))
+        if processes <= 1:
+            results = (_read_strings_file(file_path, encoding) for _, _, file_path in strings_files)
+            self._add_tables(strings_files, results)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = executor.map(_read_strings_file, [file_path for _, _, file_path in strings_files],
+                                       [encoding] * len(strings_files))
+                self._add_tables(strings_files, results)
+
+    def _add_tables(self, strings_files, results):
+        for (locale, table_name, file_path), (file_encoding, entries) in zip(strings_files, results):
+            strings_table = StringsTable()
+            for source, localized, comment, line, offset in entries:
+                strings_table[source] = LocalizedString(source, localized, comment, line=line, offset=offset)
+            self.setdefault(locale, OrderedDict())[table_name] = strings_table
+            self.files[(locale, table_name)] = StringsFile(file_path, file_encoding)
+
+    def write_files(self, skip_unchanged=True):
+        """
+        Write tables back to the files they are read from, in their original encodings. Tables without files are not
+        written.
+
+        :param bool skip_unchanged: don't touch files which already have the same content, so their mtimes are kept
+        :rtype: list[(str, str)]
+        :return: locale and table name of tables actually written
+        """
+        written_tables = []
+        for locale, table_name, strings_table in self.tables():
+            strings_file = self.files.get((locale, table_name))
+            if strings_file is None:
+                continue
+            if strings_table.write_file(strings_file.path, encoding=strings_file.encoding,
+                                        skip_unchanged=skip_unchanged):
+                written_tables.append((locale, table_name))
+        return written_tables
+
+    # Interfaces -------------------------------------------------------------------------------------------------------
+
+    def merge_base_locale(self, base_locale, keep_comment=True, keep_localized=True, exclude_extra=False):
+        """
+        Merge each table of the base locale (e.g. the development language) into the tables of the same name of all
+        other locales.
+
+        :param str base_locale: locale to merge from
+        :param bool keep_comment: keep comment of duplicated/existed localized strings
+        :param bool keep_localized: keep localized content of duplicated/existed localized strings
+        :param bool exclude_extra: exclude localized strings which don't exist in the base table
+        :rtype: dict[(str, str), tclocalizable.strings_table.MergeStats]
+        :return: stats of each merged table by its locale and table name
+        :raise KeyError: if the bundle has no tables of the base locale
+        """
+        if base_locale not in self:
+            raise KeyError('No tables of the base locale {}'.format(base_locale))
+        merge_stats = OrderedDict()
+        for table_name, base_strings_table in self[base_locale].items():
+            strings_tables = OrderedDict((locale, strings_tables[table_name]) for locale, strings_tables in self.items()
+                                         if locale != base_locale and table_name in strings_tables)
+            for locale, stats in base_strings_table.merge_into(strings_tables, keep_comment=keep_comment,
+                                                               keep_localized=keep_localized,
+                                                               exclude_extra=exclude_extra).items():
+                merge_stats[(locale, table_name)] = stats
+        return merge_stats
+
+    # Collections / Iters ----------------------------------------------------------------------------------------------
+
+    def locales(self):
+        """
+        :rtype: collections.Iterable[str]
+        """
+        return self.keys()
+
+    def tables(self):
+        """
+        :rtype: collections.Iterator[(str, str, tclocalizable.strings_table.StringsTable)]
+        :return: locale, table name and strings table of each table
+        """
+        for locale, strings_tables in self.items():
+            for table_name, strings_table in strings_tables.items():
+                yield locale, table_name, strings_table
@@ -0,0 +1,474 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import namedtuple
+import codecs
+import io
+import mmap
+import re
+import sys
+from time import perf_counter
+
+from tclocalizable import instrumentation
+from tclocalizable.escape_codec import unescape
+from tclocalizable.localized_string import LocalizedString
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MMAP_WINDOW_SIZE = 1024 * 1024
+
+_WHITESPACES = br'[ \t\r\n\x0b\x0c]*'
+_QUOTED_CONTENT = br'[^"\\]*(?:\\.[^"\\]*)*'
+_TOKEN_PATTERN = re.compile(
+    _WHITESPACES + br'(?:'
+    br'(?P<block>/\*(?P<block_body>.*?)\*/)|'
+    br'(?P<line>//(?P<line_body>[^\n]*))|'
+    br'(?P<entry>"(?P<source>' + _QUOTED_CONTENT + br')"' + _WHITESPACES + br'=' + _WHITESPACES +
+    br'"(?P<localized>' + _QUOTED_CONTENT + br')"' + _WHITESPACES + br';))',
+    re.DOTALL)
+_WHITESPACES_PATTERN = re.compile(_WHITESPACES)
+# Group numbers of the token pattern.
+_BLOCK_COMMENT, _BLOCK_COMMENT_BODY, _LINE_COMMENT, _LINE_COMMENT_BODY, _ENTRY, _SOURCE, _LOCALIZED = range(1, 8)
+
+EntrySpan = namedtuple('EntrySpan', ['offset', 'length', 'line'])
+"""Byte range of an entry in a strings file, including the comment before it, and the line where the entry starts."""
+
+
+def _clean_comment(comment_body):
+    """
+    :type comment_body: str
+    :rtype: str
+    """
+    return comment_body.strip().strip('*').strip() or None
+
+
+# Maps a high byte of an UTF-16 code unit to 0x00 if it's zero, or 0xff otherwise.
+_NON_ZERO_TO_FF = bytes((0,)) + bytes((0xff,)) * 255
+
+
+def _project_utf16(raw, little_endian):
+    """
+    Project UTF-16 code units to 1 byte each: units up to U+00FF keep their low byte, and other units become 0xff which
+    is never a part of the strings file grammar. All structural characters of a strings file are ASCII, so the
+    projection is scanned with the same grammar of UTF-8 files, and position `i` of it is byte `2 * i` of the raw
+    buffer.
+
+    :type raw: bytes
+    :type little_endian: bool
+    :rtype: bytes
+    """
+    low_bytes, high_bytes = (raw[0::2], raw[1::2]) if little_endian else (raw[1::2], raw[0::2])
+    return (int.from_bytes(low_bytes, 'little') |
+            int.from_bytes(high_bytes.translate(_NON_ZERO_TO_FF), 'little')).to_bytes(len(low_bytes), 'little')
+
+
+class _Codec(object):
+
+    def __init__(self, name, width=1, bom=b'', exact_offsets=True):
+        """
+        :param str name: codec used to decode a slice of the raw buffer
+        :param int width: bytes of a code unit
+        :param bytes bom: byte order mark at the beginning of the raw buffer
+        :param bool exact_offsets: whether offsets in the raw buffer are offsets in the file
+        """
+        self.name = name
+        self.width = width
+        self.bom = bom
+        self.exact_offsets = exact_offsets
+
+    def project(self, raw):
+        """
+        :type raw: bytes
+        :rtype: bytes
+        """
+        if self.width == 1:
+            return raw
+        return _project_utf16(raw, self.name == 'utf-16-le')
+
+
+# Encodings scanned on the raw bytes directly. Other encodings are transcoded to UTF-8 before scanning.
+_ASCII_COMPATIBLE_ENCODINGS = ('utf-8', 'utf-8-sig', 'ascii', 'iso8859-1')
+_UTF16_ENCODINGS = ('utf-16', 'utf-16-le', 'utf-16-be')
+
+
+def _sniff_encoding(head):
+    """
+    :param bytes head: first bytes of the file
+    :rtype: str
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    elif head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    elif len(head) >= 2 and head[0] and not head[1]:
+        return 'utf-16-le'
+    elif len(head) >= 2 and not head[0] and head[1]:
+        return 'utf-16-be'
+    else:
+        return 'utf-8'
+
+
+def detect_encoding(file_path):
+    """
+    Detect encoding of a strings file by its byte order mark, or by the layout of its first character if there's none.
+    Files without any hint are treated as UTF-8.
+
+    :type file_path: str
+    :rtype: str
+    """
+    with open(file_path, 'rb') as f:
+        return _sniff_encoding(f.read(4))
+
+
+def _detect_codec(encoding, head):
+    """
+    :param str encoding: encoding of the file, `None` to detect it from the head
+    :param bytes head: first bytes of the file
+    :rtype: _Codec
+    """
+    encoding = codecs.lookup(encoding or _sniff_encoding(head)).name
+    if encoding in _UTF16_ENCODINGS:
+        if head.startswith(codecs.BOM_UTF16_BE) and encoding != 'utf-16-le':
+            return _Codec('utf-16-be', width=2, bom=codecs.BOM_UTF16_BE)
+        elif head.startswith(codecs.BOM_UTF16_LE) and encoding != 'utf-16-be':
+            return _Codec('utf-16-le', width=2, bom=codecs.BOM_UTF16_LE)
+        else:
+            return _Codec('utf-16-be' if encoding == 'utf-16-be' else 'utf-16-le', width=2)
+    elif encoding in _ASCII_COMPATIBLE_ENCODINGS:
+        if encoding.startswith('utf-8'):
+            return _Codec('utf-8', bom=codecs.BOM_UTF8 if head.startswith(codecs.BOM_UTF8) else b'')
+        return _Codec(encoding)
+    else:
+        return None
+
+
+class _Scanner(object):
+
+    def __init__(self, codec, intern=False):
+        """
+        :type codec: _Codec
+        :param bool intern: intern sources and comments
+        """
+        self.codec = codec
+        self.intern = intern
+        self.line = 1
+        """:type: int"""
+        self.offset = len(codec.bom)
+        """:type: int"""
+        self.comment = None
+        """:type: str"""
+        self.comment_offset = None
+        """:type: int"""
+
+    def _error(self, raw, projection, pos):
+        error_pos = _WHITESPACES_PATTERN.match(projection, pos).end()
+        line = self.line + projection.count(b'\n', pos, error_pos)
+        width = self.codec.width
+        snippet = raw[error_pos * width:(error_pos + 40) * width].decode(self.codec.name, errors='replace')
+        return ValueError('Failed to parse line {}: {}'.format(line, snippet.splitlines()[0] if snippet else ''))
+
+    def scan(self, raw, final, index=False):
+        """
+        Yields localized strings in the raw buffer and returns the byte position where scanning stops. When the buffer
+        is not the final one, the incomplete token at the end of it should be scanned again with more data appended.
+
+        In index mode, only sources are decoded, and `(source, EntrySpan)` pairs are yielded instead.
+
+        :type raw: bytes
+        :type final: bool
+        :type index: bool
+        :rtype: collections.Iterator[LocalizedString]
+        """
+        codec_name = self.codec.name
+        width = self.codec.width
+        intern = sys.intern if self.intern else None
+        projection = self.codec.project(raw)
+        match_token = _TOKEN_PATTERN.match
+        base_offset = self.offset
+        exact_offsets = self.codec.exact_offsets
+        line = self.line
+        comment = self.comment
+        comment_offset = self.comment_offset
+        end = len(projection)
+        pos = 0
+
+        while pos < end:
+            match = match_token(projection, pos)
+            if match is None or (not final and match.end() == end):
+                break
+            kind = match.lastindex
+            token_start, token_end = match.span(kind)
+            line += projection.count(b'\n', pos, token_start)
+
+            if kind == _ENTRY:
+                source_start, source_end = match.span(_SOURCE)
+                source = unescape(raw[source_start * width:source_end * width].decode(codec_name))
+                if intern:
+                    source = intern(source)
+                if index:
+                    entry_offset = base_offset + token_start * width
+                    span_offset = entry_offset if comment_offset is None else comment_offset
+                    yield source, EntrySpan(span_offset, base_offset + token_end * width - span_offset, line)
+                    comment_offset = None
+                else:
+                    localized_start, localized_end = match.span(_LOCALIZED)
+                    localized = raw[localized_start * width:localized_end * width].decode(codec_name)
+                    yield LocalizedString(source, unescape(localized), comment, line=line,
+                                          offset=base_offset + token_start * width if exact_offsets else None)
+                    comment = None
+                line += projection.count(b'\n', token_start, token_end)
+            else:
+                if index:
+                    comment_offset = base_offset + token_start * width
+                else:
+                    body_start, body_end = match.span(_BLOCK_COMMENT_BODY if kind == _BLOCK_COMMENT else
+                                                      _LINE_COMMENT_BODY)
+                    comment = _clean_comment(raw[body_start * width:body_end * width].decode(codec_name))
+                    if intern and comment:
+                        comment = intern(comment)
+                line += projection.count(b'\n', token_start, token_end)
+            pos = token_end
+
+        self.line = line
+        self.comment = comment
+        self.comment_offset = comment_offset
+        if final:
+            if _WHITESPACES_PATTERN.match(projection, pos).end() != end:
+                raise self._error(raw, projection, pos)
+            self.line += projection.count(b'\n', pos, end)
+            pos = end
+        self.offset += pos * width
+        return pos * width
+
+
+def _scan_stream(scanner, buffer, read, chunk_size, index=False):
+    """
+    :type scanner: _Scanner
+    :param bytes buffer: data already read
+    :param read: callable reading at most given size of bytes, returns empty bytes at the end of the stream
+    :type chunk_size: int
+    :param bool index: yield `(source, EntrySpan)` pairs instead of localized strings
+    :rtype: collections.Iterator[LocalizedString]
+    """
+    active_instrumentation = instrumentation.current()
+    if active_instrumentation is not None:
+        yield from _measured_scan_stream(scanner, buffer, read, chunk_size, index, active_instrumentation)
+        return
+
+    final = False
+    while not final:
+        # Read at least the size of the pending data, so a long token is not re-scanned over and over again.
+        data = read(max(chunk_size, len(buffer)))
+        final = not data
+        buffer += data
+        pos = yield from scanner.scan(buffer, final, index=index)
+        buffer = buffer[pos:]
+
+
+def _measured_scan(scanner, raw, final, index):
+    """
+    Scan a chunk entirely before yielding any entry, so time spent by consumers is not counted as parsing.
+
+    :rtype: (list, int)
+    :return: entries (or index pairs) and position of the first unscanned byte
+    """
+    scan = scanner.scan(raw, final, index=index)
+    entries = []
+    try:
+        while True:
+            entries.append(next(scan))
+    except StopIteration as stop:
+        return entries, stop.value
+
+
+def _measured_scan_stream(scanner, buffer, read, chunk_size, index, active_instrumentation):
+    """
+    `_scan_stream` recording `io.read` and `parse` phases of each chunk.
+
+    :type active_instrumentation: tclocalizable.instrumentation.Instrumentation
+    """
+    final = False
+    while not final:
+        start = perf_counter()
+        data = read(max(chunk_size, len(buffer)))
+        active_instrumentation.record('io.read', perf_counter() - start, bytes_read=len(data))
+        final = not data
+        buffer += data
+        start = perf_counter()
+        entries, pos = _measured_scan(scanner, buffer, final, index)
+        active_instrumentation.record('parse', perf_counter() - start, entries=len(entries))
+        yield from entries
+        buffer = buffer[pos:]
+
+
+class StringsBuffer(object):
+    """
+    Raw content of a strings file kept in memory. Entries are indexed by their sources without decoding anything else,
+    and are decoded on demand from their spans.
+    """
+
+    def __init__(self, raw, encoding='utf-16', intern=False):
+        """
+        :param bytes raw: content of a strings file
+        :param str encoding: encoding of the content, `None` to detect UTF-8 or UTF-16 from the content
+        :param bool intern: intern sources and comments
+        """
+        codec = _detect_codec(encoding, raw[:4])
+        if codec is None:
+            raw = raw.decode(encoding).encode('utf-8')
+            codec = _Codec('utf-8', exact_offsets=False)
+        self.raw = raw
+        """:type: bytes"""
+        self._codec = codec
+        self._intern = intern
+
+    @classmethod
+    def from_file(cls, file_path, encoding='utf-16', intern=False):
+        """
+        :type file_path: str
+        :type encoding: str
+        :type intern: bool
+        :rtype: StringsBuffer
+        """
+        active_instrumentation = instrumentation.current()
+        start = perf_counter()
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        if active_instrumentation is not None:
+            active_instrumentation.record('io.read', perf_counter() - start, bytes_read=len(raw))
+        return cls(raw, encoding=encoding, intern=intern)
+
+    def index(self):
+        """
+        :rtype: collections.Iterator[(str, EntrySpan)]
+        """
+        scanner = _Scanner(self._codec, intern=self._intern)
+        active_instrumentation = instrumentation.current()
+        if active_instrumentation is None:
+            yield from scanner.scan(self.raw[len(self._codec.bom):], True, index=True)
+            return
+
+        start = perf_counter()
+        entries, _ = _measured_scan(scanner, self.raw[len(self._codec.bom):], True, True)
+        active_instrumentation.record('parse', perf_counter() - start, entries=len(entries))
+        yield from entries
+
+    def localized_strings(self, offset=None, line=1, comment=None):
+        """
+        Iterate entries from the beginning of the content, or from the opening quote of an entry, e.g. to re-parse the
+        content after an entry known to be unchanged. The line and comment of that entry are passed along, as the
+        scanner doesn't see anything before it.
+
+        :param int offset: offset of an entry to scan from, `None` to scan from the beginning
+        :param int line: line of the entry
+        :param str comment: comment of the entry
+        :rtype: collections.Iterator[LocalizedString]
+        """
+        scanner = _Scanner(self._codec, intern=self._intern)
+        if offset is not None:
+            scanner.offset, scanner.line, scanner.comment = offset, line, comment
+        # Scanned chunk by chunk, so stopping early doesn't pay for the rest of the content.
+        stream = io.BytesIO(self.raw)
+        stream.seek(scanner.offset)
+        return _scan_stream(scanner, b'', stream.read, DEFAULT_CHUNK_SIZE)
+
+    def localized_string(self, span):
+        """
+        :type span: EntrySpan
+        :rtype: LocalizedString
+        """
+        scanner = _Scanner(self._codec, intern=self._intern)
+        scanner.offset = span.offset
+        localized_string, = scanner.scan(self.raw[span.offset:span.offset + span.length], True)
+        localized_string.line = span.line
+        return localized_string
+
+
+def _scan_mapping(f, scanner, window_size, index=False):
+    """
+    :type f: io.BufferedReader
+    :type scanner: _Scanner
+    :type window_size: int
+    :type index: bool
+    :rtype: collections.Iterator[LocalizedString]
+    """
+    if not f.seek(0, 2):
+        return  # Empty files could not be mapped.
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+        mapping.seek(len(scanner.codec.bom))
+        yield from _scan_stream(scanner, b'', mapping.read, window_size, index=index)
+
+
+def localized_strings_in_file(file_path, encoding='utf-16', chunk_size=None, use_mmap=False, intern=False):
+    """
+    Iterate entries of a strings file. The file is read and scanned chunk by chunk, so entries and comments may span
+    any number of lines. Each localized string records the line and byte offset of its opening quote. The comment of
+    an entry is the last comment before it.
+
+    UTF-8 and UTF-16 files are scanned on their raw bytes, and only the source, localized and comment slices are
+    decoded. Files in other encodings are transcoded to UTF-8 first, and byte offsets are not available (`None`) for
+    them. Pass `None` as encoding to detect UTF-8 or UTF-16 (either byte order) from the beginning of the file.
+
+    With `use_mmap`, UTF-8 and UTF-16 files are memory-mapped and scanned window by window straight from the page cache
+    instead of being read through a file buffer.
+
+    With `intern`, sources and comments are interned, so tables of all locales loaded in a process share the same string
+    objects for them.
+
+    :type file_path: str
+    :type encoding: str
+    :param int chunk_size: bytes to read (or to slice from the mapping) at once
+    :type use_mmap: bool
+    :type intern: bool
+    :rtype: collections.Iterator[LocalizedString]
+    """
+    return _scan_file(file_path, encoding, chunk_size, use_mmap, intern, False)
+
+
+def source_spans_in_file(file_path, encoding='utf-16', chunk_size=None, use_mmap=False):
+    """
+    Iterate sources of entries of a strings file and their spans, without decoding anything else. Spans are positions
+    in the raw content of `StringsBuffer.from_file`, which are byte offsets in the file for UTF-8 and UTF-16 files.
+
+    :type file_path: str
+    :type encoding: str
+    :param int chunk_size: bytes to read (or to slice from the mapping) at once
+    :type use_mmap: bool
+    :rtype: collections.Iterator[(str, EntrySpan)]
+    """
+    return _scan_file(file_path, encoding, chunk_size, use_mmap, False, True)
+
+
+def _scan_file(file_path, encoding, chunk_size, use_mmap, intern, index):
+    chunk_size = chunk_size or (DEFAULT_MMAP_WINDOW_SIZE if use_mmap else DEFAULT_CHUNK_SIZE)
+    chunk_size -= chunk_size % 4
+    active_instrumentation = instrumentation.current()
+    with open(file_path, 'rb') as f:
+        start = perf_counter()
+        head = f.read(4)
+        if active_instrumentation is not None:
+            active_instrumentation.record('io.read', perf_counter() - start, bytes_read=len(head))
+        codec = _detect_codec(encoding, head)
+        if codec is not None:
+            scanner = _Scanner(codec, intern=intern)
+            if use_mmap:
+                yield from _scan_mapping(f, scanner, chunk_size, index=index)
+            else:
+                yield from _scan_stream(scanner, head[len(codec.bom):], f.read, chunk_size, index=index)
+            return
+
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        scanner = _Scanner(_Codec('utf-8', exact_offsets=False), intern=intern)
+        yield from _scan_stream(scanner, b'', lambda size: f.read(size).encode('utf-8'), chunk_size, index=index)
@@ -14,44 +14,70 @@
 # limitations under the License.
 #
 
-from collections import OrderedDict
-import shlex
+from collections import namedtuple, OrderedDict
+from collections.abc import ItemsView, ValuesView
+from time import perf_counter
 
+from tclocalizable import instrumentation, strings_writer
+from tclocalizable.change_journal import ChangeJournal
 from tclocalizable.localized_string import LocalizedString
 
+MergeStats = namedtuple('MergeStats', ['added', 'removed', 'updated'])
+"""Counts of entries added, removed and updated (comment or localized changed) by a merge."""
+
+
+class _PendingLocalizedString(object):
+    """
+    Placeholder of an entry in a lazily read table, decoded into a `LocalizedString` on first access.
+    """
+    __slots__ = ('strings_buffer', 'span')
+
+    def __init__(self, strings_buffer, span):
+        """
+        :type strings_buffer: tclocalizable.strings_parser.StringsBuffer
+        :type span: tclocalizable.strings_parser.EntrySpan
+        """
+        self.strings_buffer = strings_buffer
+        self.span = span
+
+    def localized_string(self):
+        """
+        :rtype: LocalizedString
+        """
+        return self.strings_buffer.localized_string(self.span)
+
 
 class StringsTable(OrderedDict):
 
-    def __init__(self, file_path=None, encoding='utf-16'):
+    def __init__(self, file_path=None, encoding='utf-16', **kwargs):
+        """
+        :param str file_path: strings file to read
+        :param str encoding: encoding of the file, `None` to detect UTF-8 or UTF-16 from the file
+        :param kwargs: other options of `read_file`
+        """
         super(StringsTable, self).__init__()
+        self._lazy = False
+        self._journal = None
         if file_path:
-            self.read_file(file_path, encoding=encoding)
+            self.read_file(file_path, encoding=encoding, **kwargs)
 
     # I/O --------------------------------------------------------------------------------------------------------------
 
     @staticmethod
-    def localized_strings_in_file(file_path, encoding='utf-16'):
+    def localized_strings_in_file(file_path, encoding='utf-16', use_mmap=False, intern=False, cache=None):
         """
         :type file_path: str
         :type encoding: str
+        :param bool use_mmap: scan the memory-mapped file instead of reading it through a file buffer
+        :param bool intern: intern sources and comments, to share them across tables loaded in the process
+        :param tclocalizable.parse_cache.ParseCache cache: cache to load the parsed file from, or store it in
         :rtype: collections.Iterator[LocalizedString]
         """
-        with open(file_path, 'r', encoding=encoding) as f:
-            pending_comment_lines = ''
-            for line in f:
-                stripped_line = line.strip()
-                if stripped_line.startswith('"') and stripped_line.endswith(';'):
-                    line_components = shlex.split(stripped_line[:-1])
-                    if len(line_components) != 3 or line_components[1] != '=':
-                        raise ValueError('Failed to parse line: {}'.format(line))
-                    source = line_components[0]
-                    localized = line_components[2]
-                    comment = pending_comment_lines.strip().lstrip('/*').rstrip('*/').strip() or None
-                    pending_comment_lines = ''
-
-                    yield LocalizedString(source, localized, comment)
-                elif stripped_line.startswith('/*') or stripped_line.endswith('*/'):
-                    pending_comment_lines += line
+        if cache is not None:
+            return cache.localized_strings_in_file(file_path, encoding=encoding, use_mmap=use_mmap, intern=intern)
+        # The parser is imported on first use, as its regular expressions pull in `re` and `enum` at import.
+        from tclocalizable import strings_parser
+        return strings_parser.localized_strings_in_file(file_path, encoding=encoding, use_mmap=use_mmap, intern=intern)
 
     @classmethod
     def duplicated_entries_in_file(cls, file_path, encoding='utf-16'):
@@ -60,36 +86,199 @@ class StringsTable(OrderedDict):
         :type encoding: str
         :rtype: dict[str, list[LocalizedString]]
         """
-        localized_strings_collection = {}
-        """:type: dict[str, list[LocalizedString]]"""
-        for localized_string in StringsTable.localized_strings_in_file(file_path, encoding=encoding):
-            if localized_string.source not in localized_strings_collection:
-                localized_strings_collection[localized_string.source] = []
-            localized_strings_collection[localized_string.source].append(localized_string)
+        from tclocalizable import duplicates
+        return duplicates.duplicated_entries_in_file(file_path, encoding=encoding)
+
+    def read_file(self, file_path, encoding='utf-16', use_mmap=False, lazy=False, intern=False, cache=None):
+        """
+        :type file_path: str
+        :type encoding: str
+        :param bool use_mmap: scan the memory-mapped file instead of reading it through a file buffer
+        :param bool lazy: index sources only, and decode an entry on its first access. The raw content of the file is
+                          kept in memory until all entries are decoded
+        :param bool intern: intern sources and comments, to share them across tables loaded in the process
+        :param tclocalizable.parse_cache.ParseCache cache: cache to load the parsed file from, or store it in. It's not
+                                                           used by lazy reads
+        """
+        active_instrumentation = instrumentation.current()
+        if active_instrumentation is not None:
+            start = perf_counter()
+
+        if lazy:
+            from tclocalizable import strings_parser
+            strings_buffer = strings_parser.StringsBuffer.from_file(file_path, encoding=encoding, intern=intern)
+            for source, span in strings_buffer.index():
+                super(StringsTable, self).__setitem__(source, _PendingLocalizedString(strings_buffer, span))
+            self._lazy = True
+        else:
+            for localized_string in self.localized_strings_in_file(file_path, encoding=encoding, use_mmap=use_mmap,
+                                                                   intern=intern, cache=cache):
+                self[localized_string.source] = localized_string
+
+        if active_instrumentation is not None:
+            active_instrumentation.record('read_file', perf_counter() - start)
+            active_instrumentation.record_entry_count(len(self))
+
+    @staticmethod
+    def write_localized_strings_to_file(localized_strings, file_path, encoding='utf-16', atomic=True,
+                                        skip_unchanged=False, canonical=False):
+        """
+        :param collections.Iterable[LocalizedString] localized_strings: entries to write, e.g. from a generator
+        :type file_path: str
+        :type encoding: str
+        :param bool atomic: write to a temporary file which then replaces the file, so it's never left truncated
+        :param bool skip_unchanged: don't touch the file if it already has the same content
+        :param bool canonical: write entries sorted by sources, without duplicates and with normalized comments, so the
+                               same entries are written as the same bytes in whatever order. Entries are sorted in
+                               bounded memory, spilling to temporary files if there are many
+        :rtype: bool
+        :return: whether the file is written
+        """
+        if canonical:
+            # `tempfile` and `marshal` of external sorts are imported only when they may be used.
+            from tclocalizable.canonical import canonical_localized_strings
+            localized_strings = canonical_localized_strings(localized_strings)
+        return strings_writer.write_localized_strings(localized_strings, file_path, encoding=encoding, atomic=atomic,
+                                                      skip_unchanged=skip_unchanged)
 
-        return {source: localized_strings for source, localized_strings in localized_strings_collection.items()
-                if len(localized_strings) > 1}
+    def write_file(self, file_path, encoding='utf-16', atomic=True, skip_unchanged=False, canonical=False):
+        """
+        :type file_path: str
+        :type encoding: str
+        :param bool atomic: write to a temporary file which then replaces the file, so it's never left truncated
+        :param bool skip_unchanged: don't touch the file (nor its mtime) if it already has the same content
+        :param bool canonical: write entries sorted by sources with normalized comments, so tables of the same entries
+                               are written as the same bytes in whatever order
+        :rtype: bool
+        :return: whether the file is written
+        """
+        return self.write_localized_strings_to_file(self.strings(), file_path, encoding=encoding, atomic=atomic,
+                                                    skip_unchanged=skip_unchanged, canonical=canonical)
+
+    # Async I/O --------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def alocalized_strings_in_file(file_path, encoding='utf-16', use_mmap=False, intern=False, cache=None,
+                                   executor=None):
+        """
+        Asynchronous `localized_strings_in_file`, which reads and parses in an executor batch by batch.
+
+        :type file_path: str
+        :type encoding: str
+        :param bool use_mmap: scan the memory-mapped file instead of reading it through a file buffer
+        :param bool intern: intern sources and comments, to share them across tables loaded in the process
+        :param tclocalizable.parse_cache.ParseCache cache: cache to load the parsed file from, or store it in
+        :param concurrent.futures.ThreadPoolExecutor executor: executor to read and parse in, `None` for the default
+                                                               executor of the loop
+        :rtype: collections.AsyncIterator[LocalizedString]
+        """
+        # `asyncio` alone takes longer to import than the whole package, so it's only imported by async callers.
+        from tclocalizable import async_io
+        return async_io.localized_strings_in_file(file_path, encoding=encoding, use_mmap=use_mmap, intern=intern,
+                                                  cache=cache, executor=executor)
 
-    def read_file(self, file_path, encoding='utf-16'):
+    def aread_file(self, file_path, encoding='utf-16', use_mmap=False, lazy=False, intern=False, cache=None,
+                   executor=None):
         """
+        Asynchronous `read_file`, which reads and parses in an executor. The table should not be accessed until it's
+        done.
+
         :type file_path: str
         :type encoding: str
+        :param bool use_mmap: scan the memory-mapped file instead of reading it through a file buffer
+        :param bool lazy: index sources only, and decode an entry on its first access
+        :param bool intern: intern sources and comments, to share them across tables loaded in the process
+        :param tclocalizable.parse_cache.ParseCache cache: cache to load the parsed file from, or store it in
+        :param concurrent.futures.ThreadPoolExecutor executor: executor to read and parse in, `None` for the default
+                                                               executor of the loop
+        :rtype: collections.Awaitable[None]
         """
-        for localized_string in self.localized_strings_in_file(file_path, encoding=encoding):
-            self[localized_string.source] = localized_string
+        from tclocalizable import async_io
+        return async_io.read_file(self, file_path, executor=executor, encoding=encoding, use_mmap=use_mmap, lazy=lazy,
+                                  intern=intern, cache=cache)
 
-    def write_file(self, file_path, encoding='utf-16'):
+    def awrite_file(self, file_path, encoding='utf-16', atomic=True, skip_unchanged=False, canonical=False,
+                    executor=None):
         """
+        Asynchronous `write_file`, which serializes and writes in an executor. The table should not be modified until
+        it's done.
+
         :type file_path: str
         :type encoding: str
+        :param bool atomic: write to a temporary file which then replaces the file, so it's never left truncated
+        :param bool skip_unchanged: don't touch the file (nor its mtime) if it already has the same content
+        :param bool canonical: write entries sorted by sources with normalized comments, so tables of the same entries
+                               are written as the same bytes in whatever order
+        :param concurrent.futures.ThreadPoolExecutor executor: executor to serialize and write in, `None` for the
+                                                               default executor of the loop
+        :rtype: collections.Awaitable[bool]
+        :return: whether the file is written
+        """
+        from tclocalizable import async_io
+        return async_io.write_file(self, file_path, executor=executor, encoding=encoding, atomic=atomic,
+                                   skip_unchanged=skip_unchanged, canonical=canonical)
+
+    # Lazy Entries -----------------------------------------------------------------------------------------------------
+
+    def _decode_pending(self, key, pending_localized_string):
+        localized_string = pending_localized_string.localized_string()
+        localized_string._journal = self._journal
+        super(StringsTable, self).__setitem__(key, localized_string)
+        return localized_string
+
+    def materialize(self):
+        """
+        Decode all pending entries of a lazily read table, and release the raw content of files.
+        """
+        if self._lazy:
+            for _ in self.values():
+                pass
+            self._lazy = False
+
+    # Change Journal -------------------------------------------------------------------------------------------------
+
+    @property
+    def journal(self):
+        """
+        :rtype: tclocalizable.change_journal.ChangeJournal
+        :return: the journal of changes since `start_journal`, or `None` if changes are not recorded
         """
-        with open(file_path, 'w', encoding=encoding) as f:
-            item_count = len(self)
-            for idx, localized_string in enumerate(self.strings()):
-                f.write(repr(localized_string))
-                f.write('\n')
-                if idx != item_count-1:
-                    f.write('\n')
+        return self._journal
+
+    def start_journal(self):
+        """
+        Start recording entries added, removed or replaced, and fields of entries modified. An entry moved into another
+        journaled table (e.g. by `merge`) is recorded by the table it's last put in.
+
+        :rtype: tclocalizable.change_journal.ChangeJournal
+        """
+        if self._journal is None:
+            self._journal = ChangeJournal(self)
+            for value in super(StringsTable, self).values():
+                if value.__class__ is LocalizedString:
+                    value._journal = self._journal
+        return self._journal
+
+    def stop_journal(self):
+        """
+        :rtype: tclocalizable.change_journal.ChangeJournal
+        :return: the stopped journal
+        """
+        journal, self._journal = self._journal, None
+        for value in super(StringsTable, self).values():
+            if value.__class__ is LocalizedString and value._journal is journal:
+                value._journal = None
+        return journal
+
+    def _record_entry(self, key, old_value, new_value):
+        if old_value is not None:
+            if old_value.__class__ is _PendingLocalizedString:
+                old_value = old_value.localized_string()
+            elif old_value._journal is self._journal:
+                old_value._journal = None
+        if new_value is not None:
+            new_value._journal = self._journal
+        self._journal.record_entry(key, old_value, new_value)
 
     # Interfaces -------------------------------------------------------------------------------------------------------
 
@@ -98,26 +287,96 @@ class StringsTable(OrderedDict):
         self[source] = localized_string
         return localized_string
 
+    def format_problems(self):
+        """
+        Check format specifiers of localized content against the ones of sources.
+
+        :rtype: list[tclocalizable.format_specifiers.FormatProblem]
+        """
+        from tclocalizable import format_specifiers
+        return format_specifiers.format_problems(self.strings())
+
     def merge(self, another_strings_table, keep_comment=True, keep_localized=True, exclude_extra=False):
         """
         :param StringsTable another_strings_table: another strings table to merge in
         :param bool keep_comment: keep comment of duplicated/existed localized strings
         :param bool keep_localized: keep localized content of duplicated/existed localized strings
         :param bool exclude_extra: exclude localized strings which don't exist in another strings table
+        :rtype: MergeStats
+        """
+        return self._merge(another_strings_table, another_strings_table.keys(), keep_comment, keep_localized,
+                           exclude_extra)
+
+    def merge_into(self, strings_tables, keep_comment=True, keep_localized=True, exclude_extra=False):
+        """
+        Merge this table (e.g. of the development language) into many tables (e.g. of all other locales) at once.
+
+        :param dict[str, StringsTable] strings_tables: tables to merge into, by any name (e.g. locale)
+        :param bool keep_comment: keep comment of duplicated/existed localized strings
+        :param bool keep_localized: keep localized content of duplicated/existed localized strings
+        :param bool exclude_extra: exclude localized strings which don't exist in this table
+        :rtype: dict[str, MergeStats]
+        :return: stats of each table by its name
+        """
+        sources = set(self.keys())
+        return OrderedDict((name, strings_table._merge(self, sources, keep_comment, keep_localized, exclude_extra))
+                           for name, strings_table in strings_tables.items())
+
+    def merge_three_way(self, base_strings_table, their_strings_table, favor='ours'):
+        """
+        Merge changes of another table since the common ancestor of both, e.g. of another branch.
+
+        :param StringsTable base_strings_table: the common ancestor
+        :param StringsTable their_strings_table: the other table
+        :param str favor: `ours` or `theirs`, the side whose value is taken for fields changed differently on both sides
+        :rtype: list[tclocalizable.three_way_merge.MergeConflict]
+        """
+        from tclocalizable import three_way_merge
+        return three_way_merge.merge_three_way(base_strings_table, self, their_strings_table, favor=favor)
+
+    def _merge(self, another_strings_table, another_sources, keep_comment, keep_localized, exclude_extra):
         """
+        :type another_strings_table: StringsTable
+        :param collections.Set[str] another_sources: keys of another strings table, shared by merges of many tables
+        :type keep_comment: bool
+        :type keep_localized: bool
+        :type exclude_extra: bool
+        :rtype: MergeStats
+        """
+        active_instrumentation = instrumentation.current()
+        if active_instrumentation is not None:
+            start = perf_counter()
+
+        removed_count = 0
         if exclude_extra:
-            for key_to_remove in set(self.keys()) - set(another_strings_table.keys()):
+            for key_to_remove in [source for source in self.keys() if source not in another_sources]:
                 del self[key_to_remove]
+                removed_count += 1
 
+        added_count = updated_count = 0
+        # Skip the override decoding pending entries, unless there are any.
+        get = self.get if self._lazy else super(StringsTable, self).get
         for source, another_localized_string in another_strings_table.items():
-            if source in self:
-                self_localized_string = self[source]
-                if not keep_comment:
-                    self_localized_string.comment = another_localized_string.comment
-                if not keep_localized:
-                    self_localized_string.localized = another_localized_string.localized
-            else:
-                self[source] = another_localized_string
+            self_localized_string = get(source)
+            if self_localized_string is None:
+                # Copied, so later changes to entries of either table never show up in the other.
+                self[source] = another_localized_string.copy()
+                added_count += 1
+                continue
+
+            updated = False
+            if not keep_comment and self_localized_string.comment != another_localized_string.comment:
+                self_localized_string.comment = another_localized_string.comment
+                updated = True
+            if not keep_localized and self_localized_string.stored_localized != another_localized_string.localized:
+                self_localized_string.localized = another_localized_string.localized
+                updated = True
+            updated_count += updated
+
+        if active_instrumentation is not None:
+            active_instrumentation.record('merge', perf_counter() - start, entries=len(another_strings_table))
+            active_instrumentation.record_entry_count(len(self))
+        return MergeStats(added_count, removed_count, updated_count)
 
     # Collections / Iters ----------------------------------------------------------------------------------------------
 
@@ -125,13 +384,52 @@ class StringsTable(OrderedDict):
         """
         :rtype: tclocalizable.localized_string.LocalizedString
         """
-        return super(StringsTable, self).__getitem__(item)
+        value = super(StringsTable, self).__getitem__(item)
+        if value.__class__ is _PendingLocalizedString:
+            value = self._decode_pending(item, value)
+        return value
+
+    def get(self, key, default=None):
+        """
+        :rtype: tclocalizable.localized_string.LocalizedString
+        """
+        value = super(StringsTable, self).get(key, default)
+        if value.__class__ is _PendingLocalizedString:
+            value = self._decode_pending(key, value)
+        return value
 
-    def get(self, *args, **kwargs):
+    def pop(self, *args, **kwargs):
         """
         :rtype: tclocalizable.localized_string.LocalizedString
         """
-        return super(StringsTable, self).get(*args, **kwargs)
+        if self._journal is not None and args and args[0] in self:
+            value = self[args[0]]
+            del self[args[0]]
+            return value
+        value = super(StringsTable, self).pop(*args, **kwargs)
+        if value.__class__ is _PendingLocalizedString:
+            value = value.localized_string()
+        return value
+
+    def popitem(self, last=True):
+        """
+        :rtype: (str, tclocalizable.localized_string.LocalizedString)
+        """
+        key, value = super(StringsTable, self).popitem(last=last)
+        if value.__class__ is _PendingLocalizedString:
+            value = value.localized_string()
+        if self._journal is not None:
+            self._record_entry(key, value, None)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        """
+        :rtype: tclocalizable.localized_string.LocalizedString
+        """
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
 
     # noinspection PyMethodOverriding
     def __setitem__(self, key, value):
@@ -141,8 +439,37 @@ class StringsTable(OrderedDict):
         """
         if key != value.source:
             raise KeyError('The key and the source of value are not the same')
+        if self._journal is not None:
+            self._record_entry(key, super(StringsTable, self).get(key), value)
         super(StringsTable, self).__setitem__(key, value)
 
+    def __delitem__(self, key):
+        """
+        :type key: str
+        """
+        if self._journal is not None:
+            self._record_entry(key, super(StringsTable, self).__getitem__(key), None)
+        super(StringsTable, self).__delitem__(key)
+
+    def clear(self):
+        if self._journal is not None:
+            for key in list(self.keys()):
+                del self[key]
+        super(StringsTable, self).clear()
+
+    def __eq__(self, other):
+        # Pending entries are decoded first, so lazily read tables compare like eager ones.
+        self.materialize()
+        if isinstance(other, StringsTable):
+            other.materialize()
+        return super(StringsTable, self).__eq__(other)
+
+    def __ne__(self, other):
+        self.materialize()
+        if isinstance(other, StringsTable):
+            other.materialize()
+        return super(StringsTable, self).__ne__(other)
+
     def __iter__(self):
         """
         :rtype: collections.Iterable[str]
@@ -160,16 +487,21 @@ class StringsTable(OrderedDict):
         """
         :rtype: collections.Iterable[tclocalizable.localized_string.LocalizedString]
         """
+        if self._lazy:
+            # Generic views get values by `__getitem__`, which decodes pending entries.
+            return ValuesView(self)
         return super(StringsTable, self).values()
 
     def items(self):
         """
         :rtype: collections.Iterable[(str, tclocalizable.localized_string.LocalizedString)]
         """
+        if self._lazy:
+            return ItemsView(self)
         return super(StringsTable, self).items()
 
     def strings(self):
         """
         :rtype: collections.Iterable[tclocalizable.localized_string.LocalizedString]
         """
-        return super(StringsTable, self).values()
+        return self.values()
@@ -0,0 +1,252 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import codecs
+from itertools import chain, islice
+import os
+from time import perf_counter
+
+from tclocalizable import instrumentation
+
+DEFAULT_BATCH_SIZE = 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _temporary_file(file_path):
+    """
+    Create a hidden temporary file next to the destination. Unlike `tempfile.mkstemp`, it's created with the default
+    permissions (0666 masked by umask), like a file created by `open`.
+
+    :type file_path: str
+    :rtype: (int, str)
+    """
+    directory, file_name = os.path.split(file_path)
+    while True:
+        temporary_path = os.path.join(directory, '.{}.{}.tmp'.format(file_name, os.urandom(4).hex()))
+        try:
+            return os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666), temporary_path
+        except FileExistsError:
+            continue
+
+
+def _formatted_batch(batch):
+    """
+    Format entries like `repr` of each, with sources and localized content of the whole batch escaped at once.
+
+    :type batch: list[tclocalizable.localized_string.LocalizedString]
+    :rtype: str
+    """
+    # Imported on first use, as its regular expressions pull in `re` at import.
+    from tclocalizable.escape_codec import escape_all
+    escaped = escape_all([localized_string.source for localized_string in batch] +
+                         [localized_string.stored_localized for localized_string in batch])
+    entries = []
+    for localized_string, source, localized in zip(batch, escaped, escaped[len(batch):]):
+        comment = localized_string.comment
+        if comment:
+            entries.append('/* ' + comment + ' */\n"' + source + '" = "' + localized + '";')
+        else:
+            entries.append('"' + source + '" = "' + localized + '";')
+    return '\n\n'.join(entries)
+
+
+def _encoded_chunks(localized_strings, encoding, batch_size, active_instrumentation=None):
+    """
+    :type localized_strings: collections.Iterable[tclocalizable.localized_string.LocalizedString]
+    :type encoding: str
+    :type batch_size: int
+    :param tclocalizable.instrumentation.Instrumentation active_instrumentation: instrumentation to record `serialize`
+                                                                                phases of batches in
+    :rtype: collections.Iterator[bytes]
+    """
+    encoder = codecs.getincrementalencoder(encoding)()
+    localized_strings = iter(localized_strings)
+    separator = ''
+    while True:
+        batch = list(islice(localized_strings, batch_size))
+        if not batch:
+            break
+        if active_instrumentation is None:
+            yield encoder.encode(separator + _formatted_batch(batch))
+        else:
+            start = perf_counter()
+            chunk = encoder.encode(separator + _formatted_batch(batch))
+            active_instrumentation.record('serialize', perf_counter() - start, entries=len(batch))
+            yield chunk
+        separator = '\n\n'
+    if separator:  # Empty tables are written as empty files, without even a BOM.
+        yield encoder.encode('\n', final=True)
+
+
+def _compare_chunks(f, chunks, active_instrumentation=None):
+    """
+    Consume chunks as long as they are the same as the content of the file.
+
+    :type f: io.BufferedReader
+    :type chunks: collections.Iterator[bytes]
+    :param tclocalizable.instrumentation.Instrumentation active_instrumentation: instrumentation to record `io.read`
+                                                                                phases of comparisons in
+    :rtype: (int, collections.Iterable[bytes])
+    :return: `None` if the file has exactly the content of all chunks. Otherwise, the size of the content the same as
+             the file, and the remaining chunks
+    """
+    matched_size = 0
+    for chunk in chunks:
+        if active_instrumentation is None:
+            content = f.read(len(chunk))
+        else:
+            start = perf_counter()
+            content = f.read(len(chunk))
+            active_instrumentation.record('io.read', perf_counter() - start, bytes_read=len(content))
+        if content != chunk:
+            return matched_size, chain((chunk,), chunks)
+        matched_size += len(chunk)
+    if f.read(1):
+        return matched_size, ()
+    return None
+
+
+def _write_all(f, chunks, active_instrumentation=None):
+    """
+    :type f: io.BufferedWriter
+    :type chunks: collections.Iterable[bytes]
+    :param tclocalizable.instrumentation.Instrumentation active_instrumentation: instrumentation to record `io.write`
+                                                                                phases of chunks in
+    """
+    if active_instrumentation is None:
+        f.writelines(chunks)
+        return
+    for chunk in chunks:
+        start = perf_counter()
+        f.write(chunk)
+        active_instrumentation.record('io.write', perf_counter() - start, bytes_written=len(chunk))
+
+
+def _copy_prefix(source, destination, size, active_instrumentation=None):
+    """
+    :type source: io.BufferedReader
+    :type destination: io.BufferedWriter
+    :type size: int
+    :type active_instrumentation: tclocalizable.instrumentation.Instrumentation
+    """
+    source.seek(0)
+    while size:
+        chunk = source.read(min(size, COPY_CHUNK_SIZE))
+        _write_all(destination, (chunk,), active_instrumentation)
+        size -= len(chunk)
+
+
+def _write_chunks(file_path, chunks, atomic, existing_file=None, prefix_size=0, active_instrumentation=None):
+    """
+    :type file_path: str
+    :type chunks: collections.Iterable[bytes]
+    :type atomic: bool
+    :param io.BufferedReader existing_file: the opened destination to copy the leading part from
+    :param int prefix_size: bytes to copy from the existing file before chunks
+    :type active_instrumentation: tclocalizable.instrumentation.Instrumentation
+    """
+    if not atomic:
+        if existing_file is None:
+            with open(file_path, 'wb') as f:
+                _write_all(f, chunks, active_instrumentation)
+        else:
+            with open(file_path, 'r+b') as f:
+                f.seek(prefix_size)
+                _write_all(f, chunks, active_instrumentation)
+                f.truncate()
+        return
+
+    fd, temporary_path = _temporary_file(file_path)
+    try:
+        with open(fd, 'wb') as f:
+            if existing_file is not None:
+                _copy_prefix(existing_file, f, prefix_size, active_instrumentation)
+            _write_all(f, chunks, active_instrumentation)
+        try:
+            os.chmod(temporary_path, os.stat(file_path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def write_chunks(file_path, chunks, atomic=True):
+    """
+    Write encoded chunks to a file, like `write_localized_strings` does, for writers of other formats.
+
+    :type file_path: str
+    :type chunks: collections.Iterable[bytes]
+    :type atomic: bool
+    """
+    _write_chunks(os.path.realpath(file_path), chunks, atomic, active_instrumentation=instrumentation.current())
+
+
+def write_localized_strings(localized_strings, file_path, encoding='utf-16', batch_size=DEFAULT_BATCH_SIZE,
+                            atomic=True, skip_unchanged=False):
+    """
+    Write entries to a strings file. Entries are serialized and encoded batch by batch, so any iterable (e.g. a
+    generator) could be written without building a `StringsTable` first.
+
+    With `atomic`, entries are written to a temporary file in the same directory, which then replaces the destination.
+    The destination is never left truncated, even if writing fails halfway, and keeps its permissions.
+
+    With `skip_unchanged`, the encoded content is compared with the existing file as it's serialized, and the file is
+    not touched at all (keeping its mtime) if they are the same. Otherwise, the same leading part is copied from the
+    file instead of being compared again.
+
+    :type localized_strings: collections.Iterable[tclocalizable.localized_string.LocalizedString]
+    :type file_path: str
+    :type encoding: str
+    :param int batch_size: entries to serialize and encode at once
+    :type atomic: bool
+    :type skip_unchanged: bool
+    :rtype: bool
+    :return: whether the file is written
+    """
+    active_instrumentation = instrumentation.current()
+    if active_instrumentation is None:
+        return _write_localized_strings(localized_strings, file_path, encoding, batch_size, atomic, skip_unchanged)
+
+    # Entries are counted by `serialize` phases, and bytes by `io.write` ones.
+    start = perf_counter()
+    written = _write_localized_strings(localized_strings, file_path, encoding, batch_size, atomic, skip_unchanged,
+                                       active_instrumentation)
+    active_instrumentation.record('write_file', perf_counter() - start)
+    return written
+
+
+def _write_localized_strings(localized_strings, file_path, encoding, batch_size, atomic, skip_unchanged,
+                             active_instrumentation=None):
+    file_path = os.path.realpath(file_path)  # Replace the target of a symbolic link rather than the link.
+    chunks = _encoded_chunks(localized_strings, encoding, batch_size, active_instrumentation)
+    if skip_unchanged:
+        try:
+            existing_file = open(file_path, 'rb')
+        except FileNotFoundError:
+            pass
+        else:
+            with existing_file:
+                difference = _compare_chunks(existing_file, chunks, active_instrumentation)
+                if difference is None:
+                    return False
+                _write_chunks(file_path, difference[1], atomic, existing_file, difference[0], active_instrumentation)
+                return True
+
+    _write_chunks(file_path, chunks, atomic, active_instrumentation=active_instrumentation)
+    return True
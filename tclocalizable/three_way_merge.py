@@ -0,0 +1,171 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import codecs
+from collections import namedtuple
+
+from tclocalizable import strings_writer
+
+DEFAULT_MARKER_SIZE = 7
+
+MergeConflict = namedtuple('MergeConflict', ['source', 'field', 'base', 'ours', 'theirs'])
+"""
+An entry changed differently on both sides: the field changed (`localized` or `comment`, or `None` if the entry is
+removed on one side), and the entry of each side (`None` if it's not in the table).
+"""
+
+
+def _state(localized_string):
+    return None if localized_string is None else (localized_string.stored_localized, localized_string.comment)
+
+
+def _merged_state(source, base, ours, theirs, favor, conflicts):
+    """
+    :param str source: source of an entry not the same on both sides
+    :param tclocalizable.localized_string.LocalizedString base: entry of each table, `None` if it's not in the table
+    :param tclocalizable.localized_string.LocalizedString ours: entry of each table, `None` if it's not in the table
+    :param tclocalizable.localized_string.LocalizedString theirs: entry of each table, `None` if it's not in the table
+    :type favor: str
+    :type conflicts: list[MergeConflict]
+    :rtype: (str, str)
+    :return: the merged localized content and comment, `None` if the entry is removed
+    """
+    base_state, ours_state, theirs_state = _state(base), _state(ours), _state(theirs)
+    if theirs_state == base_state:
+        return ours_state
+    elif ours_state == base_state:
+        return theirs_state
+    elif ours_state is None or theirs_state is None:
+        # Removed on one side and changed on the other. The changed entry is kept whichever side is favored.
+        conflicts.append(MergeConflict(source, None, base, ours, theirs))
+        return ours_state or theirs_state
+
+    merged_state = []
+    for field, base_value, ours_value, theirs_value in zip(('localized', 'comment'), base_state or (None, None),
+                                                           ours_state, theirs_state):
+        if ours_value == theirs_value or theirs_value == base_value:
+            merged_state.append(ours_value)
+        elif ours_value == base_value:
+            merged_state.append(theirs_value)
+        else:
+            conflicts.append(MergeConflict(source, field, base, ours, theirs))
+            merged_state.append(theirs_value if favor == 'theirs' else ours_value)
+    return tuple(merged_state)
+
+
+def merge_three_way(base, ours, theirs, favor='ours'):
+    """
+    Merge changes of their table since the common ancestor into our table, e.g. of two branches, by sources. Entries
+    changed on one side only are taken from that side, and entries changed on both sides are merged field by field, so
+    changes of the localized content on one side and the comment on the other are both kept. Conflicts are resolved by
+    favoring one side, except entries removed on one side and changed on the other, which are kept, and reported.
+
+    Like `StringsTable.merge`, our table is updated in place, so only entries changed by their side are touched (and
+    recorded by the change journal, if any). Entries are diffed by sources in one pass over both sides, and entries the
+    same on both sides, which are most of them, are kept after a single comparison without looking at the base.
+
+    Entries are kept in the order of our table, and entries added by their side follow the entry they follow in their
+    table.
+
+    :param tclocalizable.strings_table.StringsTable base: the common ancestor, empty if there's none
+    :param tclocalizable.strings_table.StringsTable ours: our table, to merge into
+    :param tclocalizable.strings_table.StringsTable theirs: their table
+    :param str favor: `ours` or `theirs`, the side whose value is taken for fields changed differently on both sides
+    :rtype: list[MergeConflict]
+    """
+    if favor not in ('ours', 'theirs'):
+        raise ValueError('Unknown side to favor: {}'.format(favor))
+    # Plain dictionaries, which are looked up without the overrides of `StringsTable`.
+    ours_entries, theirs_entries = dict(ours.items()), dict(theirs.items())
+    conflicts = []
+    merged_states = {}
+    """:type: dict[str, (str, str)]: merged localized content and comment of sources not the same on both sides"""
+    for source, localized_string in ours_entries.items():
+        theirs_localized_string = theirs_entries.get(source)
+        if localized_string != theirs_localized_string:
+            merged_states[source] = _merged_state(source, base.get(source), localized_string, theirs_localized_string,
+                                                  favor, conflicts)
+    for source, theirs_localized_string in theirs_entries.items():
+        if source not in ours_entries:
+            merged_states[source] = _merged_state(source, base.get(source), None, theirs_localized_string, favor,
+                                                  conflicts)
+
+    # Entries added to our table follow the last entry before them in their table which is kept in ours.
+    following_sources = {}
+    anchor = None
+    for source in theirs_entries:
+        if source in ours_entries:
+            if merged_states.get(source, True) is not None:
+                anchor = source
+        elif merged_states[source] is not None:
+            following_sources.setdefault(anchor, []).append(source)
+
+    for source, merged_state in merged_states.items():
+        if merged_state is None:
+            if source in ours_entries:
+                del ours[source]
+        elif source not in ours_entries:
+            localized_string = theirs_entries[source].copy()
+            localized_string.localized, localized_string.comment = merged_state
+            ours[source] = localized_string
+        else:
+            localized_string = ours_entries[source]
+            if localized_string.stored_localized != merged_state[0]:
+                localized_string.localized = merged_state[0]
+            if localized_string.comment != merged_state[1]:
+                localized_string.comment = merged_state[1]
+
+    if following_sources:
+        # Added entries are at the end. Move entries from the first one an added entry follows to the end, in order.
+        ordered_sources = list(following_sources.get(None, ()))
+        for source in ours_entries:
+            if source in following_sources:
+                ordered_sources.append(source)
+                ordered_sources.extend(following_sources[source])
+            elif ordered_sources and merged_states.get(source, True) is not None:
+                ordered_sources.append(source)
+        for source in ordered_sources:
+            ours.move_to_end(source)
+    return conflicts
+
+
+def write_file(strings_table, conflicts, file_path, encoding='utf-16', marker_size=DEFAULT_MARKER_SIZE):
+    """
+    Write a merged table, with each conflicted entry written as both sides between conflict markers like the ones of
+    git, to be resolved by hand.
+
+    :type strings_table: tclocalizable.strings_table.StringsTable
+    :type conflicts: list[MergeConflict]
+    :type file_path: str
+    :type encoding: str
+    :param int marker_size: length of conflict markers
+    """
+    if not conflicts:
+        strings_table.write_file(file_path, encoding=encoding)
+        return
+
+    conflicts = {conflict.source: conflict for conflict in conflicts}
+    entries = []
+    for source, localized_string in strings_table.items():
+        conflict = conflicts.get(source)
+        if conflict is None:
+            entries.append(repr(localized_string))
+        else:
+            entries.append('\n'.join(line for line in (
+                '<' * marker_size + ' ours', conflict.ours and repr(conflict.ours), '=' * marker_size,
+                conflict.theirs and repr(conflict.theirs), '>' * marker_size + ' theirs') if line))
+    encoder = codecs.getincrementalencoder(encoding)()
+    strings_writer.write_chunks(file_path, [encoder.encode('\n\n'.join(entries) + '\n', final=True)])
@@ -0,0 +1,294 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+import heapq
+import marshal
+import math
+import os
+import tempfile
+
+from tclocalizable.change_journal import REMOVED
+
+# Bump it whenever the layout of index files changes, so files of older versions are rebuilt rather than misread.
+INDEX_FORMAT_VERSION = 1
+
+Match = namedtuple('Match', ['score', 'source', 'localized', 'locale', 'table_name'])
+"""A translation of a source similar to the one looked up, and the similarity of the two sources from 0 to 1."""
+
+_EMPTY_POSTINGS = array('I')
+
+
+def _trigrams(source):
+    """
+    Case-insensitive trigrams of a source, padded so the beginning and the end of words weigh more.
+
+    :type source: str
+    :rtype: set[str]
+    """
+    padded = '  ' + ' '.join(source.lower().split()) + ' '
+    return {padded[idx:idx + 3] for idx in range(len(padded) - 2)}
+
+
+class TranslationMemory(object):
+    """
+    In-process translation memory of translated entries of tables, for suggesting translations of new sources from
+    similar sources translated in any table.
+
+    Each distinct source is indexed once by an inverted index of its trigrams, however many locales and tables translate
+    it. Similarity is the Dice coefficient of trigram sets. Postings are grouped by the trigram count of sources, so a
+    lookup only visits sources of the lengths which can be similar enough, and for each length only counts postings of
+    the rarest trigrams of the query. Trigrams shared with each candidate are then completed by binary searches in the
+    remaining postings, until the candidate can no longer be similar enough.
+
+    Removed sources are only marked as removed in the index, which is compacted when it's saved.
+    """
+
+    def __init__(self):
+        self._sources = []
+        """:type: list[str]: source of each source ID, `None` if removed"""
+        self._source_ids = {}
+        """:type: dict[str, int]"""
+        self._translations = []
+        """:type: list[dict[(str, str), str]]: localized content by locale and table name of each source ID"""
+        self._postings = {}
+        """:type: dict[int, dict[str, array]]: ascending IDs of sources having each trigram, by trigram count"""
+
+    def __len__(self):
+        """
+        :return: count of distinct sources translated
+        """
+        return len(self._source_ids)
+
+    # Updates ----------------------------------------------------------------------------------------------------------
+
+    def add(self, source, localized, locale, table_name=None):
+        """
+        Add (or replace) the translation of a source in a table. Empty translations are not added.
+
+        :type source: str
+        :type localized: str
+        :type locale: str
+        :type table_name: str
+        """
+        if not localized:
+            self.remove(source, locale, table_name)
+            return
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = self._source_ids[source] = len(self._sources)
+            trigrams = _trigrams(source)
+            self._sources.append(source)
+            self._translations.append({})
+            postings = self._postings.get(len(trigrams))
+            if postings is None:
+                postings = self._postings[len(trigrams)] = {}
+            for trigram in trigrams:
+                trigram_postings = postings.get(trigram)
+                if trigram_postings is None:
+                    trigram_postings = postings[trigram] = array('I')
+                trigram_postings.append(source_id)
+        self._translations[source_id][(locale, table_name)] = localized
+
+    def remove(self, source, locale, table_name=None):
+        """
+        :type source: str
+        :type locale: str
+        :type table_name: str
+        """
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            return
+        translations = self._translations[source_id]
+        translations.pop((locale, table_name), None)
+        if not translations:
+            del self._source_ids[source]
+            self._sources[source_id] = None
+
+    def add_table(self, strings_table, locale, table_name=None):
+        """
+        Add translated entries of a table. Entries without localized content, or with the source itself (e.g. copied
+        from the development language by merging), are not translated.
+
+        :type strings_table: tclocalizable.strings_table.StringsTable
+        :type locale: str
+        :type table_name: str
+        """
+        for localized_string in strings_table.strings():
+            if localized_string.stored_localized not in (None, '', localized_string.source):
+                self.add(localized_string.source, localized_string.stored_localized, locale, table_name)
+
+    def add_bundle(self, strings_bundle):
+        """
+        Add translated entries of all tables of a bundle.
+
+        :type strings_bundle: tclocalizable.strings_bundle.StringsBundle
+        """
+        for locale, table_name, strings_table in strings_bundle.tables():
+            self.add_table(strings_table, locale, table_name)
+
+    def apply_journal(self, journal, locale, table_name=None):
+        """
+        Apply net changes of a table since its journal is started (or cleared), without going through the whole table.
+
+        :type journal: tclocalizable.change_journal.ChangeJournal
+        :type locale: str
+        :type table_name: str
+        """
+        for kind, source, localized_string in journal.net_changes():
+            if kind == REMOVED or localized_string.stored_localized == source:
+                self.remove(source, locale, table_name)
+            else:
+                self.add(source, localized_string.stored_localized, locale, table_name)
+
+    # Lookups ----------------------------------------------------------------------------------------------------------
+
+    def matches(self, source, locale=None, k=5, min_score=0.7):
+        """
+        :param str source: source to find translations of similar sources for
+        :param str locale: only return translations of the locale, `None` for all locales
+        :param int k: maximum matches to return
+        :param float min_score: minimum similarity of sources, above 0
+        :rtype: list[Match]
+        :return: best matches first
+        """
+        query = _trigrams(source)
+        query_count = len(query)
+        if not query_count:
+            return []
+
+        # A source of `b` trigrams sharing `o` with the `a` of the query scores 2o / (a + b). As o <= min(a, b), scoring
+        # at least t needs ta / (2 - t) <= b <= a(2 - t) / t, and o >= t(a + b) / 2, so a source of `b` trigrams must
+        # have one of the `a - o + 1` rarest trigrams of the query to be similar enough. Lengths closest to the query
+        # are visited first, and once there are k candidates, t is raised to the k-th best score.
+        sources = self._sources
+        translations = self._translations
+        best = []  # Min-heap of (score, source ID) of the best k candidates
+        for candidate_count in sorted(self._postings, key=lambda count: abs(count - query_count)):
+            threshold = best[0][0] if len(best) == k else min_score
+            if not threshold * query_count <= (2 - threshold) * candidate_count + 1e-9 or \
+                    not threshold * candidate_count <= (2 - threshold) * query_count + 1e-9:
+                continue
+            min_overlap = max(1, math.ceil(threshold * (query_count + candidate_count) / 2 - 1e-9))
+            postings = self._postings[candidate_count]
+            trigram_postings = sorted((postings.get(trigram, _EMPTY_POSTINGS) for trigram in query), key=len)
+            prefix_length = query_count - min_overlap + 1
+            counts = Counter()
+            for source_ids in trigram_postings[:prefix_length]:
+                counts.update(source_ids)
+
+            remaining = trigram_postings[prefix_length:]
+            for source_id, overlap in counts.items():
+                for idx, source_ids in enumerate(remaining):
+                    if overlap + len(remaining) - idx < min_overlap:
+                        break
+                    position = bisect_left(source_ids, source_id)
+                    if position < len(source_ids) and source_ids[position] == source_id:
+                        overlap += 1
+                if overlap < min_overlap or sources[source_id] is None:
+                    continue
+                if locale is not None and not any(translation_locale == locale
+                                                  for translation_locale, _ in translations[source_id]):
+                    continue
+                candidate = (2 * overlap / (query_count + candidate_count), source_id)
+                if len(best) < k:
+                    heapq.heappush(best, candidate)
+                else:
+                    heapq.heappushpop(best, candidate)
+                if len(best) == k:
+                    min_overlap = max(min_overlap, math.ceil(best[0][0] * (query_count + candidate_count) / 2 - 1e-9))
+
+        matches = []
+        for score, source_id in sorted(best, reverse=True):
+            for (translation_locale, table_name), localized in sorted(translations[source_id].items(),
+                                                                      key=lambda item: (item[0][0], item[0][1] or '')):
+                if locale is None or translation_locale == locale:
+                    matches.append(Match(score, sources[source_id], localized, translation_locale, table_name))
+        return matches[:k]
+
+    def suggestions(self, strings_table, locale, min_score=0.8):
+        """
+        Suggest translations of untranslated entries of a table, e.g. entries merged from the development language.
+
+        :type strings_table: tclocalizable.strings_table.StringsTable
+        :param str locale: locale of the table
+        :param float min_score: minimum similarity of sources
+        :rtype: collections.Iterator[(tclocalizable.localized_string.LocalizedString, Match)]
+        :return: each untranslated entry with a match, and its best match
+        """
+        for localized_string in strings_table.strings():
+            if localized_string.stored_localized in (None, '', localized_string.source):
+                matches = self.matches(localized_string.source, locale=locale, k=1, min_score=min_score)
+                if matches:
+                    yield localized_string, matches[0]
+
+    # Persistence ------------------------------------------------------------------------------------------------------
+
+    def compact(self):
+        """
+        Drop removed sources from the index, renumbering the remaining ones.
+        """
+        translation_memory = TranslationMemory()
+        for source, source_id in self._source_ids.items():
+            for (locale, table_name), localized in self._translations[source_id].items():
+                translation_memory.add(source, localized, locale, table_name)
+        self.__dict__.update(translation_memory.__dict__)
+
+    def save(self, file_path):
+        """
+        Save the index to a file, replacing it atomically. Removed sources are compacted first.
+
+        :type file_path: str
+        """
+        if len(self._source_ids) != len(self._sources):
+            self.compact()
+        snapshot = (INDEX_FORMAT_VERSION, self._sources,
+                    [list(translations.items()) for translations in self._translations],
+                    {trigram_count: {trigram: source_ids.tobytes() for trigram, source_ids in postings.items()}
+                     for trigram_count, postings in self._postings.items()})
+        directory = os.path.dirname(os.path.abspath(file_path))
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='.', suffix='.tmp', delete=False) as f:
+            marshal.dump(snapshot, f)
+        try:
+            os.replace(f.name, file_path)
+        except BaseException:
+            os.remove(f.name)
+            raise
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        :param str file_path: file saved by `save`
+        :rtype: TranslationMemory
+        """
+        with open(file_path, 'rb') as f:
+            # Reading the whole file first is much faster than letting marshal read each object from the file.
+            snapshot = marshal.loads(f.read())
+        if snapshot[0] != INDEX_FORMAT_VERSION:
+            raise ValueError('{} is not a translation memory of this version'.format(file_path))
+        _, sources, translations, postings = snapshot
+
+        translation_memory = cls()
+        translation_memory._sources = sources
+        translation_memory._source_ids = {source: source_id for source_id, source in enumerate(sources)}
+        translation_memory._translations = [dict(items) for items in translations]
+        for trigram_count, trigram_postings in postings.items():
+            translation_memory._postings[trigram_count] = {trigram: array('I', source_ids)
+                                                           for trigram, source_ids in trigram_postings.items()}
+        return translation_memory
@@ -0,0 +1,355 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import os
+import threading
+
+from tclocalizable import strings_parser
+from tclocalizable.change_journal import ADDED, MODIFIED, REMOVED, Change
+from tclocalizable.strings_bundle import StringsBundle, StringsFile
+from tclocalizable.strings_table import StringsTable
+
+DEFAULT_INTERVAL = 1.0
+_BLOCK_SIZE = 64 * 1024
+
+
+def _common_prefix_length(a, b):
+    """
+    Blocks are compared first, which are compared by memcmp, then the first different block is bisected.
+
+    :type a: bytes
+    :type b: bytes
+    :rtype: int
+    """
+    size = min(len(a), len(b))
+    start = 0
+    while start < size:
+        end = min(start + _BLOCK_SIZE, size)
+        if a[start:end] != b[start:end]:
+            break
+        start = end
+    else:
+        return size
+    while end - start > 1:
+        middle = (start + end) // 2
+        if a[start:middle] == b[start:middle]:
+            start = middle
+        else:
+            end = middle
+    return start
+
+
+def _common_suffix_length(a, b, limit):
+    """
+    :type a: bytes
+    :type b: bytes
+    :param int limit: maximum length, so the suffix doesn't overlap the common prefix
+    :rtype: int
+    """
+    a_size, b_size = len(a), len(b)
+    start = 0
+    while start < limit:
+        end = min(start + _BLOCK_SIZE, limit)
+        if a[a_size - end:a_size - start] != b[b_size - end:b_size - start]:
+            break
+        start = end
+    else:
+        return limit
+    while end - start > 1:
+        middle = (start + end) // 2
+        if a[a_size - middle:a_size - start] == b[b_size - middle:b_size - start]:
+            start = middle
+        else:
+            end = middle
+    return start
+
+
+def _state(localized_string):
+    return localized_string.stored_localized, localized_string.comment
+
+
+class _WatchedFile(object):
+    __slots__ = ('path', 'encoding', 'stat', 'raw', 'entries', 'offsets')
+
+    def __init__(self, path):
+        self.path = path
+        self.encoding = None
+        """:type: str"""
+        self.stat = None
+        """:type: (int, int): mtime and size of the file when it's last checked"""
+        self.raw = b''
+        """:type: bytes: content of the file when it's last parsed"""
+        self.entries = []
+        """:type: list[tclocalizable.localized_string.LocalizedString]: entries in the order of the file"""
+        self.offsets = []
+        """:type: list[int]: offsets of entries, to be bisected"""
+
+
+class StringsWatcher(object):
+    """
+    Live tables of all `*.lproj/*.strings` files under a root directory, kept up to date by polling the files. Only
+    files whose mtime or size changed are read, and only the changed part of their content is parsed again: content is
+    diffed with the one last parsed, and scanning starts from the last entry before the first changed byte, and stops
+    at the first entry after it which is in the unchanged tail, since everything after it is parsed the same.
+
+    Subscribers are notified of changes of each table, which are `Change` records of the change journal with `None`
+    field, and old and new entries. Tables are updated in place, so they should be read only, and entries not changed
+    are kept, with their lines and offsets updated.
+    """
+
+    def __init__(self, root_path, encoding=None, verify_content=False):
+        """
+        :param str root_path: directory to watch `*.lproj/*.strings` files in
+        :param str encoding: encoding of all files, `None` to detect UTF-8 or UTF-16 for each file
+        :param bool verify_content: read every file on each poll, for file systems with coarse mtime
+        """
+        self.root_path = root_path
+        self.encoding = encoding
+        self.verify_content = verify_content
+        self.bundle = StringsBundle()
+        """:type: StringsBundle"""
+        self.errors = OrderedDict()
+        """:type: dict[(str, str), str]: errors of files failed to parse, whose tables are kept as last parsed"""
+        self._watched_files = OrderedDict()
+        """:type: dict[(str, str), _WatchedFile]"""
+        self._subscribers = []
+        self._stopped = threading.Event()
+        self.poll()
+
+    # Subscribers ------------------------------------------------------------------------------------------------------
+
+    def subscribe(self, subscriber):
+        """
+        :param subscriber: callable taking the locale, table name and list of changes of a changed table
+        """
+        self._subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.remove(subscriber)
+
+    # Polling ----------------------------------------------------------------------------------------------------------
+
+    def watch(self, interval=DEFAULT_INTERVAL):
+        """
+        Poll files at an interval until `stop` is called, e.g. from another thread or a subscriber. Subscribers are
+        notified in the calling thread.
+
+        :param float interval: seconds between polls
+        """
+        self._stopped.clear()
+        while not self._stopped.wait(interval):
+            self.poll()
+
+    def stop(self):
+        self._stopped.set()
+
+    def poll(self):
+        """
+        Check files once: parse files added or changed since the last check, drop the tables of removed ones, and
+        notify subscribers.
+
+        :rtype: list[(str, str, list[tclocalizable.change_journal.Change])]
+        :return: locale, table name and changes of each changed table
+        """
+        results = []
+        keys = set()
+        for locale, table_name, file_path in StringsBundle.strings_files_in_directory(self.root_path):
+            if (locale, table_name) in keys:
+                continue  # Tables in nested bundles are watched once, like `StringsBundle` which refuses them.
+            keys.add((locale, table_name))
+            changes = self._check_file(locale, table_name, file_path)
+            if changes:
+                results.append((locale, table_name, changes))
+
+        for locale, table_name in [key for key in self._watched_files if key not in keys]:
+            del self._watched_files[(locale, table_name)]
+            self.errors.pop((locale, table_name), None)
+            strings_table = self.bundle.get(locale, {}).pop(table_name, None)
+            if strings_table is None:
+                continue
+            del self.bundle.files[(locale, table_name)]
+            if not self.bundle[locale]:
+                del self.bundle[locale]
+            results.append((locale, table_name, [Change(REMOVED, source, None, localized_string, None)
+                                                 for source, localized_string in strings_table.items()]))
+
+        for locale, table_name, changes in results:
+            for subscriber in list(self._subscribers):
+                subscriber(locale, table_name, changes)
+        return results
+
+    def _check_file(self, locale, table_name, file_path):
+        """
+        :rtype: list[tclocalizable.change_journal.Change]
+        """
+        key = (locale, table_name)
+        watched_file = self._watched_files.get(key)
+        if watched_file is None:
+            watched_file = self._watched_files[key] = _WatchedFile(file_path)
+        try:
+            stat = os.stat(file_path)
+            stat = (stat.st_mtime_ns, stat.st_size)
+            if stat == watched_file.stat and file_path == watched_file.path and not self.verify_content:
+                return []
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            encoding = self.encoding or strings_parser.detect_encoding(file_path)
+        except OSError:
+            return []  # Removed since the directory is walked, and dropped by the next poll.
+        watched_file.stat = stat
+        watched_file.path = file_path
+        if raw == watched_file.raw and encoding == watched_file.encoding:
+            return []
+
+        strings_tables = self.bundle.setdefault(locale, OrderedDict())
+        strings_table = strings_tables.get(table_name, StringsTable())
+        try:
+            changes = self._parse(watched_file, raw, encoding, strings_table)
+        except ValueError as e:
+            # Tables of files failed to parse are kept as they are last parsed, or are not added yet.
+            self.errors[key] = str(e)
+            if not strings_tables:
+                del self.bundle[locale]
+            return []
+        self.errors.pop(key, None)
+        strings_tables[table_name] = strings_table
+        self.bundle.files[key] = StringsFile(file_path, encoding)
+        return changes
+
+    # Parsing ----------------------------------------------------------------------------------------------------------
+
+    def _parse(self, watched_file, raw, encoding, strings_table):
+        """
+        Parse the part of new content of a file changed since it's last parsed, and update its table.
+
+        :type watched_file: _WatchedFile
+        :param bytes raw: new content
+        :type encoding: str
+        :type strings_table: StringsTable
+        :rtype: list[tclocalizable.change_journal.Change]
+        """
+        strings_buffer = strings_parser.StringsBuffer(raw, encoding=encoding)
+        entries, offsets = watched_file.entries, watched_file.offsets
+        start, anchor = 0, len(entries)
+        localized_strings = None
+        # Offsets are not available for files transcoded before parsing.
+        if entries and entries[0].offset is not None and encoding == watched_file.encoding:
+            prefix_length = _common_prefix_length(watched_file.raw, raw)
+            suffix_length = _common_suffix_length(watched_file.raw, raw,
+                                                  min(len(watched_file.raw), len(raw)) - prefix_length)
+            # The last entry starting in the unchanged head, which is parsed the same, with the same comment.
+            index = bisect_right(offsets, prefix_length) - 1
+            if index >= 0:
+                start = index
+                localized_strings = strings_buffer.localized_strings(
+                    entries[index].offset, line=entries[index].line, comment=entries[index].comment)
+            # The first entry starting in the unchanged tail, after which everything is parsed the same once the
+            # scanner meets it (or any entry after it) again.
+            anchor = bisect_left(offsets, len(watched_file.raw) - suffix_length)
+        if localized_strings is None:
+            localized_strings = strings_buffer.localized_strings()
+
+        offset_delta = len(raw) - len(watched_file.raw)
+        anchor_offset = offsets[anchor] + offset_delta if anchor < len(entries) else None
+        stop, line_delta = len(entries), 0
+        new_region = []
+        for localized_string in localized_strings:
+            new_region.append(localized_string)
+            if anchor_offset is not None and localized_string.offset >= anchor_offset:
+                index = bisect_left(offsets, localized_string.offset - offset_delta, anchor)
+                if index < len(offsets) and offsets[index] == localized_string.offset - offset_delta:
+                    stop, line_delta = index + 1, localized_string.line - entries[index].line
+                    break
+
+        tail = entries[stop:]
+        if offset_delta or line_delta:
+            for localized_string in tail:
+                localized_string.offset += offset_delta
+                localized_string.line += line_delta
+        old_region = entries[start:stop]
+        new_entries = OrderedDict((localized_string.source, localized_string) for localized_string in new_region)
+        # Only the region is diffed if sources are not duplicated, otherwise entries of the whole file are.
+        if len(strings_table) != len(entries) or len(new_entries) != len(new_region) or \
+                any(source in strings_table for source in new_entries.keys() - {entry.source for entry in old_region}):
+            new_region = entries[:start] + new_region + tail
+            start, tail = 0, []
+            # Entries of the table are kept at the last occurrence of their sources, which may move, so other
+            # occurrences get their own copies, and the positions of each occurrence are recorded once.
+            last_indexes = {localized_string.source: idx for idx, localized_string in enumerate(new_region)}
+            new_region = [localized_string.copy() if last_indexes[localized_string.source] != idx and
+                          strings_table.get(localized_string.source) is localized_string else localized_string
+                          for idx, localized_string in enumerate(new_region)]
+            old_entries = OrderedDict(strings_table.items())
+            new_entries = OrderedDict((localized_string.source, localized_string) for localized_string in new_region)
+        else:
+            old_entries = OrderedDict((localized_string.source, localized_string) for localized_string in old_region)
+
+        changes, kept_entries = self._update_table(strings_table, old_entries, new_entries, entries[:start], tail)
+        watched_file.entries = entries[:start] + [kept_entries.get(id(localized_string), localized_string)
+                                                  for localized_string in new_region] + tail
+        watched_file.offsets = offsets[:start] + [localized_string.offset for localized_string in
+                                                  watched_file.entries[start:]]
+        watched_file.raw = raw
+        watched_file.encoding = encoding
+        return changes
+
+    @staticmethod
+    def _update_table(strings_table, old_entries, new_entries, head, tail):
+        """
+        :type strings_table: StringsTable
+        :param dict[str, tclocalizable.localized_string.LocalizedString] old_entries: entries parsed again
+        :param dict[str, tclocalizable.localized_string.LocalizedString] new_entries: entries parsed from new content
+        :param list[tclocalizable.localized_string.LocalizedString] head: entries before them, which are unchanged
+        :param list[tclocalizable.localized_string.LocalizedString] tail: entries after them, which are unchanged
+        :rtype: (list[tclocalizable.change_journal.Change], dict[int, tclocalizable.localized_string.LocalizedString])
+        :return: changes, and entries kept in the table by the ids of the new entries parsed the same
+        """
+        changes = []
+        for source, localized_string in old_entries.items():
+            if source not in new_entries:
+                del strings_table[source]
+                changes.append(Change(REMOVED, source, None, localized_string, None))
+
+        kept_entries = {}
+        for source, localized_string in new_entries.items():
+            old_localized_string = old_entries.get(source)
+            if old_localized_string is None:
+                strings_table[source] = localized_string
+                changes.append(Change(ADDED, source, None, None, localized_string))
+            elif _state(old_localized_string) != _state(localized_string):
+                strings_table[source] = localized_string
+                changes.append(Change(MODIFIED, source, None, old_localized_string, localized_string))
+            elif old_localized_string is not localized_string:
+                old_localized_string.line, old_localized_string.offset = localized_string.line, localized_string.offset
+                kept_entries[id(localized_string)] = old_localized_string
+
+        if [source for source in old_entries if source in new_entries] != list(new_entries):
+            # Entries added or moved. Entries parsed again are put in the order of the file by moving them either
+            # along with the head to the beginning, or along with the tail to the end, whichever is shorter.
+            if len(head) < len(tail):
+                for source in reversed(new_entries):
+                    strings_table.move_to_end(source, last=False)
+                for localized_string in reversed(head):
+                    strings_table.move_to_end(localized_string.source, last=False)
+            else:
+                for source in new_entries:
+                    strings_table.move_to_end(source)
+                for localized_string in tail:
+                    strings_table.move_to_end(localized_string.source)
+        return changes, kept_entries
@@ -15,16 +15,45 @@
 # limitations under the License.
 #
 from collections import namedtuple
+import asyncio
+import contextlib
+import io
+import json
 import os
+import subprocess
+import sys
 import tempfile
 import unittest
+from unittest import mock
+from tclocalizable import async_io, canonical, cli, converters, duplicates, escape_codec, format_specifiers, \
+    strings_parser, strings_writer, three_way_merge
+from tclocalizable.compiled_table import CompiledStringsTable, compile_table
+from tclocalizable.instrumentation import Instrumentation
+from tclocalizable.parse_cache import ParseCache
+from tclocalizable.strings_bundle import StringsBundle
 from tclocalizable.strings_table import StringsTable
+from tclocalizable.translation_memory import Match, TranslationMemory
+from tclocalizable.watcher import StringsWatcher
 from tclocalizable.localized_string import LocalizedString
 
 source_root = os.path.abspath(os.path.dirname(__file__))
 ExpectedResult = namedtuple('ExpectedResult', ['souce', 'localized', 'comment'])
 
 
+def strings_table_of(*entries):
+    """
+    :param entries: `LocalizedString` instances, or `(source, localized[, comment])` of entries
+    :rtype: StringsTable
+    """
+    strings_table = StringsTable()
+    for entry in entries:
+        if isinstance(entry, LocalizedString):
+            strings_table[entry.source] = entry
+        else:
+            strings_table.insert(*entry)
+    return strings_table
+
+
 class TestStringsTableContentMixin(object):
     default_expected_results = (
         ExpectedResult("%@ doesn't have a list named %@.", "%1$@ は %2$@ というリストをもっていません。", "Some comemnt"),
@@ -36,7 +65,7 @@ class TestStringsTableContentMixin(object):
         ExpectedResult("String with \"quote\".\"", "有引號的字\"", "Comment with \"quote\""),
         ExpectedResult("String with =", "String with =", "String with ="),
         ExpectedResult("String with ;", "String with ;", "String with semicolon"),
-        ExpectedResult(r"String\twith \n", r"String\twith \n", "String with spaces"),
+        ExpectedResult("String\twith \n", "String\twith \n", "String with spaces"),
         ExpectedResult("String not translated", "String not translated", "Not translated"),
     )
     """:type: tuple[ExpectedResult]"""
@@ -174,6 +203,69 @@ class TestIOStringsFile(unittest.TestCase, TestStringsTableContentMixin):
 "String not translated" = "QQ";
 ''')
 
+    def test_write_from_iterator(self):
+        strings_table = StringsTable(os.path.join(source_root, 'example16.strings'))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            table_file_path = os.path.join(tmp_dir, 'table.strings')
+            iterator_file_path = os.path.join(tmp_dir, 'iterator.strings')
+            strings_table.write_file(table_file_path)
+            StringsTable.write_localized_strings_to_file(
+                StringsTable.localized_strings_in_file(os.path.join(source_root, 'example16.strings')),
+                iterator_file_path)
+            strings_writer.write_localized_strings(strings_table.strings(), os.path.join(tmp_dir, 'batches.strings'),
+                                                   batch_size=3)
+
+            with open(table_file_path, 'rb') as f:
+                content = f.read()
+            for file_name in ('iterator.strings', 'batches.strings'):
+                with open(os.path.join(tmp_dir, file_name), 'rb') as f:
+                    self.assertEqual(f.read(), content)
+            self.assertEqual(content.count(b'\xff\xfe'), 1)  # Only one BOM
+
+    def test_write_atomic(self):
+        def failing_localized_strings():
+            yield LocalizedString('A new key', 'A new value')
+            raise RuntimeError('Failed halfway')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            StringsTable(os.path.join(source_root, 'example16.strings')).write_file(file_path)
+            os.chmod(file_path, 0o640)
+
+            with self.assertRaises(RuntimeError):
+                StringsTable.write_localized_strings_to_file(failing_localized_strings(), file_path)
+            self._test_strings_table_content(StringsTable(file_path))
+            self.assertEqual(os.listdir(tmp_dir), ['Localizable.strings'])
+
+            StringsTable().write_file(file_path)
+            self.assertEqual(os.path.getsize(file_path), 0)
+            self.assertEqual(os.stat(file_path).st_mode & 0o777, 0o640)
+
+    def test_write_skip_unchanged(self):
+        strings_table = StringsTable(os.path.join(source_root, 'example16.strings'))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            self.assertTrue(strings_table.write_file(file_path, skip_unchanged=True))
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            for atomic in (True, False):
+                os.utime(file_path, ns=(0, 0))
+                self.assertFalse(strings_table.write_file(file_path, atomic=atomic, skip_unchanged=True))
+                self.assertEqual(os.stat(file_path).st_mtime_ns, 0)
+
+                for changed_content in (content + '\n'.encode('utf-16-le'), content.replace('字'.encode('utf-16-le'),
+                                                                                            '子'.encode('utf-16-le'))):
+                    with open(file_path, 'wb') as f:
+                        f.write(changed_content)
+                    # Small batches to copy the same leading batches from the file
+                    self.assertTrue(strings_writer.write_localized_strings(strings_table.strings(), file_path,
+                                                                           batch_size=2, atomic=atomic,
+                                                                           skip_unchanged=True))
+                    with open(file_path, 'rb') as f:
+                        self.assertEqual(f.read(), content)
+
     def test_duplicate(self):
         duplicated_entries = StringsTable.duplicated_entries_in_file(os.path.join(source_root, 'duplicate16.strings'))
         self.assertEqual(len(duplicated_entries), 1)
@@ -183,6 +275,782 @@ class TestIOStringsFile(unittest.TestCase, TestStringsTableContentMixin):
         self.assertEqual(duplicated_entries['String with "quote"."'][1].localized, '有引號的字2"')
 
 
+class TestParseStringsFile(unittest.TestCase, TestStringsTableContentMixin):
+
+    def test_escape_sequences(self):
+        lines = (
+            (r'"plain" = "value";', 'plain', 'value'),
+            (r'"a \"quoted\" key" = "a \"quoted\" value";', 'a "quoted" key', 'a "quoted" value'),
+            (r'"key = with ; signs" = "value = with ; signs"  ;', 'key = with ; signs', 'value = with ; signs'),
+            (r'  "extra"   =   "spaces"   ;  ', 'extra', 'spaces'),
+            (r'"escapes \t \n \\ \$" = "\a\b\f\r\v\'";', 'escapes \t \n \\ $', '\a\b\f\r\v\''),
+            (r'"unicode \U00e9 \UD83D\UDE00 \U" = "octal \101\0";', 'unicode é 😀 U', 'octal A\0'),
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(line for line, _, _ in lines))
+
+            localized_strings = list(StringsTable.localized_strings_in_file(file_path, encoding='utf-8'))
+            self.assertEqual([(localized_string.source, localized_string.stored_localized)
+                              for localized_string in localized_strings], [line[1:] for line in lines])
+
+            # Every value is written back escaped, and read as the same.
+            StringsTable.write_localized_strings_to_file(localized_strings, file_path, encoding='utf-8')
+            self.assertEqual(list(StringsTable.localized_strings_in_file(file_path, encoding='utf-8')),
+                             localized_strings)
+            with open(file_path, encoding='utf-8') as f:
+                self.assertEqual(f.read().splitlines()[-3:], [
+                    '"escapes \\t \\n \\\\ $" = "\\U0007\\U0008\\U000c\\r\\U000b\'";',
+                    '',
+                    r'"unicode é 😀 U" = "octal A\U0000";',
+                ])
+        # Strings containing the separator of batches are escaped one by one.
+        self.assertEqual(escape_codec.escape_all(['a\0b', '"\t"']), ['a\\U0000b', '\\"\\t\\"'])
+
+    def test_malformed_line(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write('"a" = "b";\n\n"no value";\n')
+
+            with self.assertRaisesRegex(ValueError, 'line 3'):
+                list(StringsTable.localized_strings_in_file(file_path, encoding='utf-8'))
+
+    multi_line_content = (
+        '/* File header */\n'
+        '\n'
+        '/*\n'
+        ' * A comment\n'
+        ' * spanning lines\n'
+        ' */\n'
+        '"multi\n'
+        'line" =\n'
+        '    "多行\n'
+        '     值";\n'
+        '// A line comment\n'
+        '"emoji 😀" = "絵文字 😀"; "same line" = "同じ行";\n'
+    )
+
+    def _test_multi_line_content(self, encoding, raw_encoding, chunk_size=None, use_mmap=False, detect=False):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            with open(file_path, 'w', encoding=encoding) as f:
+                f.write(self.multi_line_content)
+
+            localized_strings = list(strings_parser.localized_strings_in_file(
+                file_path, encoding=None if detect else encoding, chunk_size=chunk_size, use_mmap=use_mmap))
+            self.assertEqual([(s.source, s.localized, s.comment, s.line) for s in localized_strings], [
+                ('multi\nline', '多行\n     值', 'A comment\n * spanning lines', 7),
+                ('emoji 😀', '絵文字 😀', 'A line comment', 12),
+                ('same line', '同じ行', None, 12),
+            ])
+            with open(file_path, 'rb') as f:
+                for localized_string in localized_strings:
+                    f.seek(localized_string.offset)
+                    head = '"{}"'.format(localized_string.source).encode(raw_encoding)
+                    self.assertEqual(f.read(len(head)), head)
+
+    def test_multi_line_8(self):
+        self._test_multi_line_content('utf-8', 'utf-8')
+
+    def test_multi_line_16(self):
+        self._test_multi_line_content('utf-16', 'utf-16-le')
+        self._test_multi_line_content('utf-16-be', 'utf-16-be')
+
+    def test_multi_line_small_chunks(self):
+        self._test_multi_line_content('utf-16', 'utf-16-le', chunk_size=8)
+        self._test_multi_line_content('utf-8', 'utf-8', chunk_size=4)
+
+    def test_multi_line_mmap(self):
+        self._test_multi_line_content('utf-16', 'utf-16-le', use_mmap=True)
+        self._test_multi_line_content('utf-8', 'utf-8', use_mmap=True, chunk_size=16)
+
+    def test_detect_encoding(self):
+        for encoding, raw_encoding in (('utf-8', 'utf-8'), ('utf-8-sig', 'utf-8'), ('utf-16', 'utf-16-le'),
+                                       ('utf-16-le', 'utf-16-le'), ('utf-16-be', 'utf-16-be')):
+            self._test_multi_line_content(encoding, raw_encoding, detect=True)
+            self._test_multi_line_content(encoding, raw_encoding, use_mmap=True, detect=True)
+
+        self.assertEqual(strings_parser.detect_encoding(os.path.join(source_root, 'example16.strings')), 'utf-16')
+        self.assertEqual(strings_parser.detect_encoding(os.path.join(source_root, 'example.strings')), 'utf-8')
+        self._test_strings_table_content(StringsTable(os.path.join(source_root, 'example16.strings'), encoding=None,
+                                                      use_mmap=True))
+
+    def test_empty_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            open(file_path, 'w').close()
+            self.assertEqual(len(StringsTable(file_path, use_mmap=True)), 0)
+            self.assertEqual(len(StringsTable(file_path)), 0)
+
+    def test_transcoded_encoding(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            with open(file_path, 'w', encoding='shift_jis') as f:
+                f.write('/* 表 */\n"表" = "ソ";\n')
+
+            localized_string, = StringsTable.localized_strings_in_file(file_path, encoding='shift_jis')
+            self.assertEqual((localized_string.source, localized_string.localized), ('表', 'ソ'))
+            self.assertEqual((localized_string.comment, localized_string.line), ('表', 2))
+            self.assertIsNone(localized_string.offset)
+
+
+class TestLazyStringsTable(unittest.TestCase, TestStringsTableContentMixin):
+
+    def test_read(self):
+        self._test_strings_table_content(StringsTable(os.path.join(source_root, 'example16.strings'), lazy=True))
+        self._test_strings_table_content(StringsTable(os.path.join(source_root, 'example.strings'), encoding='utf-8',
+                                                      lazy=True))
+
+    def test_lookup(self):
+        eager_table = StringsTable(os.path.join(source_root, 'example16.strings'))
+        strings_table = StringsTable(os.path.join(source_root, 'example16.strings'), lazy=True)
+        self.assertIn('No comment', strings_table)
+        self.assertNotIn('No such key', strings_table)
+        self.assertEqual(list(strings_table.keys()), list(eager_table.keys()))
+        self.assertEqual(strings_table.get('No comment'), eager_table['No comment'])
+        self.assertEqual(strings_table['String with ;'].line, eager_table['String with ;'].line)
+        self.assertEqual(strings_table['String with ;'].offset, eager_table['String with ;'].offset)
+        self.assertIsNone(strings_table.get('No such key'))
+        with self.assertRaises(KeyError):
+            strings_table['keys'] = LocalizedString('A key')
+
+        strings_table.materialize()
+        self.assertEqual(list(strings_table.items()), list(eager_table.items()))
+
+    def test_equality(self):
+        file_path = os.path.join(source_root, 'example16.strings')
+        eager_table = StringsTable(file_path)
+        self.assertEqual(StringsTable(file_path, lazy=True), StringsTable(file_path, lazy=True))
+        self.assertEqual(StringsTable(file_path, lazy=True), eager_table)
+        self.assertEqual(eager_table, StringsTable(file_path, lazy=True))
+        self.assertEqual(dict(eager_table), StringsTable(file_path, lazy=True))
+        self.assertFalse(StringsTable(file_path, lazy=True) != eager_table)
+
+        strings_table = StringsTable(file_path, lazy=True)
+        strings_table['No comment'].localized = 'Changed'
+        self.assertNotEqual(strings_table, eager_table)
+        self.assertNotEqual(eager_table, strings_table)
+
+    def test_duplicate(self):
+        strings_table = StringsTable(os.path.join(source_root, 'duplicate16.strings'), lazy=True)
+        self.assertEqual(list(strings_table.keys()), ["%@ doesn't have a list named %@.", 'String with "quote"."'])
+        self.assertEqual(strings_table['String with "quote"."'].localized, '有引號的字2"')
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for lazy in (False, True):
+                strings_table = StringsTable(os.path.join(source_root, 'example16.strings'), lazy=lazy)
+                strings_table['String with ;'].localized = '有分號的字'
+                strings_table.insert('String not translated 2', comment='Another not translated')
+                strings_table.write_file(os.path.join(tmp_dir, 'lazy' if lazy else 'eager'))
+
+            with open(os.path.join(tmp_dir, 'lazy'), 'rb') as lazy_file, \
+                    open(os.path.join(tmp_dir, 'eager'), 'rb') as eager_file:
+                self.assertEqual(lazy_file.read(), eager_file.read())
+
+
+class TestStringsBundle(unittest.TestCase, TestStringsTableContentMixin):
+
+    def _make_bundle_directory(self, root_path):
+        project_path = os.path.join(root_path, 'Project')
+        for locale, table_name, fixture, encoding in (('en', 'Localizable', 'example16.strings', 'utf-16'),
+                                                      ('en', 'InfoPlist', 'example2.strings', 'utf-8'),
+                                                      ('zh-Hant', 'Localizable', 'example.strings', 'utf-8')):
+            os.makedirs(os.path.join(project_path, locale + '.lproj'), exist_ok=True)
+            with open(os.path.join(source_root, fixture), 'rb') as f:
+                content = f.read()
+            with open(os.path.join(project_path, locale + '.lproj', table_name + '.strings'), 'wb') as f:
+                f.write(content)
+        with open(os.path.join(project_path, 'README.strings'), 'w') as f:
+            f.write('Not in a lproj directory')
+        return project_path
+
+    def test_read_directory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            project_path = self._make_bundle_directory(tmp_dir)
+            for processes in (1, 2):
+                strings_bundle = StringsBundle(tmp_dir, processes=processes)
+                self.assertEqual(list(strings_bundle.locales()), ['en', 'zh-Hant'])
+                self.assertEqual([(locale, table_name) for locale, table_name, _ in strings_bundle.tables()],
+                                 [('en', 'InfoPlist'), ('en', 'Localizable'), ('zh-Hant', 'Localizable')])
+                self._test_strings_table_content(strings_bundle['en']['Localizable'])
+                self._test_strings_table_content(strings_bundle['zh-Hant']['Localizable'])
+                self.assertEqual(strings_bundle['en']['InfoPlist']['a key'].localized, '一個鑰匙')
+                self.assertEqual(strings_bundle.files[('en', 'Localizable')],
+                                 (os.path.join(project_path, 'en.lproj', 'Localizable.strings'), 'utf-16'))
+                self.assertEqual(strings_bundle.files[('en', 'InfoPlist')].encoding, 'utf-8')
+
+    def test_duplicated_entries_in_directory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            project_path = self._make_bundle_directory(tmp_dir)
+            # The same table in another directory of the same locale
+            os.makedirs(os.path.join(tmp_dir, 'Extension', 'en.lproj'))
+            with open(os.path.join(source_root, 'example16.strings'), 'rb') as source, \
+                    open(os.path.join(tmp_dir, 'Extension', 'en.lproj', 'Extension.strings'), 'wb') as f:
+                f.write(source.read())
+
+            for processes in (1, 2):
+                duplicated_entries = StringsBundle.duplicated_entries_in_directory(tmp_dir, processes=processes)
+                self.assertEqual(list(duplicated_entries), ['en'])
+                self.assertEqual(len(duplicated_entries['en']), 8)
+                # Also defined in InfoPlist.strings
+                self.assertEqual([(os.path.relpath(file_path, tmp_dir), localized_string.localized)
+                                  for file_path, localized_string in duplicated_entries['en']['No comment']], [
+                    (os.path.join('Extension', 'en.lproj', 'Extension.strings'), '沒有註解'),
+                    (os.path.join('Project', 'en.lproj', 'InfoPlist.strings'), 'kein Kommentar'),
+                    (os.path.join('Project', 'en.lproj', 'Localizable.strings'), '沒有註解'),
+                ])
+                self.assertEqual(duplicated_entries['en']['No comment'][2].localized_string.line, 8)
+
+            # Entries with the same hash but different sources are not duplicates
+            with mock.patch.object(duplicates, '_source_hash', return_value=0):
+                duplicated_entries = duplicates.duplicated_entries_in_files(
+                    [os.path.join(project_path, 'zh-Hant.lproj', 'Localizable.strings')], processes=1)
+            self.assertEqual(duplicated_entries, {})
+
+    def test_write_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            project_path = self._make_bundle_directory(tmp_dir)
+            strings_bundle = StringsBundle(tmp_dir)
+            strings_bundle.write_files()
+            self.assertEqual(strings_bundle.write_files(), [])
+
+            strings_bundle['zh-Hant']['Localizable'].insert('A new key', 'A new value')
+            self.assertEqual(strings_bundle.write_files(), [('zh-Hant', 'Localizable')])
+            self.assertIn('A new key', StringsTable(os.path.join(project_path, 'zh-Hant.lproj', 'Localizable.strings'),
+                                                    encoding='utf-8'))
+            self.assertEqual(len(strings_bundle.write_files(skip_unchanged=False)), 3)
+
+    def test_merge_base_locale(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._make_bundle_directory(tmp_dir)
+            strings_bundle = StringsBundle(tmp_dir)
+            strings_bundle['zh-Hant']['Localizable'].insert('An obsolete key')
+            self.assertEqual(strings_bundle.merge_base_locale('en', exclude_extra=True),
+                             {('zh-Hant', 'Localizable'): (0, 1, 0)})
+            self.assertNotIn('An obsolete key', strings_bundle['zh-Hant']['Localizable'])
+
+    def test_conflicted_tables(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._make_bundle_directory(os.path.join(tmp_dir, 'App'))
+            self._make_bundle_directory(os.path.join(tmp_dir, 'Extension'))
+            with self.assertRaises(ValueError):
+                StringsBundle(tmp_dir)
+            self.assertEqual(len(StringsBundle(os.path.join(tmp_dir, 'App'))), 2)
+
+
+class TestParseCache(unittest.TestCase, TestStringsTableContentMixin):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ParseCache(os.path.join(self.tmp_dir.name, 'cache'))
+        self.file_path = os.path.join(self.tmp_dir.name, 'Localizable.strings')
+        with open(os.path.join(source_root, 'example16.strings'), 'rb') as source, open(self.file_path, 'wb') as f:
+            f.write(source.read())
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_warm_cache(self):
+        cold_table = StringsTable(self.file_path, cache=self.cache)
+        self._test_strings_table_content(cold_table)
+
+        with mock.patch.object(strings_parser, 'localized_strings_in_file', side_effect=AssertionError('parsed')):
+            warm_table = StringsTable(self.file_path, cache=self.cache)
+        self._test_strings_table_content(warm_table)
+        self.assertEqual([s.offset for s in warm_table.values()], [s.offset for s in cold_table.values()])
+        self.assertEqual([(entry.file_path, entry.encoding) for entry in self.cache.entries()],
+                         [(self.file_path, 'utf-16')])
+
+    def test_modified_file(self):
+        StringsTable(self.file_path, cache=self.cache)
+        strings_table = StringsTable(self.file_path)
+        strings_table.insert('A new key', 'A new value')
+        strings_table.write_file(self.file_path)
+
+        self.assertIn('A new key', StringsTable(self.file_path, cache=self.cache))
+        self.assertEqual(len(self.cache.entries()), 1)
+
+    def test_verify_hash(self):
+        cache = ParseCache(self.cache.directory, verify_hash=True)
+        StringsTable(self.file_path, cache=cache)
+        stat = os.stat(self.file_path)
+        with open(self.file_path, 'rb') as f:
+            content = f.read()
+        with open(self.file_path, 'wb') as f:
+            # Same size and same mtime
+            f.write(content.replace('Not translated'.encode('utf-16-le'), 'NOT TRANSLATED'.encode('utf-16-le')))
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertEqual(StringsTable(self.file_path, cache=cache)['String not translated'].comment, 'NOT TRANSLATED')
+        self.assertEqual(StringsTable(self.file_path, cache=self.cache)['String not translated'].comment,
+                         'NOT TRANSLATED')
+
+    def test_evict_and_clear(self):
+        StringsTable(self.file_path, cache=self.cache)
+        StringsTable(os.path.join(source_root, 'example.strings'), encoding='utf-8', cache=self.cache)
+        self.assertEqual(len(self.cache.entries()), 2)
+
+        cache = ParseCache(self.cache.directory, max_size=self.cache.size() - 1)
+        cache.evict()
+        self.assertEqual([entry.file_path for entry in cache.entries()],
+                         [os.path.join(source_root, 'example.strings')])
+
+        cache.invalidate(os.path.join(source_root, 'example.strings'), encoding='utf-8')
+        self.assertEqual(cache.entries(), [])
+        StringsTable(self.file_path, cache=self.cache)
+        self.cache.clear()
+        self.assertEqual(self.cache.size(), 0)
+
+
+class TestCompiledStringsTable(unittest.TestCase, TestStringsTableContentMixin):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'Localizable.compiled')
+        self.strings_table = StringsTable(os.path.join(source_root, 'example16.strings'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lookup(self):
+        compile_table(self.strings_table, self.file_path)
+        with CompiledStringsTable(self.file_path) as compiled_strings_table:
+            self._test_strings_table_content(compiled_strings_table)
+            self.assertEqual(compiled_strings_table, self.strings_table)
+            self.assertEqual(list(compiled_strings_table), list(self.strings_table))
+            self.assertEqual(list(compiled_strings_table.strings()), list(self.strings_table.strings()))
+            self.assertIn('No comment', compiled_strings_table)
+            self.assertNotIn('No such key', compiled_strings_table)
+            self.assertIsNone(compiled_strings_table.get('No such key'))
+            with self.assertRaises(KeyError):
+                compiled_strings_table['No such key']
+            self.assertEqual(compiled_strings_table.localized('No comment'), '沒有註解')
+            self.assertEqual(compiled_strings_table.localized('String not translated'), 'String not translated')
+            self.assertEqual(compiled_strings_table.localized('No such key', 'default'), 'default')
+            with self.assertRaises(KeyError):
+                compiled_strings_table[1]
+            self.assertEqual(compiled_strings_table.get(1, 'default'), 'default')
+            self.assertNotIn(1, compiled_strings_table)
+
+    def test_permissions(self):
+        umask = os.umask(0o027)
+        try:
+            compile_table(self.strings_table, self.file_path)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(self.file_path).st_mode & 0o777, 0o640)
+        os.chmod(self.file_path, 0o600)
+        compile_table(self.strings_table, self.file_path)
+        self.assertEqual(os.stat(self.file_path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['Localizable.compiled'])
+
+    def test_empty_and_invalid(self):
+        compile_table(StringsTable(), self.file_path)
+        with CompiledStringsTable(self.file_path) as compiled_strings_table:
+            self.assertEqual(len(compiled_strings_table), 0)
+            self.assertNotIn('No comment', compiled_strings_table)
+
+        with self.assertRaises(ValueError):
+            CompiledStringsTable(os.path.join(source_root, 'example16.strings'))
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def _run(self, *argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            exit_status = cli.main(list(argv))
+        return exit_status, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_stats(self):
+        exit_status, records = self._run('stats', '-j', '2', os.path.join(source_root, 'example.strings'),
+                                         os.path.join(source_root, 'example16.strings'))
+        self.assertEqual(exit_status, 0)
+        self.assertEqual([(record['encoding'], record['entries'], record['untranslated']) for record in records],
+                         [('utf-8', 8, 1), ('utf-16', 8, 1)])
+
+    def test_lint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(source_root, 'duplicate16.strings'), 'rb') as source, \
+                    open(os.path.join(tmp_dir, 'Duplicate.strings'), 'wb') as f:
+                f.write(source.read())
+            with open(os.path.join(tmp_dir, 'Malformed.strings'), 'w', encoding='utf-16') as f:
+                f.write('"A key" = "A value";\n"Another key" = ;\n')
+            with open(os.path.join(tmp_dir, 'Specifiers.strings'), 'w', encoding='utf-16') as f:
+                f.write('"%d photos" = "%@ photos";\n"%1$@ and %2$@" = "%2$@ et %1$@";\n')
+
+            exit_status, records = self._run('lint', tmp_dir)
+        self.assertEqual(exit_status, 1)
+        self.assertEqual([(os.path.basename(record['file']), record['error'], record.get('line'))
+                          for record in records], [
+            ('Duplicate.strings', 'Duplicated entry', 8),
+            ('Malformed.strings', 'Failed to parse line 2: "Another key" = ;', None),
+            ('Specifiers.strings', 'Format specifiers: localized uses argument 1 as %@ instead of %d', 1),
+        ])
+        self.assertEqual((records[-1]['kind'], records[-1]['position'], records[-1]['expected'],
+                          records[-1]['actual']), ('type', 1, 'd', '@'))
+        self.assertEqual(self._run('lint', os.path.join(source_root, 'example16.strings')), (0, []))
+
+    def test_errors_of_files(self):
+        # A malformed file is reported as a record, and the other files are processed anyway.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.mkdir(os.path.join(tmp_dir, 'en.lproj'))
+            with open(os.path.join(source_root, 'example.strings'), 'rb') as source, \
+                    open(os.path.join(tmp_dir, 'en.lproj', 'A.strings'), 'wb') as f:
+                f.write(source.read())
+            with open(os.path.join(tmp_dir, 'en.lproj', 'B.strings'), 'w', encoding='utf-8') as f:
+                f.write('"a" = "b"\n')
+            malformed_path = os.path.join(tmp_dir, 'en.lproj', 'B.strings')
+            output_path = os.path.join(tmp_dir, 'output')
+
+            for argv in (('stats',), ('convert', '-t', 'utf-8'), ('canonicalize',),
+                         ('export', '-f', 'json', '-o', output_path)):
+                exit_status, records = self._run(*(argv + ('-e', 'utf-8', tmp_dir)))
+                self.assertEqual(exit_status, 1)
+                self.assertEqual([(os.path.basename(record.get('file') or record['files'][0]), 'error' in record)
+                                  for record in records], [('A.strings', False), ('B.strings', True)])
+                self.assertEqual(records[1], {'file': malformed_path, 'error': 'Failed to parse line 1: "a" = "b"'})
+
+            exit_status, records = self._run('dups', '-e', 'utf-8', tmp_dir)
+            self.assertEqual((exit_status, records), (1, [{'file': malformed_path,
+                                                           'error': 'Failed to parse line 1: "a" = "b"'}]))
+            exit_status, records = self._run('export', '-e', 'utf-8', '-o', output_path, tmp_dir)
+            self.assertEqual((exit_status, records[0]['locale'], 'error' in records[0]), (1, 'en', True))
+            exit_status, records = self._run('merge', '-e', 'utf-8', 'en', tmp_dir)
+            self.assertEqual((exit_status, records[0]['file'], 'error' in records[0]), (1, tmp_dir, True))
+
+            with open(os.path.join(output_path, 'fr.xliff'), 'w', encoding='utf-8') as f:
+                f.write('<xliff>')
+            exit_status, records = self._run('import', '-o', tmp_dir, output_path)
+            self.assertEqual(exit_status, 1)
+            self.assertEqual([(os.path.basename(record['file']), 'error' in record) for record in records],
+                             [('fr.xliff', True), ('A.json', False)])
+
+    def test_merge_and_convert(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for locale, fixture in (('en', 'example.strings'), ('de', 'example2.strings')):
+                os.mkdir(os.path.join(tmp_dir, locale + '.lproj'))
+                with open(os.path.join(source_root, fixture), 'rb') as source, \
+                        open(os.path.join(tmp_dir, locale + '.lproj', 'Localizable.strings'), 'wb') as f:
+                    f.write(source.read())
+
+            exit_status, records = self._run('merge', 'en', tmp_dir, '--exclude-extra')
+            self.assertEqual(exit_status, 0)
+            self.assertEqual([(record['locale'], record['added'], record['removed'], record['written'])
+                              for record in records], [('de', 2, 1, True)])
+            self.assertEqual(self._run('merge', 'en', tmp_dir)[1][0]['written'], False)
+            self.assertEqual(self._run('merge', 'fr', tmp_dir),
+                             (1, [{'file': tmp_dir, 'error': 'No tables of the base locale fr'}]))
+
+            exit_status, records = self._run('convert', tmp_dir, '-t', 'utf-16')
+            self.assertEqual([record['written'] for record in records], [True, True])
+            self.assertEqual(self._run('dups', tmp_dir), (0, []))
+            self.assertEqual([record['written'] for record in self._run('convert', tmp_dir, '-t', 'utf-16')[1]],
+                             [False, False])
+            self.assertEqual(len(StringsTable(os.path.join(tmp_dir, 'de.lproj', 'Localizable.strings'))), 8)
+
+    def test_merge_driver(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_paths = [os.path.join(tmp_dir, name) for name in ('base', 'ours', 'theirs')]
+
+            def write_files(ours_cancel, theirs_cancel):
+                for file_path, cancel, extra in zip(file_paths, ('Annuler', ours_cancel, theirs_cancel),
+                                                    ('', '', '\n"Share" = "Partager";\n')):
+                    with open(file_path, 'w', encoding='utf-16') as f:
+                        f.write('"Cancel" = "{}";\n\n"Delete" = "Supprimer";\n'.format(cancel) + extra)
+
+            write_files('Annuler tout', 'Annuler')
+            self.assertEqual(self._run('merge-driver', *file_paths), (0, []))
+            self.assertEqual([s.localized for s in StringsTable(file_paths[1]).strings()],
+                             ['Annuler tout', 'Supprimer', 'Partager'])
+
+            write_files('Annuler tout', 'Abandonner')
+            exit_status, records = self._run('merge-driver', *file_paths, '--path', 'fr.lproj/Localizable.strings')
+            self.assertEqual(exit_status, 1)
+            self.assertEqual(records, [{'file': 'fr.lproj/Localizable.strings', 'source': 'Cancel',
+                                        'field': 'localized', 'resolved': None}])
+            with open(file_paths[1], encoding='utf-16') as f:
+                self.assertTrue(f.read().startswith('<<<<<<< ours\n"Cancel" = "Annuler tout";\n=======\n'))
+            # Left as it is when it can't be read, e.g. with conflict markers.
+            self.assertEqual(self._run('merge-driver', *file_paths)[0], 1)
+
+            write_files('Annuler tout', 'Abandonner')
+            exit_status, records = self._run('merge-driver', *file_paths, '--favor', 'theirs')
+            self.assertEqual((exit_status, records[0]['resolved']), (0, 'theirs'))
+            self.assertEqual(StringsTable(file_paths[1])['Cancel'].localized, 'Abandonner')
+
+    def test_watch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'fr.lproj', 'Localizable.strings')
+            os.mkdir(os.path.dirname(file_path))
+            with open(file_path, 'w', encoding='utf-16') as f:
+                f.write('"Cancel" = "Annuler";\n')
+            contents = iter(['"Cancel" = "Annuler tout";\n', '"Cancel" = ;\n'])
+
+            def sleep(_):
+                content = next(contents, None)
+                if content is None:
+                    raise KeyboardInterrupt
+                with open(file_path, 'w', encoding='utf-16') as f:
+                    f.write(content)
+
+            with mock.patch('time.sleep', side_effect=sleep):
+                exit_status, records = self._run('watch', tmp_dir, '--verify-content')
+        self.assertEqual(exit_status, 0)
+        self.assertEqual(records, [
+            {'locale': 'fr', 'table': 'Localizable', 'change': 'modified', 'source': 'Cancel',
+             'localized': 'Annuler tout', 'comment': None},
+            {'locale': 'fr', 'table': 'Localizable', 'error': 'Failed to parse line 1: "Cancel" = ;'},
+        ])
+
+    def test_canonicalize(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            with open(os.path.join(source_root, 'example.strings'), 'rb') as source, open(file_path, 'wb') as f:
+                f.write(source.read())
+            exit_status, records = self._run('canonicalize', tmp_dir)
+            self.assertEqual(exit_status, 0)
+            self.assertEqual(records, [{'file': file_path, 'encoding': 'utf-8', 'to_encoding': 'utf-8',
+                                        'written': True}])
+            self.assertEqual(list(StringsTable(file_path, encoding='utf-8')),
+                             sorted(StringsTable(os.path.join(source_root, 'example.strings'), encoding='utf-8')))
+            self.assertEqual(self._run('canonicalize', file_path)[1][0]['written'], False)
+
+    def test_export_and_import(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            project_path = os.path.join(tmp_dir, 'project')
+            for locale, fixture in (('en', 'example.strings'), ('zh-Hant', 'example16.strings')):
+                os.makedirs(os.path.join(project_path, locale + '.lproj'))
+                with open(os.path.join(source_root, fixture), 'rb') as source, \
+                        open(os.path.join(project_path, locale + '.lproj', 'Localizable.strings'), 'wb') as f:
+                    f.write(source.read())
+
+            for export_format in ('xliff', 'json'):
+                export_path = os.path.join(tmp_dir, export_format)
+                import_path = os.path.join(tmp_dir, export_format + '.imported')
+                exit_status, records = self._run('export', project_path, '-f', export_format, '-o', export_path)
+                self.assertEqual(exit_status, 0)
+                self.assertEqual([record['locale'] for record in records], ['en', 'zh-Hant'])
+
+                self._run('import', export_path, '-o', import_path)
+                for locale, encoding in (('en', 'utf-8'), ('zh-Hant', 'utf-16')):
+                    file_name = os.path.join(locale + '.lproj', 'Localizable.strings')
+                    self.assertEqual(StringsTable(os.path.join(import_path, file_name)),
+                                     StringsTable(os.path.join(project_path, file_name), encoding=encoding))
+
+
+class TestConverters(unittest.TestCase, TestStringsTableContentMixin):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.strings_table = StringsTable(os.path.join(source_root, 'example16.strings'))
+        self.strings_table.insert('Carriage\r\nreturn', 'Line\r\nbreaks')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_json(self):
+        file_path = os.path.join(self.tmp_dir.name, 'Localizable.json')
+        converters.write_json(self.strings_table.strings(), file_path)
+        self.assertEqual(strings_table_of(*converters.localized_strings_in_json_file(file_path, chunk_size=5)),
+                         self.strings_table)
+
+        converters.write_json(self.strings_table.strings(), file_path, flat=True)
+        with open(file_path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['String not translated'], 'String not translated')
+        self._test_strings_table_content(strings_table_of(
+            *converters.localized_strings_in_json_file(file_path)),
+            [expected_result._replace(comment=None) for expected_result in self.default_expected_results] +
+            [ExpectedResult('Carriage\r\nreturn', 'Line\r\nbreaks', None)])
+
+        converters.write_json([], file_path)
+        self.assertEqual(list(converters.localized_strings_in_json_file(file_path)), [])
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('{"A key": "A value", "Another key" "Another value"}')
+        with self.assertRaises(ValueError):
+            list(converters.localized_strings_in_json_file(file_path))
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('{"A key": "A value", "": "Empty"}')
+        with self.assertRaisesRegex(ValueError, 'member 2 has an empty key'):
+            list(converters.localized_strings_in_json_file(file_path))
+
+    def test_xliff(self):
+        file_path = os.path.join(self.tmp_dir.name, 'zh-Hant.xliff')
+        converters.write_xliff([('zh-Hant.lproj/Localizable.strings', self.strings_table.strings()),
+                                ('zh-Hant.lproj/Main.storyboard', iter(()))], file_path, 'en', 'zh-Hant')
+        units = list(converters.xliff_units_in_file(file_path))
+        self.assertEqual({(unit.original, unit.source_language, unit.target_language) for unit in units},
+                         {('zh-Hant.lproj/Localizable.strings', 'en', 'zh-Hant')})
+        self.assertEqual(strings_table_of(*(unit.localized_string for unit in units)), self.strings_table)
+
+        strings_file_paths = converters.import_xliff_file(file_path, self.tmp_dir.name)
+        self.assertEqual(strings_file_paths, [os.path.join(self.tmp_dir.name, 'zh-Hant.lproj', 'Localizable.strings')])
+        self.assertEqual(StringsTable(strings_file_paths[0]), self.strings_table)
+
+        # Tables of the same name in different directories would be written to the same strings file.
+        converters.write_xliff([('A/Main.storyboard', self.strings_table.strings()),
+                                ('B/Main.storyboard', self.strings_table.strings())], file_path, 'en', 'zh-Hant')
+        with self.assertRaisesRegex(ValueError, 'both <file> elements of A/Main.storyboard and B/Main.storyboard'):
+            converters.import_xliff_file(file_path, self.tmp_dir.name)
+
+        # Control characters round-trip through strings files as escapes, but not through XML 1.0.
+        self.strings_table.insert('Bell', 'a\ab')
+        os.remove(file_path)
+        with self.assertRaisesRegex(ValueError, "'Bell' of zh-Hant.lproj/Localizable.strings"):
+            converters.write_xliff([('zh-Hant.lproj/Localizable.strings', self.strings_table.strings())], file_path,
+                                   'en', 'zh-Hant')
+        self.assertFalse(os.path.exists(file_path))
+
+    def test_xliff_groups(self):
+        # Xcode exports group units, e.g. of a storyboard, among other units of the same body.
+        file_path = os.path.join(self.tmp_dir.name, 'fr.xliff')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<xliff xmlns="{}" version="1.2">\n'
+                    '  <file original="fr.lproj/Main.strings" source-language="en" target-language="fr">\n'
+                    '    <body>\n'
+                    '      <trans-unit id="Before"><source>Before</source><target>Avant</target></trans-unit>\n'
+                    '      <group id="Outer">\n'
+                    '        <trans-unit id="Outer"><source>Outer</source></trans-unit>\n'
+                    '        <group id="Inner">\n'
+                    '          <trans-unit id="Inner"><source>Inner</source></trans-unit>\n'
+                    '        </group>\n'
+                    '        <trans-unit id="Outer after"><source>Outer after</source></trans-unit>\n'
+                    '      </group>\n'
+                    '      <trans-unit id="After"><source>After</source><target>Après</target></trans-unit>\n'
+                    '    </body>\n'
+                    '  </file>\n'
+                    '</xliff>\n'.format(converters.XLIFF_NAMESPACE))
+        self.assertEqual([(unit.localized_string.source, unit.localized_string.stored_localized)
+                          for unit in converters.xliff_units_in_file(file_path)],
+                         [('Before', 'Avant'), ('Outer', ''), ('Inner', ''), ('Outer after', ''),
+                          ('After', 'Après')])
+
+
+class TestImport(unittest.TestCase):
+
+    def test_modules_imported(self):
+        # Modules off the hot path of reading and writing tables are imported on first use, so hooks importing the
+        # package hundreds of times don't pay for them.
+        output = subprocess.check_output([sys.executable, '-c', 'import sys; modules = set(sys.modules); '
+                                          'import tclocalizable.strings_table; print(*set(sys.modules) - modules)'],
+                                         cwd=source_root, universal_newlines=True)
+        imported_packages = {module_name.split('.')[0] for module_name in output.split()}
+        self.assertEqual(imported_packages & {'argparse', 'asyncio', 'concurrent', 'enum', 'hashlib', 'json', 'logging',
+                                              'marshal', 'mmap', 'multiprocessing', 're', 'random', 'shlex',
+                                              'subprocess', 'tempfile', 'xml'}, set())
+
+    def test_command_line_modules_imported(self):
+        # Modules of exports, canonical output, merges and watching are imported by their commands only.
+        output = subprocess.check_output([sys.executable, '-c', 'import sys; modules = set(sys.modules); '
+                                          'import tclocalizable.cli; print(*set(sys.modules) - modules)'],
+                                         cwd=source_root, universal_newlines=True)
+        imported_modules = set(output.split())
+        self.assertEqual({module_name.split('.')[0] for module_name in imported_modules} &
+                         {'email', 'http', 'tempfile', 'threading', 'urllib', 'xml'}, set())
+        self.assertEqual(imported_modules & {'tclocalizable.canonical', 'tclocalizable.converters',
+                                             'tclocalizable.three_way_merge', 'tclocalizable.watcher'}, set())
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_read_merge_write(self):
+        file_path = os.path.join(source_root, 'example16.strings')
+        measurements = []
+        with Instrumentation(callback=measurements.append) as instrumentation:
+            strings_table = StringsTable(file_path)
+            lazy_strings_table = StringsTable(file_path, lazy=True)
+            another_strings_table = StringsTable(os.path.join(source_root, 'example2.strings'), encoding='utf-8')
+            strings_table.merge(another_strings_table)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                strings_table.write_file(os.path.join(temp_dir, 'Localizable.strings'))
+        strings_table.write_file(os.devnull, atomic=False)  # Not instrumented any more
+
+        stats = instrumentation.as_dict()
+        phases = stats['phases']
+        self.assertEqual(set(phases), {'io.read', 'parse', 'read_file', 'merge', 'serialize', 'io.write', 'write_file'})
+        self.assertEqual(phases['read_file']['calls'], 3)
+        self.assertEqual(phases['io.read']['bytes_read'], 2 * os.path.getsize(file_path) +
+                         os.path.getsize(os.path.join(source_root, 'example2.strings')))
+        self.assertEqual(phases['parse']['entries'], 2 * len(lazy_strings_table) + len(another_strings_table))
+        self.assertEqual(phases['serialize']['entries'], len(strings_table))
+        self.assertEqual(phases['merge']['entries'], len(another_strings_table))
+        self.assertEqual(stats['peak_entry_count'], len(strings_table))
+        self.assertEqual(sum(measurement.seconds for measurement in measurements if measurement.phase == 'parse'),
+                         phases['parse']['seconds'])
+        json.dumps(stats)
+
+    def test_disabled(self):
+        with Instrumentation() as instrumentation:
+            pass
+        StringsTable(os.path.join(source_root, 'example16.strings'))
+        self.assertEqual(instrumentation.as_dict(), {'phases': {}, 'peak_entry_count': 0})
+
+
+class TestAsyncIO(unittest.TestCase):
+
+    def setUp(self):
+        self.file_path = os.path.join(source_root, 'example16.strings')
+        self.strings_table = StringsTable(self.file_path)
+
+    def test_localized_strings_in_file(self):
+        async def localized_strings():
+            return [localized_string async for localized_string in
+                    StringsTable.alocalized_strings_in_file(self.file_path)]
+
+        self.assertEqual(asyncio.run(localized_strings()), list(self.strings_table.strings()))
+
+        async def first_localized_string():
+            iterator = async_io.localized_strings_in_file(self.file_path, batch_size=2)
+            async for localized_string in iterator:
+                await iterator.aclose()  # Closes the file in the middle
+                return localized_string
+
+        self.assertEqual(asyncio.run(first_localized_string()), next(iter(self.strings_table.strings())))
+
+    def test_read_write(self):
+        async def read_write(file_path):
+            strings_table = StringsTable()
+            await strings_table.aread_file(self.file_path)
+            strings_table['No comment'].localized = 'Changed'
+            return await strings_table.awrite_file(file_path), await strings_table.awrite_file(file_path,
+                                                                                               skip_unchanged=True)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'Localizable.strings')
+            self.assertEqual(asyncio.run(read_write(file_path)), (True, False))
+            self.strings_table['No comment'].localized = 'Changed'
+            self.assertEqual(StringsTable(file_path), self.strings_table)
+
+            canonical_path = os.path.join(temp_dir, 'Canonical.strings')
+            self.strings_table.write_file(canonical_path, canonical=True)
+            self.assertTrue(asyncio.run(self.strings_table.awrite_file(file_path, canonical=True)))
+            with open(file_path, 'rb') as f, open(canonical_path, 'rb') as canonical_file:
+                self.assertEqual(f.read(), canonical_file.read())
+
+    def test_read_files(self):
+        reading_count = max_reading_count = 0
+        original_read_file = StringsTable.read_file
+
+        def read_file(strings_table, *args, **kwargs):
+            nonlocal reading_count, max_reading_count
+            reading_count += 1
+            max_reading_count = max(max_reading_count, reading_count)
+            original_read_file(strings_table, *args, **kwargs)
+            reading_count -= 1
+
+        file_paths = [self.file_path, os.path.join(source_root, 'example.strings')] * 4
+        with mock.patch.object(StringsTable, 'read_file', read_file):
+            strings_tables = asyncio.run(async_io.read_files(file_paths, concurrency=2, encoding=None))
+        self.assertEqual(len(strings_tables), 8)
+        self.assertEqual(strings_tables[0], self.strings_table)
+        self.assertEqual(strings_tables[7], StringsTable(file_paths[1], encoding='utf-8'))
+        self.assertLessEqual(max_reading_count, 2)
+
+
 class TestManipulateStringsFile(unittest.TestCase):
 
     def test_create(self):
@@ -199,6 +1067,21 @@ class TestManipulateStringsFile(unittest.TestCase):
         self.assertEqual(localized_string.localized, 'ένα κλειδί')
         self.assertIsNone(localized_string.comment)
 
+    def test_item_slots(self):
+        localized_string = LocalizedString('A key', 'una chiave', 'Name of object used to open locks')
+        self.assertFalse(hasattr(localized_string, '__dict__'))
+        with self.assertRaises(AttributeError):
+            localized_string.note = 'no such attribute'
+
+    def test_intern(self):
+        file_path = os.path.join(source_root, 'example16.strings')
+        for lazy in (False, True):
+            strings_table = StringsTable(file_path, intern=True, lazy=lazy)
+            another_strings_table = StringsTable(file_path, intern=True, lazy=lazy)
+            for key in strings_table:
+                self.assertIs(strings_table[key].source, another_strings_table[key].source)
+                self.assertIs(strings_table[key].comment, another_strings_table[key].comment)
+
     def test_item_equal(self):
         localized_string_1 = LocalizedString('A string', '一個字串', None)
         localized_string_2 = LocalizedString('A string', '一個字串', 'a type used to represent words')
@@ -262,6 +1145,446 @@ class TestManipulateStringsFile(unittest.TestCase):
         self.assertEqual(strings_table['A number'].comment, 'a digits value')
 
 
+class TestChangeJournal(unittest.TestCase):
+
+    def test_disabled(self):
+        strings_table = StringsTable(os.path.join(source_root, 'example16.strings'))
+        strings_table['No comment'].localized = 'Changed'
+        self.assertIsNone(strings_table.journal)
+        self.assertIsNone(strings_table['No comment']._journal)
+
+    def test_changes(self):
+        for lazy in (False, True):
+            strings_table = StringsTable(os.path.join(source_root, 'example16.strings'), lazy=lazy)
+            journal = strings_table.start_journal()
+
+            strings_table.insert('A new key', 'A new value')
+            strings_table['No comment'].localized = 'Changed'
+            strings_table['String with ;'].comment = 'Changed comment'
+            strings_table['String with ;'].comment = 'String with semicolon'  # Changed back
+            del strings_table['String with =']
+            strings_table.pop('String not translated')
+            strings_table.insert('Transient key')
+            strings_table.popitem()
+            strings_table.insert('String with =', 'Added back')
+
+            self.assertEqual([(change.kind, change.source, change.field) for change in journal.changes], [
+                ('added', 'A new key', None),
+                ('modified', 'No comment', 'localized'),
+                ('modified', 'String with ;', 'comment'),
+                ('modified', 'String with ;', 'comment'),
+                ('removed', 'String with =', None),
+                ('removed', 'String not translated', None),
+                ('added', 'Transient key', None),
+                ('removed', 'Transient key', None),
+                ('added', 'String with =', None),
+            ])
+            self.assertEqual(journal.changes[1].old, '沒有註解')
+            self.assertEqual([(kind, source) for kind, source, _ in journal.net_changes()], [
+                ('added', 'A new key'),
+                ('modified', 'No comment'),
+                ('modified', 'String with ='),
+                ('removed', 'String not translated'),
+            ])
+            self.assertEqual(journal.added_sources(), ['A new key'])
+            self.assertEqual(journal.removed_sources(), ['String not translated'])
+
+            journal.clear()
+            self.assertEqual(list(journal.net_changes()), [])
+
+            removed_localized_string = strings_table.pop('A new key')
+            removed_localized_string.localized = 'Not in the table'
+            strings_table.clear()
+            self.assertEqual(len(journal.removed_sources()), 8)
+
+            strings_table.stop_journal()
+            strings_table.insert('After stop')
+            self.assertEqual(len(journal.changes), 8)  # Not the removed entry modified
+
+    def test_merge(self):
+        strings_table = StringsTable(os.path.join(source_root, 'example2.strings'), encoding='utf-8')
+        journal = strings_table.start_journal()
+        strings_table.merge(StringsTable(os.path.join(source_root, 'example.strings'), encoding='utf-8'),
+                            keep_localized=False, exclude_extra=True)
+        self.assertEqual(journal.removed_sources(), ['a key'])
+        self.assertEqual(journal.added_sources(), ['String with ;', 'String not translated'])
+        self.assertEqual(journal.modified_sources(), ['No comment'])
+
+
+class TestFormatSpecifiers(unittest.TestCase):
+
+    def test_format_specifiers(self):
+        self.assertEqual([(format_specifier.position, format_specifier.argument_type) for format_specifier in
+                          format_specifiers.format_specifiers('%@ of %-5d%% %.*f %lu %qx %hhd %Lg %ls %C %p %1.2s')], [
+            (1, '@'), (2, 'd'), (3, 'd'), (4, 'f'), (5, 'ld'), (6, 'lld'), (7, 'hhd'), (8, 'Lf'), (9, 'S'), (10, 'C'),
+            (11, 'p'), (12, 's'),
+        ])
+        self.assertEqual([(format_specifier.position, format_specifier.argument_type, format_specifier.text)
+                          for format_specifier in format_specifiers.format_specifiers('%2$@ %1$*3$d')], [
+            (2, '@', '%2$@'), (3, 'd', '%1$*3$d'), (1, 'd', '%1$*3$d'),
+        ])
+        self.assertEqual(format_specifiers.format_specifiers('100%% sure %q'), [])
+
+    def test_format_problems(self):
+        localized_strings = [
+            LocalizedString("%@ doesn't have a list named %@.", '%1$@ は %2$@ というリストをもっていません。'),
+            LocalizedString('%1$@ and %2$d', '%2$d et %1$@'),
+            LocalizedString('%d of %u', '%i sur %x'),
+            LocalizedString('No specifiers', '%@'),  # Not a format string
+            LocalizedString('%@', None),  # Not translated
+            LocalizedString('%d photos', '%@ photos'),
+            LocalizedString('%1$@ %3$d', '%1$@ %3$d %4$@'),
+            LocalizedString('%@ %1$@', 'Rien'),
+            LocalizedString('50%% off', '50 % de réduction'),
+            LocalizedString('%ld', '%d or %2$d'),
+            LocalizedString('%1$d %1$f', '\x00%1$d\x00'),
+            LocalizedString('50% off', '50%オフ'),  # Not a format string
+            LocalizedString('Save 20% today', "Économisez 20 % aujourd'hui"),  # Not a format string
+            LocalizedString('%@: 50% off', '%@ : 50 % en moins'),  # Both taken as specifiers by NSString
+        ]
+        format_problems = format_specifiers.format_problems(localized_strings)
+        self.assertEqual([(format_problem.localized_string.source, format_problem.kind, format_problem.field,
+                           format_problem.position, format_problem.expected, format_problem.actual)
+                          for format_problem in format_problems], [
+            ('%d photos', 'type', 'localized', 1, 'd', '@'),
+            ('%1$@ %3$d', 'gap', 'source', 2, None, None),
+            ('%1$@ %3$d', 'gap', 'localized', 2, None, None),
+            ('%1$@ %3$d', 'extra', 'localized', 4, None, '@'),
+            ('%@ %1$@', 'mixed', 'source', None, None, None),
+            ('%@ %1$@', 'missing', 'localized', 1, '@', None),
+            ('50%% off', 'extra', 'localized', 1, None, 'd'),
+            ('%ld', 'mixed', 'localized', None, None, None),
+            ('%ld', 'type', 'localized', 1, 'ld', 'd'),
+            ('%ld', 'extra', 'localized', 2, None, 'd'),
+            ('%1$d %1$f', 'conflict', 'source', 1, 'd', 'f'),
+            ('%@: 50% off', 'type', 'localized', 2, 'd', 'f'),
+        ])
+        self.assertEqual(format_specifiers.describe(format_problems[0]),
+                         'localized uses argument 1 as %@ instead of %d')
+        self.assertEqual(format_problems, [problem for localized_string in localized_strings
+                                           for problem in format_specifiers.format_problems([localized_string])])
+
+        strings_table = StringsTable()
+        strings_table['%d photos'] = localized_strings[5]
+        self.assertEqual(strings_table.format_problems(), format_problems[:1])
+
+    def test_format_problems_in_directory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for locale in ('en', 'de', 'fr'):
+                os.mkdir(os.path.join(tmp_dir, locale + '.lproj'))
+            for locale, table_name, content in (('en', 'Localizable', '"%d photos" = "%d photos";\n'),
+                                                ('de', 'Localizable', '"%d photos" = "%d Fotos";\n'),
+                                                ('fr', 'Localizable', '"%d photos" = "%@ photos";\n'),
+                                                ('fr', 'Other', '"%@ and %@" = "%2$@ et %1$@ %3$@";\n')):
+                with open(os.path.join(tmp_dir, locale + '.lproj', table_name + '.strings'), 'w',
+                          encoding='utf-16') as f:
+                    f.write(content)
+            for processes in (1, 2):
+                format_problems = StringsBundle.format_problems_in_directory(tmp_dir, processes=processes)
+                self.assertEqual({key: [format_problem.kind for format_problem in problems]
+                                  for key, problems in format_problems.items()},
+                                 {('fr', 'Localizable'): ['type'], ('fr', 'Other'): ['extra']})
+                self.assertEqual(format_problems[('fr', 'Other')][0].localized_string.line, 1)
+
+
+class TestTranslationMemory(unittest.TestCase):
+
+    def test_matches(self):
+        translation_memory = TranslationMemory()
+        translation_memory.add_table(strings_table_of(
+            ('Delete this photo?', 'Supprimer cette photo ?'),
+            ('Delete all photos?', 'Supprimer toutes les photos ?'),
+            ('Share', 'Share'),  # Not translated
+            ('Settings', None),
+        ), 'fr', 'Photos')
+        translation_memory.add_table(strings_table_of(
+            ('Delete this photo?', 'この写真を削除しますか？'),
+        ), 'ja', 'Localizable')
+        self.assertEqual(len(translation_memory), 2)
+
+        matches = translation_memory.matches('delete this  photo?')
+        self.assertEqual(matches, [
+            Match(1.0, 'Delete this photo?', 'Supprimer cette photo ?', 'fr', 'Photos'),
+            Match(1.0, 'Delete this photo?', 'この写真を削除しますか？', 'ja', 'Localizable'),
+        ])
+        matches = translation_memory.matches('Delete the photos?', locale='fr', min_score=0.5)
+        self.assertEqual([match.localized for match in matches], ['Supprimer toutes les photos ?',
+                                                                  'Supprimer cette photo ?'])
+        self.assertGreater(matches[0].score, matches[1].score)
+        self.assertEqual(len(translation_memory.matches('Delete the photos?', locale='ja', min_score=0.5)), 1)
+        self.assertEqual(len(translation_memory.matches('Delete the photos?', min_score=0.5)), 3)
+        self.assertEqual(len(translation_memory.matches('Delete the photos?', min_score=0.7)), 1)
+        self.assertEqual(translation_memory.matches('Share'), [])
+        self.assertEqual(translation_memory.matches('Something else'), [])
+        self.assertEqual(translation_memory.matches(''), [])
+
+        new_strings_table = strings_table_of(('Delete this photo', 'Delete this photo'), ('Share', None))
+        self.assertEqual([(localized_string.source, match.localized) for localized_string, match in
+                          translation_memory.suggestions(new_strings_table, 'fr')],
+                         [('Delete this photo', 'Supprimer cette photo ?')])
+
+    def test_incremental_update_and_persistence(self):
+        strings_table = strings_table_of(('Delete this photo?', 'Supprimer cette photo ?'), ('Cancel', 'Annuler'))
+        translation_memory = TranslationMemory()
+        translation_memory.add_table(strings_table, 'fr')
+        journal = strings_table.start_journal()
+        strings_table['Cancel'].localized = 'Annuler tout'
+        del strings_table['Delete this photo?']
+        strings_table.insert('Delete this album?', 'Supprimer cet album ?')
+        strings_table.insert('Share', 'Share')
+        translation_memory.apply_journal(journal, 'fr')
+
+        self.assertEqual(len(translation_memory), 2)
+        self.assertEqual(translation_memory.matches('Cancel')[0].localized, 'Annuler tout')
+        self.assertEqual([match.source for match in translation_memory.matches('Delete this photo?', min_score=0.5)],
+                         ['Delete this album?'])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'memory.index')
+            translation_memory.save(file_path)
+            loaded_translation_memory = TranslationMemory.load(file_path)
+            self.assertEqual(os.listdir(tmp_dir), ['memory.index'])
+        self.assertEqual(len(loaded_translation_memory), 2)
+        for source in ('Cancel', 'Delete this photo?', 'Delete this album?'):
+            self.assertEqual(loaded_translation_memory.matches(source, min_score=0.5),
+                             translation_memory.matches(source, min_score=0.5))
+        loaded_translation_memory.add('Delete this photo?', 'Supprimer cette photo ?', 'fr')
+        self.assertEqual(loaded_translation_memory.matches('Delete this photo?', k=1)[0].score, 1.0)
+
+
+class TestThreeWayMerge(unittest.TestCase):
+
+    def _base(self):
+        return strings_table_of(
+            ('Cancel', 'Annuler', 'Button'),
+            ('Delete', 'Supprimer', 'Button'),
+            ('Share', 'Partager', 'Button'),
+            ('Settings', 'Réglages', 'Title'),
+        )
+
+    def setUp(self):
+        self.base = self._base()
+
+    def test_merge(self):
+        ours = self._base()
+        ours['Cancel'].localized = 'Annuler tout'
+        ours['Delete'].comment = 'Button to delete a photo'
+        ours.insert('Edit', 'Modifier', 'Button')
+        theirs = self._base()
+        theirs['Delete'].localized = 'Effacer'
+        del theirs['Share']
+        theirs.insert('Open', 'Ouvrir', 'Button')
+        theirs.move_to_end('Settings')
+
+        journal = ours.start_journal()
+        self.assertEqual(ours.merge_three_way(self.base, theirs), [])
+        self.assertEqual([(s.source, s.localized, s.comment) for s in ours.strings()], [
+            ('Cancel', 'Annuler tout', 'Button'),
+            ('Delete', 'Effacer', 'Button to delete a photo'),
+            ('Open', 'Ouvrir', 'Button'),
+            ('Settings', 'Réglages', 'Title'),
+            ('Edit', 'Modifier', 'Button'),
+        ])
+        self.assertEqual([(kind, source) for kind, source, _ in journal.net_changes()], [
+            ('modified', 'Delete'),
+            ('removed', 'Share'),
+            ('added', 'Open'),
+        ])
+        self.assertIsNot(ours['Open'], theirs['Open'])
+
+    def test_conflicts(self):
+        ours = self._base()
+        ours['Cancel'].localized = 'Annuler tout'
+        ours['Share'].localized = 'Partager la photo'
+        del ours['Settings']
+        theirs = self._base()
+        theirs['Cancel'].localized = 'Abandonner'
+        del theirs['Share']
+        theirs['Settings'].comment = 'Title of the settings'
+
+        for favor, localized in (('ours', 'Annuler tout'), ('theirs', 'Abandonner')):
+            merged = StringsTable()
+            merged.update((source, localized_string.copy()) for source, localized_string in ours.items())
+            conflicts = merged.merge_three_way(self.base, theirs, favor=favor)
+            self.assertEqual([(conflict.source, conflict.field) for conflict in conflicts], [
+                ('Cancel', 'localized'),
+                ('Share', None),
+                ('Settings', None),
+            ])
+            self.assertEqual(merged['Cancel'].localized, localized)
+            # Entries removed on one side and changed on the other are kept.
+            self.assertEqual(merged['Share'].localized, 'Partager la photo')
+            self.assertEqual(merged['Settings'].comment, 'Title of the settings')
+        self.assertIsNone(conflicts[1].theirs)
+        self.assertRaises(ValueError, ours.merge_three_way, self.base, theirs, favor='base')
+
+    def test_write_file(self):
+        ours = self._base()
+        ours['Cancel'].localized = 'Annuler tout'
+        theirs = self._base()
+        theirs['Cancel'].localized = 'Abandonner'
+        conflicts = ours.merge_three_way(self.base, theirs)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'Localizable.strings')
+            three_way_merge.write_file(ours, conflicts, file_path, encoding='utf-8', marker_size=3)
+            with open(file_path, encoding='utf-8') as f:
+                content = f.read()
+            self.assertTrue(content.startswith('<<< ours\n/* Button */\n"Cancel" = "Annuler tout";\n===\n'
+                                               '/* Button */\n"Cancel" = "Abandonner";\n>>> theirs\n\n'
+                                               '/* Button */\n"Delete" = "Supprimer";\n'))
+            self.assertRaises(ValueError, StringsTable, file_path, encoding='utf-8')
+
+            three_way_merge.write_file(ours, [], file_path, encoding='utf-8')
+            self.assertEqual(StringsTable(file_path, encoding='utf-8'), ours)
+
+
+class TestStringsWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'zh-Hant.lproj', 'Localizable.strings')
+        os.mkdir(os.path.dirname(self.file_path))
+        with open(os.path.join(source_root, 'example16.strings'), encoding='utf-16') as f:
+            self.content = f.read()
+        self._write(self.file_path, self.content)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _write(file_path, content):
+        mtime_ns = os.stat(file_path).st_mtime_ns if os.path.exists(file_path) else 0
+        with open(file_path, 'w', encoding='utf-16') as f:
+            f.write(content)
+        # Files written in a row may have the same mtime on file systems with coarse mtime.
+        os.utime(file_path, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+
+    def _assert_table_of_file(self, strings_table, file_path):
+        self.assertEqual([(s.source, s.stored_localized, s.comment, s.line, s.offset) for s in strings_table.strings()],
+                         [(s.source, s.stored_localized, s.comment, s.line, s.offset)
+                          for s in StringsTable(file_path).strings()])
+
+    def test_poll(self):
+        watcher = StringsWatcher(self.tmp_dir.name)
+        strings_table = watcher.bundle['zh-Hant']['Localizable']
+        self._assert_table_of_file(strings_table, self.file_path)
+        self.assertEqual(watcher.bundle.files[('zh-Hant', 'Localizable')].encoding, 'utf-16')
+        notifications = []
+        watcher.subscribe(lambda locale, table_name, changes: notifications.append((locale, table_name, changes)))
+        self.assertEqual(watcher.poll(), [])
+
+        unchanged_localized_string = strings_table['String not translated']
+        self._write(self.file_path, self.content.replace('"No comment" = "沒有註解";', '"No comment" = "無註解";\n\n'
+                                                         '/* Added */\n"A new key" = "新的";').replace(
+            '/* String with = */\n"String with =" = "String with ="  ;', ''))
+        results = watcher.poll()
+        self.assertEqual(notifications, results)
+        self.assertEqual([(locale, table_name, [(change.kind, change.source) for change in changes])
+                          for locale, table_name, changes in results], [
+            ('zh-Hant', 'Localizable', [('removed', 'String with ='), ('modified', 'No comment'),
+                                        ('added', 'A new key')]),
+        ])
+        self.assertEqual(results[0][2][1].old.localized, '沒有註解')
+        self.assertEqual(results[0][2][2].new.comment, 'Added')
+        self._assert_table_of_file(strings_table, self.file_path)
+        # Entries not changed are kept, with their lines and offsets updated.
+        self.assertIs(strings_table['String not translated'], unchanged_localized_string)
+
+        os.utime(self.file_path)
+        self.assertEqual(watcher.poll(), [])
+
+    def test_files_added_removed_and_malformed(self):
+        watcher = StringsWatcher(self.tmp_dir.name, verify_content=True)
+        self._write(self.file_path, self.content + '\n"Malformed" = ;\n')
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.errors, {('zh-Hant', 'Localizable'): 'Failed to parse line 25: "Malformed" = ;'})
+        self.assertEqual(len(watcher.bundle['zh-Hant']['Localizable']), 8)  # Kept as it's last parsed
+
+        self._write(self.file_path, self.content + '\n"Fixed" = "修好了";\n')
+        self.assertEqual([change.source for change in watcher.poll()[0][2]], ['Fixed'])
+        self.assertEqual(watcher.errors, {})
+
+        file_path = os.path.join(self.tmp_dir.name, 'en.lproj', 'Localizable.strings')
+        os.mkdir(os.path.dirname(file_path))
+        self._write(file_path, '"A key" = "A value";\n')
+        os.remove(self.file_path)
+        results = watcher.poll()
+        self.assertEqual([(locale, table_name, len(changes), changes[0].kind)
+                          for locale, table_name, changes in results],
+                         [('en', 'Localizable', 1, 'added'), ('zh-Hant', 'Localizable', 9, 'removed')])
+        self.assertEqual(list(watcher.bundle.tables())[0][:2], ('en', 'Localizable'))
+        self.assertNotIn('zh-Hant', watcher.bundle)
+        self.assertEqual(list(watcher.bundle.files), [('en', 'Localizable')])
+
+    def test_reparse_duplicates(self):
+        watcher = StringsWatcher(self.tmp_dir.name)
+        strings_table = watcher.bundle['zh-Hant']['Localizable']
+        for content in (self.content + '\n"No comment" = "重複";\n',
+                        self.content.replace('"String with ;"', '"String with =" = "移動";\n\n"String with ;"', 1),
+                        self.content):
+            self._write(self.file_path, content)
+            watcher.poll()
+            self._assert_table_of_file(strings_table, self.file_path)
+            self.assertEqual(list(strings_table), list(StringsTable(self.file_path)))
+
+        # The table keeps the entry of the first occurrence for the appended one parsed the same, and positions of both
+        # occurrences are still updated once each when the file changes above them.
+        duplicated_content = self.content + '\n"No comment" = "沒有註解";\n'
+        for content in (duplicated_content, duplicated_content.replace('/* Some comemnt */\n', '', 1),
+                        duplicated_content.replace('"No comment" = "沒有註解";', '"No comment" = "沒有";', 1)):
+            self._write(self.file_path, content)
+            watcher.poll()
+            self._assert_table_of_file(strings_table, self.file_path)
+
+
+class TestCanonicalOutput(unittest.TestCase):
+
+    def test_canonical_localized_strings(self):
+        localized_strings = [
+            LocalizedString('Share', 'Partager', '  Button\n   to share '),
+            LocalizedString('Cancel', 'Annuler', 'Button'),
+            LocalizedString('Delete', 'Supprimer', ''),
+            LocalizedString('Cancel', 'Annuler tout', 'Button to cancel'),  # Duplicated, the last one is kept
+            LocalizedString('Album', 'Album', 'Title'),
+        ]
+        expected_entries = [
+            ('Album', 'Album', 'Title'),
+            ('Cancel', 'Annuler tout', 'Button to cancel'),
+            ('Delete', 'Supprimer', None),
+            ('Share', 'Partager', 'Button to share'),
+        ]
+        # Runs of 2 entries are sorted in temporary files and merged.
+        for run_size in (2, canonical.DEFAULT_RUN_SIZE):
+            self.assertEqual([(s.source, s.stored_localized, s.comment) for s in canonical.canonical_localized_strings(
+                localized_strings, run_size=run_size)], expected_entries)
+            self.assertEqual([s.source for s in canonical.canonical_localized_strings(
+                localized_strings, key=lambda s: (s.comment or '', s.source), run_size=run_size)],
+                ['Delete', 'Cancel', 'Share', 'Album'])
+        self.assertEqual(list(canonical.canonical_localized_strings([])), [])
+
+    def test_write_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_paths = [os.path.join(tmp_dir, file_name) for file_name in ('a.strings', 'b.strings')]
+            with open(file_paths[0], 'w', encoding='utf-16') as f:
+                f.write('/* Button\n   to cancel */\n"Cancel" = "Annuler";\n"\\U00e9t\\U00E9" = "Summer";\n')
+            with open(file_paths[1], 'w', encoding='utf-16') as f:
+                f.write('"été" = "Summer";\n\n/* Button to cancel */\n"Cancel" = "Annuler"  ;\n')
+
+            strings_tables = [StringsTable(file_path) for file_path in file_paths]
+            for strings_table, file_path in zip(strings_tables, file_paths):
+                strings_table.write_file(file_path, canonical=True)
+            with open(file_paths[0], 'rb') as f, open(file_paths[1], 'rb') as another_f:
+                content = f.read()
+                self.assertEqual(content, another_f.read())
+            self.assertEqual(content.decode('utf-16'), '/* Button to cancel */\n"Cancel" = "Annuler";\n\n'
+                                                       '"été" = "Summer";\n')
+
+            self.assertFalse(canonical.canonicalize_file(file_paths[0], run_size=1))
+            self.assertTrue(canonical.canonicalize_file(file_paths[0], to_encoding='utf-8', run_size=1))
+            self.assertEqual(StringsTable(file_paths[0], encoding='utf-8'), StringsTable(file_paths[1]))
+
+
 class TestMergeStringsFile(unittest.TestCase, TestStringsTableContentMixin):
 
     def setUp(self):
@@ -287,7 +1610,7 @@ class TestMergeStringsFile(unittest.TestCase, TestStringsTableContentMixin):
             ExpectedResult("String with \"quote\".\"", "有引號的字\"", "Comment with \"QUOTE\""),
             ExpectedResult("String with =", "String with =", "String with ="),
             ExpectedResult("String with ;", "String with ;", "String with semicolon"),
-            ExpectedResult(r"String\twith \n", r"String\twith \n", "String with spaces"),
+            ExpectedResult("String\twith \n", "String\twith \n", "String with spaces"),
             ExpectedResult("String not translated", "String not translated", "Not translated"),
             ExpectedResult("a key", "一個鑰匙", "A key"),
         ))
@@ -304,7 +1627,7 @@ class TestMergeStringsFile(unittest.TestCase, TestStringsTableContentMixin):
             ExpectedResult("String with \"quote\".\"", "有引號的字\"", "Comment with \"quote\""),
             ExpectedResult("String with =", "String with =", "String with ="),
             ExpectedResult("String with ;", "String with ;", "String with semicolon"),
-            ExpectedResult(r"String\twith \n", r"String\twith \n", "String with spaces"),
+            ExpectedResult("String\twith \n", "String\twith \n", "String with spaces"),
             ExpectedResult("String not translated", "String not translated", "Not translated"),
             ExpectedResult("a key", "一個鑰匙", "A key"),
         ))
@@ -320,9 +1643,32 @@ class TestMergeStringsFile(unittest.TestCase, TestStringsTableContentMixin):
             ExpectedResult("No comment", "沒有註解", None),
             ExpectedResult("String with \"quote\".\"", "有引號的字\"", "Comment with \"quote\""),
             ExpectedResult("String with =", "String with =", "String with ="),
-            ExpectedResult(r"String\twith \n", r"String\twith \n", "String with spaces"),
+            ExpectedResult("String\twith \n", "String\twith \n", "String with spaces"),
             ExpectedResult("a key", "一個鑰匙", "A key"),
         ))
 
+    def test_merge_stats(self):
+        self.assertEqual(self.strings_table.merge(self.another_strings_table, keep_comment=False, exclude_extra=True),
+                         (1, 2, 1))
+
+    def test_merge_into(self):
+        strings_tables = {
+            'de': self.another_strings_table,
+            'zh-Hant': StringsTable(os.path.join(source_root, 'example.strings'), encoding='utf-8'),
+        }
+        base_strings_table = StringsTable(os.path.join(source_root, 'example.strings'), encoding='utf-8')
+        del base_strings_table['String with =']
+        merge_stats = base_strings_table.merge_into(strings_tables, keep_localized=False, exclude_extra=True)
+        # Like `merge`, entries not translated in the base table are updated to their sources
+        self.assertEqual(merge_stats, {'de': (2, 2, 1), 'zh-Hant': (0, 1, 1)})
+        self.assertEqual(set(strings_tables['de']), set(base_strings_table))
+
+        # Entries added are not shared with the base table
+        strings_tables['de']['String with ;'].localized = 'Zeichenkette mit ;'
+        self.assertEqual(base_strings_table['String with ;'].localized, 'String with ;')
+        self.assertIsNot(strings_tables['de']['String not translated'],
+                         strings_tables['zh-Hant']['String not translated'])
+
+
 if __name__ == '__main__':
     unittest.main()